@@ -0,0 +1,240 @@
+"""Benchmarks of the overhead of the bindings, against a local stand-in server.
+
+Measures, for the current checkout:
+
+- `cpu`: client-side CPU time per call of each endpoint, the server running in another process,
+- `local`: CPU time of the steps that don't touch the network (payload construction, JSON encoding
+  and decoding, `CalibratedSelect` post-processing),
+- `throughput`: requests per second at several concurrency levels, with a fixed server latency,
+- `memory`: peak memory of a large `Embed` batch, as lists and with `as_array=True`,
+- `import`: time to import the package in a fresh interpreter.
+
+Results are saved as JSON to compare releases::
+
+    $ python benchmarks/run.py --output benchmarks/results/current.json
+    $ python benchmarks/run.py --compare benchmarks/results/previous.json
+"""
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import lightonmuse  # noqa: E402
+from lightonmuse.codec import JSONCodec  # noqa: E402
+from lightonmuse.fake_server import FakeMuseServer  # noqa: E402
+
+
+@contextmanager
+def stand_in_server(latency: float = 0.0, dim: int = 1024):
+    """Runs the fake Muse server in a subprocess, pointing the bindings at it with `MUSE_BASE_URL`.
+
+    The server runs in its own process so that its CPU time isn't counted as the one of the bindings.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "lightonmuse.fake_server", "--latency", str(latency), "--dim", str(dim)],
+        stdout=subprocess.PIPE,
+        cwd=os.path.dirname(HERE),
+        text=True,
+    )
+    previous = {key: os.environ.get(key) for key in ["MUSE_BASE_URL", "MUSE_API_KEY"]}
+    try:
+        os.environ["MUSE_BASE_URL"] = process.stdout.readline().strip()
+        os.environ.setdefault("MUSE_API_KEY", "benchmark")
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def cpu_per_call(call, repeat: int) -> float:
+    """Median client CPU time of `call`, in milliseconds."""
+    call()  # warm up the connection pool
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        call()
+        timings.append(time.process_time() - start)
+    return 1000 * statistics.median(timings)
+
+
+def bench_cpu(repeat: int) -> dict:
+    texts = [f"Voici le texte numéro {i}, de longueur moyenne." for i in range(32)]
+    candidates = ["positive", "négative", "neutre"]
+    calibrated = lightonmuse.CalibratedSelect("orion-fr")
+    calibrated.fit('Voici une critique : "" \n', candidates)
+    calls = {
+        "create": lambda e: e(texts[0], n_tokens=20),
+        "analyse": lambda e: e(texts),
+        "embed": lambda e: e(texts),
+        "embed_as_array": lambda e: e(texts, as_array=True),
+        "select": lambda e: e(texts, candidates),
+        "compare": lambda e: e(texts[0], texts[1:]),
+        "tokenize": lambda e: e(texts),
+    }
+    endpoints = {
+        "create": lightonmuse.Create,
+        "analyse": lightonmuse.Analyse,
+        "embed": lightonmuse.Embed,
+        "embed_as_array": lightonmuse.Embed,
+        "select": lightonmuse.Select,
+        "compare": lightonmuse.Compare,
+        "tokenize": lightonmuse.Tokenize,
+    }
+    results = {}
+    for name, call in calls.items():
+        endpoint = endpoints[name]("orion-fr")
+        results[name] = cpu_per_call(lambda: call(endpoint), repeat)
+    results["calibrated_select"] = cpu_per_call(lambda: calibrated(texts, candidates), repeat)
+    return {"unit": "ms/call", **results}
+
+
+def bench_local(repeat: int, dim: int) -> dict:
+    texts = [f"Voici le texte numéro {i}, de longueur moyenne." for i in range(32)]
+    candidates = ["positive", "négative", "neutre"]
+    select = lightonmuse.Select("orion-fr")
+    calibrated = lightonmuse.CalibratedSelect("orion-fr")
+    calibrated.candidates, calibrated.conjunction = candidates, None
+    calibrated.calibration_mode, calibrated.content_free_inputs, calibrated.calib_cost = "identity_W", [], {}
+    calibrated.W, calibrated.b = np.identity(3), np.zeros((3, 1))
+    codec = JSONCodec(compress=False)
+    server = FakeMuseServer(dim=dim)
+    embed_response = server.respond("embed", {"text": texts})
+    select_response = server.respond("select", [{"reference": t, "candidates": candidates} for t in texts])
+    embed_body = codec.dumps(embed_response)
+
+    def timed(call) -> float:
+        start = time.process_time()
+        for _ in range(repeat):
+            call()
+        return 1000 * (time.process_time() - start) / repeat
+
+    return {
+        "unit": "ms/call",
+        "select_payload": timed(lambda: select._build_payload(texts, candidates)),
+        "encode_embed_response": timed(lambda: codec.dumps(embed_response)),
+        "decode_embed_response": timed(lambda: codec.loads(embed_body)),
+        "calibrate": timed(
+            lambda: calibrated._calibrate(texts, None, False, json.loads(json.dumps(select_response)))
+        ),
+    }
+
+
+def bench_throughput(levels, n_requests: int) -> dict:
+    results = {"unit": "requests/s"}
+    tokenizer = lightonmuse.Tokenize("orion-fr")
+    texts = [f"texte {i}" for i in range(n_requests)]
+    for workers in levels:
+        tokenizer.map(texts[:workers], batch_size=1, workers=workers)  # open the connections
+        start = time.perf_counter()
+        tokenizer.map(texts, batch_size=1, workers=workers)
+        results[f"workers={workers}"] = n_requests / (time.perf_counter() - start)
+    return results
+
+
+def bench_memory(n_texts: int) -> dict:
+    embedder = lightonmuse.Embed("orion-fr")
+    texts = [f"Voici le texte numéro {i}." for i in range(n_texts)]
+    results = {"unit": "MiB"}
+    for name, as_array in [("lists", False), ("as_array", True)]:
+        tracemalloc.start()
+        outputs = embedder(texts, as_array=as_array)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del outputs
+        results[name] = peak / 2 ** 20
+    return results
+
+
+def bench_import(repeat: int) -> dict:
+    def import_time(statement: str) -> float:
+        code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+        timings = [
+            float(subprocess.check_output([sys.executable, "-c", code], cwd=os.path.dirname(HERE), text=True))
+            for _ in range(repeat)
+        ]
+        return 1000 * statistics.median(timings)
+
+    # the package itself is imported lazily, endpoints import their dependencies on first access
+    return {
+        "unit": "ms",
+        "median": import_time("import lightonmuse"),
+        "median_endpoints": import_time("from lightonmuse import Create, Embed, Select, Tokenize"),
+    }
+
+
+def compare(results: dict, previous: dict):
+    """Prints the ratio of each measure to the one of `previous`."""
+    if previous.get("parameters") != results["parameters"]:
+        print(f"Warning: comparing to results with different parameters {previous.get('parameters')}")
+    for group, measures in results["benchmarks"].items():
+        for name, value in measures.items():
+            old = previous["benchmarks"].get(group, {}).get(name)
+            if name != "unit" and old:
+                print(f"{group:>10} {name:>24} {old:12.3f} -> {value:12.3f} {measures['unit']} ({value / old:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="JSON file the results are saved to")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare to")
+    parser.add_argument("--repeat", type=int, default=50, help="repetitions of each measure")
+    parser.add_argument("--dim", type=int, default=4096, help="dimension of the embeddings served")
+    parser.add_argument("--latency", type=float, default=0.02, help="server latency of the throughput benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 64], help="concurrency levels")
+    parser.add_argument("--memory-texts", type=int, default=1000, help="batch size of the memory benchmark")
+    args = parser.parse_args(argv)
+    warnings.filterwarnings("ignore", message="Bindings targeting")
+
+    benchmarks = {}
+    with stand_in_server(dim=args.dim):
+        benchmarks["cpu"] = bench_cpu(args.repeat)
+        benchmarks["local"] = bench_local(args.repeat, args.dim)
+        benchmarks["memory"] = bench_memory(args.memory_texts)
+    with stand_in_server(latency=args.latency, dim=args.dim):
+        benchmarks["throughput"] = bench_throughput(args.workers, 4 * max(args.workers))
+    benchmarks["import"] = bench_import(min(args.repeat, 10))
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ["output", "compare"]},
+        "benchmarks": benchmarks,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,91 @@
+import importlib
 import os
-
-from .api_requests import Analyse, Compare, Create, Embed, Select, Tokenize
-from .client_side import CalibratedSelect
+from typing import TYPE_CHECKING
 
 api_key = os.environ.get("MUSE_API_KEY")
 
+# public names and the submodule defining them, imported on first access so that `import lightonmuse`
+# doesn't pay for `requests` and NumPy when only some endpoints are used
+_LAZY_NAMES = {
+    "Analyse": "api_requests",
+    "Compare": "api_requests",
+    "Create": "api_requests",
+    "Embed": "api_requests",
+    "Select": "api_requests",
+    "Tokenize": "api_requests",
+    "CalibratedSelect": "client_side",
+    "DeadlineExceeded": "deadlines",
+    "AsyncAnalyse": "async_requests",
+    "AsyncCalibratedSelect": "async_requests",
+    "AsyncCompare": "async_requests",
+    "AsyncCreate": "async_requests",
+    "AsyncEmbed": "async_requests",
+    "AsyncSelect": "async_requests",
+    "AsyncShortlistSelect": "shortlist",
+    "AsyncTokenize": "async_requests",
+    "AsyncMicroBatcher": "batching",
+    "EmbeddingCache": "cache",
+    "Embeddings": "embeddings",
+    "EmbeddingIndex": "index",
+    "EmbeddingStore": "store",
+    "EndpointPool": "pool",
+    "HedgePolicy": "hedging",
+    "JSONCodec": "codec",
+    "LatencyAggregator": "instrumentation",
+    "Memo": "memo",
+    "MicroBatcher": "batching",
+    "MuseAPIError": "retry",
+    "RequestEvent": "instrumentation",
+    "RetryPolicy": "retry",
+    "ShortlistSelect": "shortlist",
+    "TokenBudget": "preflight",
+    "call_options": "deadlines",
+    "close_async_sessions": "sessions",
+    "configure_sessions": "sessions",
+}
+
+if TYPE_CHECKING:
+    from .api_requests import Analyse, Compare, Create, Embed, Select, Tokenize
+    from .async_requests import (
+        AsyncAnalyse,
+        AsyncCalibratedSelect,
+        AsyncCompare,
+        AsyncCreate,
+        AsyncEmbed,
+        AsyncSelect,
+        AsyncTokenize,
+    )
+    from .batching import AsyncMicroBatcher, MicroBatcher
+    from .cache import EmbeddingCache
+    from .client_side import CalibratedSelect
+    from .codec import JSONCodec
+    from .deadlines import DeadlineExceeded, call_options
+    from .embeddings import Embeddings
+    from .hedging import HedgePolicy
+    from .index import EmbeddingIndex
+    from .instrumentation import LatencyAggregator, RequestEvent
+    from .memo import Memo
+    from .pool import EndpointPool
+    from .preflight import TokenBudget
+    from .retry import MuseAPIError, RetryPolicy
+    from .sessions import close_async_sessions, configure_sessions
+    from .shortlist import AsyncShortlistSelect, ShortlistSelect
+    from .store import EmbeddingStore
+
+
+def __getattr__(name: str):
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # cache it, later accesses don't go through `__getattr__`
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
+
 
 __all__ = [
     "api_key",
@@ -15,4 +96,32 @@ __all__ = [
     "Select",
     "Tokenize",
     "CalibratedSelect",
+    "AsyncAnalyse",
+    "AsyncCalibratedSelect",
+    "AsyncCompare",
+    "AsyncCreate",
+    "AsyncEmbed",
+    "AsyncSelect",
+    "AsyncShortlistSelect",
+    "AsyncTokenize",
+    "AsyncMicroBatcher",
+    "DeadlineExceeded",
+    "EmbeddingCache",
+    "Embeddings",
+    "EmbeddingIndex",
+    "EmbeddingStore",
+    "EndpointPool",
+    "HedgePolicy",
+    "JSONCodec",
+    "LatencyAggregator",
+    "Memo",
+    "MicroBatcher",
+    "MuseAPIError",
+    "RequestEvent",
+    "RetryPolicy",
+    "ShortlistSelect",
+    "TokenBudget",
+    "call_options",
+    "close_async_sessions",
+    "configure_sessions",
 ]
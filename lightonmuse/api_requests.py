@@ -1,27 +1,107 @@
-import json
+from concurrent.futures import CancelledError
+from dataclasses import replace
+from functools import partial
 import os
-from typing import Dict, List, Optional, Tuple, Union
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING, Union
 import warnings
 
 import requests
 
+from .codec import JSONCodec
+from .deadlines import CallOptions, DEFAULT_TIMEOUT, DeadlineExceeded, Timeout, as_timeout, current_options
+from .dedup import DedupStats, deduplicate, fan_out
+from .hedging import Hedger, HedgePolicy, HedgeStats
+from .instrumentation import RequestEvent, RequestTrace
+from .memo import Memo
+from .parallel import MapIterator
+from .pool import EndpointPool
+from .retry import MuseAPIError, RetryPolicy, RetryStats
+from .sessions import connect_time, registry, reset_connect_time
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .cache import EmbeddingCache
+    from .embeddings import Embeddings
+
 
 class BaseRequest:
-    def __init__(self, model: str, endpoint: str):
+    """Base class of the endpoints, handling the transport of the requests.
+
+    Parameters
+    ----------
+    model: str,
+        name of the model to use as intelligence engine.
+    endpoint: str,
+        name of the API endpoint, e.g. `"create"`.
+    retry: Optional[RetryPolicy], default None,
+        how failed requests are retried. Defaults to `RetryPolicy()`: up to 3 retries with
+        exponential backoff on 429, 502, 503, 504 and connection errors.
+        Use `RetryPolicy(max_retries=0)` to disable retries.
+    codec: Optional[JSONCodec], default None,
+        how payloads are serialised and compressed. Defaults to `JSONCodec()`: gzip compression of
+        large request bodies and compressed responses, using `orjson` if it is installed.
+    memo: Optional[Memo], default None,
+        in-memory store of the responses to deterministic calls. Repeated calls are then served
+        without any request.
+    dedup: bool, default False,
+        whether to only send the unique inputs of a list of texts (`Embed`, `Analyse`, `Tokenize`)
+        or references (`Select`, `CalibratedSelect`), their outputs being copied back to every
+        repeated input. The number of inputs saved is counted in `dedup_stats`.
+    hooks: Optional[List[Callable[[RequestEvent], None]]], default None,
+        callbacks called with a `RequestEvent` after each request sent to the API, successful or
+        not, e.g. a `LatencyAggregator`. Calls served from `memo` or a cache send no request.
+    hedge: Optional[HedgePolicy], default None,
+        whether to send a duplicate of the request of slow deterministic calls and keep the first
+        response, to cut tail latency. How often hedging fired and won is counted in `hedge_stats`.
+    pool: Optional[EndpointPool], default None,
+        replicas of the API and API keys to spread the requests over, instead of `MUSE_BASE_URL`
+        and `MUSE_API_KEY`.
+    timeout: Optional[Union[float, Tuple[float, float]]], default (10., 300.),
+        connect and read timeouts in seconds of each attempt, a single number being used for both.
+        None to wait forever.
+    deadline: Optional[float], default None,
+        maximum time in seconds of a call, retries included, after which it raises
+        `DeadlineExceeded`. See `call_options` to set timeouts and deadlines per call.
+    """
+
+    # endpoints that only take a single input per request cap the chunks sent by `imap`
+    _max_map_batch_size = None
+
+    def __init__(
+        self,
+        model: str,
+        endpoint: str,
+        retry: Optional[RetryPolicy] = None,
+        codec: Optional[JSONCodec] = None,
+        memo: Optional[Memo] = None,
+        dedup: bool = False,
+        hooks: Optional[List[Callable[[RequestEvent], None]]] = None,
+        hedge: Optional[HedgePolicy] = None,
+        pool: Optional[EndpointPool] = None,
+        timeout: Optional[Timeout] = DEFAULT_TIMEOUT,
+        deadline: Optional[float] = None,
+    ):
         # can target different environments with `MUSE_BASE_URL`
         _base_url = os.environ.get("MUSE_BASE_URL")
-        if _base_url is not None:
-            self._base_url = _base_url
+        if pool is not None:
+            # each attempt picks its replica from the pool, this one is only the default
+            self._base_url = pool.base_urls[0]
+        elif _base_url is not None:
             # because sometimes a lazy copy-paste gets to be annoying
             if _base_url[-1] != "/":
                 _base_url = _base_url + "/"
+            self._base_url = _base_url
             warnings.warn(f"Bindings targeting {self._base_url}")
         else:
             # if no env variable is set, target the API
             self._base_url = "https://api.lighton.ai/muse/v1/"
+        self.endpoint = endpoint
         self.url = self._base_url + endpoint
         self.accept = "application/json"
-        self.api_key = os.environ.get("MUSE_API_KEY")
+        self.pool = pool
+        self.api_key = pool.api_keys[0] if pool is not None and pool.api_keys else os.environ.get("MUSE_API_KEY")
         if self.api_key is None:
             raise RuntimeError(
                 "No API key was detected. Set your API key by running"
@@ -29,25 +109,269 @@ class BaseRequest:
             )
         self.model = model
         self.content_type = "application/json"
-
-    @property
-    def headers(self) -> dict:
-        return {
+        self.codec = codec if codec is not None else JSONCodec()
+        # headers don't change between calls, build them once
+        self._headers = {
             "accept": self.accept,
             "X-API-KEY": self.api_key,
             "X-Model": self.model,
             "Content-Type": self.content_type,
+            **self.codec.headers,
         }
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.retry_stats = RetryStats()
+        self.memo = memo
+        self.dedup = dedup
+        self.dedup_stats = DedupStats()
+        self.hooks = list(hooks) if hooks else []
+        self.hedge = hedge
+        self.hedge_stats = HedgeStats()
+        self._hedger = Hedger(hedge, self.hedge_stats) if hedge is not None else None
+        self.timeout = as_timeout(timeout)
+        self.deadline = deadline
 
-    def request(self, payload) -> dict:
-        response = requests.post(self.url, data=payload, headers=self.headers)
-        if response.ok:
-            return response.json()
-        else:
-            raise RuntimeError(
-                f"The request failed with status code {response.status_code}: "
-                f"{response.content.decode('utf-8')}"
-            )
+    @property
+    def headers(self) -> dict:
+        return self._headers
+
+    @property
+    def session(self) -> requests.Session:
+        # keep-alive connection pool shared by every endpoint object targeting this base URL
+        return registry.get(self._base_url)
+
+    def _encode(self, payload) -> Tuple[bytes, dict]:
+        data, encoding_headers = self.codec.encode(payload)
+        return data, {**self.headers, **encoding_headers} if encoding_headers else self.headers
+
+    def request(self, payload, deterministic: bool = True) -> dict:
+        data, headers = self._encode(payload)
+        trace = RequestTrace(self.endpoint, self.model, len(data))
+        options = self._call_options()
+        attempt, throttled = 0, 0
+        try:
+            while True:
+                timeout = self._attempt_timeout(options)
+                attempt += 1
+                try:
+                    response = self._send(data, headers, trace, timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    # a read timeout may come after the request was processed, see `RetryPolicy`
+                    if not self.retry.should_retry(attempt) or not (
+                        deterministic or isinstance(e, requests.ConnectionError)
+                    ):
+                        raise
+                    self._wait_before_retry(options, self.retry.backoff(attempt), e)
+                    continue
+                if response.ok:
+                    self.retry_stats.record(attempt, throttled, failed=False)
+                    decoded = self.codec.loads(response.content)
+                    self._emit(trace.decoded(decoded))
+                    return decoded
+                throttled += response.status_code == 429
+                error = MuseAPIError(response.status_code, response.content.decode("utf-8"), attempt)
+                if not self.retry.should_retry(attempt, response.status_code, deterministic):
+                    raise error
+                backoff = self.retry.backoff(attempt, response.headers.get("Retry-After"))
+                self._wait_before_retry(options, backoff, error)
+        except (requests.ConnectionError, requests.Timeout, MuseAPIError, DeadlineExceeded, CancelledError) as e:
+            if attempt:
+                self.retry_stats.record(attempt, throttled, failed=True)
+                self._emit(trace.failed(e))
+            raise
+
+    def _call_options(self) -> CallOptions:
+        # options of the `call_options` block the call is made in, with the deadline of the endpoint object
+        options = current_options()
+        if self.deadline is not None:
+            deadline = time.monotonic() + self.deadline
+            if options.deadline is not None:
+                deadline = min(options.deadline, deadline)
+            options = replace(options, deadline=deadline)
+        return options
+
+    def _attempt_timeout(self, options: CallOptions) -> Optional[Tuple[float, float]]:
+        """Timeouts of the next attempt, raising if the call was abandoned or has no time left."""
+        if options.is_cancelled():
+            raise CancelledError()
+        timeout = options.timeout or self.timeout
+        remaining = options.remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded("The deadline of the call passed before its request could be sent.")
+        # an attempt can't outlive the deadline
+        timeout = timeout or (remaining, remaining)
+        return min(timeout[0], remaining), min(timeout[1], remaining)
+
+    @staticmethod
+    def _retry_delay(options: CallOptions, backoff: float, error: Exception) -> float:
+        """`backoff`, raising if another attempt can't start before the deadline."""
+        remaining = options.remaining()
+        if remaining is not None and backoff >= remaining:
+            raise DeadlineExceeded(f"No time left to retry before the deadline, last error: {error}") from error
+        return backoff
+
+    def _wait_before_retry(self, options: CallOptions, backoff: float, error: Exception):
+        if not options.sleep(self._retry_delay(options, backoff, error)):
+            raise CancelledError()
+
+    def _send(
+        self, data: bytes, headers: dict, trace: RequestTrace, timeout: Optional[Tuple[float, float]] = None
+    ) -> requests.Response:
+        # a single attempt, sent to a replica of `pool` if there is one
+        lease = self.pool.acquire() if self.pool is not None else None
+        base_url, url = (lease.base_url, lease.base_url + self.endpoint) if lease else (self._base_url, self.url)
+        if lease is not None and lease.api_key is not None:
+            headers = {**headers, "X-API-KEY": lease.api_key}
+        trace.attempt(base_url)
+        reset_connect_time()
+        status_code, retry_after, abandoned = None, None, True
+        try:
+            # stream to time the response headers and body separately
+            response = registry.get(base_url).post(url, data=data, headers=headers, stream=True, timeout=timeout)
+            trace.connect = connect_time()
+            trace.headers_received(response.status_code)
+            trace.body_received(response.headers, response.content)
+            status_code, retry_after, abandoned = response.status_code, response.headers.get("Retry-After"), False
+            return response
+        except (requests.ConnectionError, requests.Timeout):
+            abandoned = False
+            raise
+        finally:
+            if lease is not None:
+                self.pool.release(lease, status_code, retry_after, abandoned=abandoned)
+
+    def _emit(self, event: RequestEvent):
+        for hook in self.hooks:
+            # instrumentation must never fail the request it reports on
+            try:
+                hook(event)
+            except Exception as e:
+                warnings.warn(f"Instrumentation hook {hook!r} raised {type(e).__name__}: {e}")
+
+    def _submit(self, payload, parse: Callable[[dict], Any], deterministic: bool = True):
+        """Sends `payload` and post-processes the response with `parse`.
+
+        This is the single place where endpoints hand their payload over to the transport, so that
+        variants of the bindings (e.g. asynchronous ones) only need to override this method.
+        A `payload` of None means there is nothing to send (e.g. all the inputs were cached), and
+        `parse` is called with None. Only `deterministic` calls may be served from `memo` and hedged.
+        """
+        if payload is None:
+            return parse(None)
+        memo_key = self._memo_key(payload, deterministic)
+        response = self.memo.get(memo_key) if memo_key is not None else None
+        if response is None:
+            if self._hedger is not None and deterministic:
+                response = self._hedger.request(partial(self.request, payload))
+            else:
+                response = self.request(payload, deterministic)
+            if memo_key is not None:
+                self.memo.put(memo_key, response)
+        return parse(response)
+
+    def _deduplicate(self, items, key=None) -> Tuple[Any, Optional[List[int]]]:
+        """Unique `items` if `dedup` is on, and their inverse positions if some were repeated."""
+        if not self.dedup or not isinstance(items, list):
+            return items, None
+        unique, inverse = deduplicate(items, key)
+        self.dedup_stats.record(len(items), len(unique))
+        if len(unique) == len(items):
+            return items, None
+        return unique, inverse
+
+    def _fanned_out(self, parse: Callable[[dict], Any], unique: list, inverse: Optional[List[int]]):
+        """Wraps `parse` to copy the outputs of `unique` inputs back to every input."""
+        if inverse is None:
+            return parse
+        return partial(self._fan_out, parse, unique, inverse)
+
+    def _fan_out(self, parse: Callable[[dict], Any], unique: list, inverse: List[int], response: Optional[dict]):
+        outputs, cost, request_id = parse(response)
+        if isinstance(outputs, list):
+            # outputs of a single input may be unwrapped, as for chunks of `map`
+            outputs = self._map_outputs(unique, outputs)
+        return fan_out(outputs, inverse), cost, request_id
+
+    def _memo_key(self, payload, deterministic: bool):
+        if self.memo is None or not deterministic:
+            return None
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        return self.memo.key(self.url, self.model, payload)
+
+    @staticmethod
+    def _parse(response: dict) -> Tuple[List, int, str]:
+        request_id = response["request_id"]
+        cost = response["costs"]
+        outputs = response["outputs"][0]
+        return outputs, cost, request_id
+
+    def imap(
+        self, iterable: Iterable, batch_size: int = 32, workers: int = 4, ordered: bool = True, **kwargs
+    ) -> MapIterator:
+        """Lazily runs the endpoint over a large iterable of inputs.
+
+        The inputs are split into chunks of `batch_size`, sent concurrently by `workers` threads.
+        The input is only consumed as results are yielded, holding at most `2 * workers` chunks
+        in memory.
+
+        Parameters
+        ----------
+        iterable: Iterable,
+            inputs, e.g. texts for `Embed` or references for `Select`.
+        batch_size: int, default 32,
+            number of inputs sent per request.
+        workers: int, default 4,
+            number of requests in flight at the same time.
+        ordered: bool, default True,
+            if True, outputs are yielded in input order. Otherwise `(index, output)` pairs are
+            yielded as soon as their request completes.
+        **kwargs,
+            other arguments of the endpoint, e.g. `candidates` for `Select`.
+
+        Return
+        ------
+        results: MapIterator,
+            iterator over the outputs, one per input. The aggregated cost and the request IDs of
+            the completed requests are available in its `cost` and `request_ids` attributes.
+        """
+        batch_size = min(batch_size, self._max_map_batch_size or batch_size)
+        return MapIterator(partial(self._map_chunk, **kwargs), iterable, batch_size, workers, ordered)
+
+    def map(
+        self, iterable: Iterable, batch_size: int = 32, workers: int = 4, **kwargs
+    ) -> Tuple[List, dict, List[str]]:
+        """Runs the endpoint over a large iterable of inputs, see `imap`.
+
+        Return
+        ------
+        outputs: list,
+            one output per input, in input order. `Embed` gathers them in a single `Embeddings`
+            when called with `as_array=True`.
+        cost: dict,
+            cost of all the requests sent, summed per model.
+        request_ids: List[str],
+            ID strings of all the requests sent.
+        """
+        results = self.imap(iterable, batch_size=batch_size, workers=workers, **kwargs)
+        outputs = self._map_result(list(results), **kwargs)
+        return outputs, results.cost, results.request_ids
+
+    def _map_chunk(self, chunk: list, **kwargs) -> Tuple[List, dict, str]:
+        outputs, cost, request_id = self._map_call(chunk, **kwargs)
+        return self._map_outputs(chunk, outputs), cost, request_id
+
+    def _map_call(self, chunk: list, **kwargs):
+        return self(chunk, **kwargs)
+
+    @staticmethod
+    def _map_outputs(chunk: list, outputs: list) -> list:
+        return outputs
+
+    @staticmethod
+    def _map_result(outputs: list, **kwargs):
+        return outputs
 
 
 class Create(BaseRequest):
@@ -57,10 +381,12 @@ class Create(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="create")
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model=model, endpoint="create", **kwargs)
 
     def __call__(
         self,
@@ -182,12 +508,10 @@ class Create(BaseRequest):
             "return_logprobs": return_logprobs,
             "seed": seed,
         }
-        payload = json.dumps({"text": text, "params": params})
-        response = self.request(payload)
-        request_id = response["request_id"]
-        cost = response["costs"]
-        outputs = response["outputs"][0]
-        return outputs, cost, request_id
+        payload = self.codec.dumps({"text": text, "params": params})
+        # sampling is only reproducible when greedy or seeded, other calls must never be memoized
+        deterministic = mode == "greedy" or seed is not None
+        return self._submit(payload, self._parse, deterministic=deterministic)
 
 
 class Analyse(BaseRequest):
@@ -197,10 +521,12 @@ class Analyse(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="analyse")
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model=model, endpoint="analyse", **kwargs)
 
     def __call__(
         self, text: Union[str, List[str]], skill: Optional[str] = None
@@ -222,12 +548,9 @@ class Analyse(BaseRequest):
         request_id: str,
             ID string for the request.
         """
-        payload = json.dumps({"text": text})
-        response = self.request(payload)
-        request_id = response["request_id"]
-        cost = response["costs"]
-        outputs = response["outputs"][0]
-        return outputs, cost, request_id
+        text, inverse = self._deduplicate(text)
+        payload = self.codec.dumps({"text": text})
+        return self._submit(payload, self._fanned_out(self._parse, text, inverse))
 
 
 class Embed(BaseRequest):
@@ -237,37 +560,96 @@ class Embed(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    cache: Optional[EmbeddingCache], default None,
+        on-disk cache of embeddings. Only the texts missing from the cache are sent to the API.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="embed")
+    def __init__(self, model: str = "orion-fr-v2", cache: Optional["EmbeddingCache"] = None, **kwargs):
+        super().__init__(model=model, endpoint="embed", **kwargs)
+        self.cache = cache
 
     def __call__(
-        self, text: Union[str, List[str]], skill: Optional[str] = None
-    ) -> Tuple[List, int, str]:
+        self, text: Union[str, List[str]], skill: Optional[str] = None, as_array: bool = False
+    ) -> Tuple[Union[List, "Embeddings"], int, str]:
         """Parameters
         -------------
         text: Union[str, List[str]],
             input text or list of input texts.
         skill: Optional[str], default None,
             condition the model to perform a certain task. May be `"summarization"`.
+        as_array: bool, default False,
+            whether to return the embeddings as a single `(n_texts, dim)` float32 matrix instead
+            of lists of floats, see `Embeddings`.
 
         Return
         ------
-        outputs: list,
+        outputs: Union[list, Embeddings],
             list of dicts containing the input `text`(s), together with embeddings
-            and other metadata.
+            and other metadata. With `as_array=True`, an `Embeddings` tuple holding the
+            embeddings matrix and the list of metadata dicts.
         cost: int,
             cost for the analysis completed.
         request_id: str,
             ID string for the request.
         """
-        payload = json.dumps({"text": text})
-        response = self.request(payload)
-        request_id = response["request_id"]
-        cost = response["costs"]
-        outputs = response["outputs"][0]
-        return outputs, cost, request_id
+        text, inverse = self._deduplicate(text)
+        if self.cache is not None:
+            return self._cached_call(text, skill, as_array, inverse)
+        payload = self.codec.dumps({"text": text})
+        return self._submit(payload, self._fanned_out(self._parse_array if as_array else self._parse, text, inverse))
+
+    def _cached_call(
+        self, text: Union[str, List[str]], skill: Optional[str], as_array: bool, inverse: Optional[List[int]] = None
+    ):
+        from .cache import cache_key
+
+        texts = [text] if isinstance(text, str) else text
+        keys = [cache_key(self.model, skill, t) for t in texts]
+        cached = self.cache.get(keys)
+        missing = {key: t for key, t in zip(keys, texts) if key not in cached}
+        payload = self.codec.dumps({"text": list(missing.values())}) if missing else None
+        parse = partial(self._merge_cached, texts, keys, cached, list(missing), as_array)
+        return self._submit(payload, self._fanned_out(parse, texts, inverse))
+
+    def _merge_cached(
+        self,
+        texts: List[str],
+        keys: List[str],
+        cached: dict,
+        missing_keys: List[str],
+        as_array: bool,
+        response: Optional[dict],
+    ):
+        from .cache import merge_cached
+
+        if response is None:
+            # every text was cached, nothing was sent
+            fetched, cost, request_id = [], {}, None
+        else:
+            fetched, cost, request_id = self._parse(response)
+            self.cache.put({key: output["embedding"] for key, output in zip(missing_keys, fetched)})
+        return merge_cached(texts, keys, cached, fetched, as_array=as_array), cost, request_id
+
+    def _parse_array(self, response: dict) -> Tuple["Embeddings", int, str]:
+        from .embeddings import to_embeddings
+
+        outputs, cost, request_id = self._parse(response)
+        return to_embeddings(outputs), cost, request_id
+
+    @staticmethod
+    def _map_outputs(chunk: list, outputs: Union[List, "Embeddings"]) -> list:
+        if isinstance(outputs, list):
+            return outputs
+        # `as_array=True`, the rows are gathered back into a single matrix by `_map_result`
+        return list(zip(outputs.vectors, outputs.metadata))
+
+    @staticmethod
+    def _map_result(outputs: list, **kwargs) -> Union[List, "Embeddings"]:
+        from .embeddings import stack_embeddings
+
+        return stack_embeddings(outputs) if kwargs.get("as_array") else outputs
 
 
 class Select(BaseRequest):
@@ -277,10 +659,12 @@ class Select(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="select")
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model=model, endpoint="select", **kwargs)
 
     def __call__(
         self,
@@ -323,6 +707,43 @@ class Select(BaseRequest):
         request_id: str,
             ID string for the request.
         """
+        reference, candidates, inverse = self._deduplicate_references(reference, candidates)
+        payload = self._build_payload(
+            reference,
+            candidates,
+            evaluate_reference=evaluate_reference,
+            conjunction=conjunction,
+            skill=skill,
+            concat_best=concat_best,
+        )
+        return self._submit(payload, self._fanned_out(self._parse, reference, inverse))
+
+    def _deduplicate_references(
+        self, reference: Union[str, List[str]], candidates: Union[List[str], List[List[str]]]
+    ) -> Tuple[Union[str, List[str]], Union[List[str], List[List[str]]], Optional[List[int]]]:
+        # with different candidates for each reference, only identical pairs are repeated inputs
+        if (
+            isinstance(reference, list)
+            and candidates
+            and all(isinstance(x, list) for x in candidates)
+            and len(reference) == len(candidates)
+        ):
+            pairs, inverse = self._deduplicate(list(zip(reference, candidates)), key=lambda x: (x[0], tuple(x[1])))
+            if inverse is not None:
+                reference, candidates = [ref for ref, _ in pairs], [cand for _, cand in pairs]
+            return reference, candidates, inverse
+        reference, inverse = self._deduplicate(reference)
+        return reference, candidates, inverse
+
+    def _build_payload(
+        self,
+        reference: Union[str, List[str]],
+        candidates: Union[List[str], List[List[str]]],
+        evaluate_reference: bool = False,
+        conjunction: str = None,
+        skill: Optional[str] = None,
+        concat_best: bool = False,
+    ) -> bytes:
         if isinstance(reference, str):
             assert all(
                 isinstance(x, str) for x in candidates
@@ -370,8 +791,10 @@ class Select(BaseRequest):
             raise TypeError(
                 f"`reference` of type {type(reference)} is not supported, it should be `str` or `list`."
             )
-        payload = json.dumps(payload_dict)
-        response = self.request(payload)
+        return self.codec.dumps(payload_dict)
+
+    @staticmethod
+    def _parse(response: dict) -> Tuple[List, int, str]:
         request_id = response["request_id"]
         cost = response["costs"]
         outputs = response["outputs"]
@@ -380,6 +803,11 @@ class Select(BaseRequest):
             outputs = outputs[0]
         return outputs, cost, request_id
 
+    @staticmethod
+    def _map_outputs(chunk: list, outputs: list) -> list:
+        # a single reference gets its outputs unwrapped by `_parse`
+        return [outputs] if len(chunk) == 1 else outputs
+
 
 class Compare(BaseRequest):
     """Compare endpoint.
@@ -388,10 +816,33 @@ class Compare(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="compare")
+    _max_map_batch_size = 1
+    _embed_class = Embed
+
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model=model, endpoint="compare", **kwargs)
+        self._embedder = None
+
+    @property
+    def embedder(self) -> "Embed":
+        """`Embed` endpoint of the same model and transport options, used by `matrix`."""
+        if self._embedder is None:
+            self._embedder = self._embed_class(
+                self.model,
+                retry=self.retry,
+                codec=self.codec,
+                memo=self.memo,
+                hooks=self.hooks,
+                hedge=self.hedge,
+                pool=self.pool,
+                timeout=self.timeout,
+                deadline=self.deadline,
+            )
+        return self._embedder
 
     def __call__(
         self, reference: str, candidates: List[str], skill: Optional[str] = None
@@ -415,12 +866,91 @@ class Compare(BaseRequest):
         request_id: str,
             ID string for the request.
         """
-        payload = json.dumps({"reference": reference, "candidates": candidates})
-        response = self.request(payload)
-        request_id = response["request_id"]
-        cost = response["costs"]
-        outputs = response["outputs"][0]
-        return outputs, cost, request_id
+        payload = self.codec.dumps({"reference": reference, "candidates": candidates})
+        return self._submit(payload, self._parse)
+
+    def matrix(
+        self,
+        references: List[str],
+        candidates: List[str],
+        skill: Optional[str] = None,
+        top_k: Optional[int] = None,
+        block_size: int = 16384,
+        **kwargs,
+    ) -> Tuple[Union["np.ndarray", List[dict]], dict, List[str]]:
+        """Compares many references to the same candidates.
+
+        Each unique text among `references` and `candidates` is embedded once with `Embed`, and
+        the cosine similarities are computed locally, by blocks of `block_size` candidates.
+        This replaces one `Compare` request per reference, each embedding all the candidates again.
+
+        Parameters
+        ----------
+        references: List[str],
+            reference inputs to compute cosine similarity against.
+        candidates: List[str],
+            inputs compared to every reference.
+        skill: Optional[str], default None,
+            condition the model to perform a certain task. May be `"summarization"`.
+        top_k: Optional[int], default None,
+            if set, return the `top_k` most similar candidates of each reference instead of the
+            full matrix.
+        block_size: int, default 16384,
+            number of candidates scored at once, bounding the memory used.
+        **kwargs,
+            arguments of `Embed.map`, e.g. `batch_size` and `workers`.
+
+        Return
+        ------
+        outputs: Union[np.ndarray, List[dict]],
+            `(n_references, n_candidates)` float32 matrix of cosine similarities, or with `top_k`,
+            one dict per reference with the reference text, the `similarities` of its `top_k` best
+            candidates in decreasing order and the `best` candidate.
+        cost: dict,
+            cost of the embedding requests, summed per model.
+        request_ids: List[str],
+            ID strings of the embedding requests.
+        """
+        texts = list(dict.fromkeys([*references, *candidates]))
+        embeddings, cost, request_ids = self.embedder.map(texts, skill=skill, as_array=True, **kwargs)
+        return self._matrix_outputs(references, candidates, texts, embeddings, top_k, block_size), cost, request_ids
+
+    @staticmethod
+    def _matrix_outputs(
+        references: List[str],
+        candidates: List[str],
+        texts: List[str],
+        embeddings: "Embeddings",
+        top_k: Optional[int],
+        block_size: int,
+    ) -> Union["np.ndarray", List[dict]]:
+        import numpy as np
+
+        from .index import cosine_topk, normalize
+
+        vectors = normalize(embeddings.vectors) if texts else np.empty((0, 0), dtype=np.float32)
+        rows = {text: i for i, text in enumerate(texts)}
+        reference_vectors = vectors[[rows[text] for text in references]]
+        candidate_vectors = vectors[[rows[text] for text in candidates]]
+        if top_k is None:
+            similarities = np.empty((len(references), len(candidates)), dtype=np.float32)
+            for start in range(0, len(candidates), block_size):
+                block = candidate_vectors[start:start + block_size]
+                similarities[:, start:start + block_size] = reference_vectors @ block.T
+            return similarities
+        scores, indices = cosine_topk(reference_vectors, candidate_vectors, top_k, block_size=block_size)
+        outputs = []
+        for reference, row_scores, row_indices in zip(references, scores, indices):
+            ranked = [
+                {"candidate": candidates[i], "similarity": float(score)} for i, score in zip(row_indices, row_scores)
+            ]
+            outputs.append(
+                {"reference": reference, "similarities": ranked, "best": ranked[0]["candidate"] if ranked else None}
+            )
+        return outputs
+
+    def _map_call(self, chunk: list, **kwargs):
+        return self(chunk[0], **kwargs)
 
 
 class Tokenize(BaseRequest):
@@ -430,10 +960,12 @@ class Tokenize(BaseRequest):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model=model, endpoint="tokenize")
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model=model, endpoint="tokenize", **kwargs)
 
     def __call__(self, text: Union[str, List[str]]) -> Tuple[List, int, str]:
         """Parameters
@@ -451,9 +983,6 @@ class Tokenize(BaseRequest):
         request_id: str,
             ID string for the request.
         """
-        payload = json.dumps({"text": text})
-        response = self.request(payload)
-        request_id = response["request_id"]
-        cost = response["costs"]
-        outputs = response["outputs"][0]
-        return outputs, cost, request_id
+        text, inverse = self._deduplicate(text)
+        payload = self.codec.dumps({"text": text})
+        return self._submit(payload, self._fanned_out(self._parse, text, inverse))
@@ -0,0 +1,202 @@
+import asyncio
+from functools import partial
+from typing import Any, Callable, Iterable, List, Mapping, Optional, Tuple
+import weakref
+
+from .api_requests import Analyse, Compare, Create, Embed, Select, Tokenize
+from .client_side import CalibratedSelect
+from .deadlines import DeadlineExceeded
+from .instrumentation import RequestTrace
+from .parallel import AsyncMapIterator
+from .retry import MuseAPIError
+from .sessions import async_registry
+
+
+class AsyncRequest:
+    """Mixin turning an endpoint into its `asyncio` counterpart.
+
+    Calling the endpoint returns a coroutine resolving to the same `(outputs, cost, request_id)`
+    tuple as the blocking endpoint. Requests go through a pooled `aiohttp` session shared by every
+    asynchronous endpoint object of the event loop.
+
+    Parameters
+    ----------
+    model: str,
+        name of the model to use as intelligence engine.
+    max_in_flight: int, default 64,
+        maximum number of requests this endpoint object keeps in flight at the same time. Further
+        calls wait for a slot before being sent.
+    """
+
+    def __init__(self, model: str = "orion-fr-v2", max_in_flight: int = 64, **kwargs):
+        super().__init__(model, **kwargs)
+        self.max_in_flight = max_in_flight
+        # semaphores are bound to an event loop, keep one per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _in_flight(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return semaphore
+
+    async def request(self, payload, deterministic: bool = True) -> dict:
+        import aiohttp
+
+        data, headers = self._encode(payload)
+        trace = RequestTrace(self.endpoint, self.model, len(data))
+        options = self._call_options()
+        attempt, throttled = 0, 0
+        try:
+            while True:
+                timeout = self._attempt_timeout(options)
+                attempt += 1
+                try:
+                    async with self._in_flight():
+                        status, content, response_headers = await self._send(data, headers, trace, timeout)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    # only failing to connect guarantees the request wasn't processed, see `RetryPolicy`
+                    if not self.retry.should_retry(attempt) or not (
+                        deterministic or isinstance(e, aiohttp.ClientConnectorError)
+                    ):
+                        raise
+                    await asyncio.sleep(self._retry_delay(options, self.retry.backoff(attempt), e))
+                    continue
+                if status < 400:
+                    self.retry_stats.record(attempt, throttled, failed=False)
+                    decoded = self.codec.loads(content)
+                    self._emit(trace.decoded(decoded))
+                    return decoded
+                throttled += status == 429
+                error = MuseAPIError(status, content.decode("utf-8"), attempt)
+                if not self.retry.should_retry(attempt, status, deterministic):
+                    raise error
+                backoff = self.retry.backoff(attempt, response_headers.get("Retry-After"))
+                await asyncio.sleep(self._retry_delay(options, backoff, error))
+        except (
+            aiohttp.ClientConnectionError, asyncio.TimeoutError, MuseAPIError, DeadlineExceeded, asyncio.CancelledError
+        ) as e:
+            # cancellations, e.g. by a timeout of the caller or a lost hedge, are recorded as failures too
+            if attempt:
+                self.retry_stats.record(attempt, throttled, failed=True)
+                self._emit(trace.failed(e))
+            raise
+
+    async def _send(
+        self, data: bytes, headers: dict, trace: RequestTrace, timeout: Optional[Tuple[float, float]] = None
+    ) -> Tuple[int, bytes, Mapping[str, str]]:
+        import aiohttp
+
+        lease = self.pool.acquire() if self.pool is not None else None
+        base_url, url = (lease.base_url, lease.base_url + self.endpoint) if lease else (self._base_url, self.url)
+        if lease is not None and lease.api_key is not None:
+            headers = {**headers, "X-API-KEY": lease.api_key}
+        session = async_registry.get(base_url)
+        client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1]) if timeout else None
+        trace.attempt(base_url)
+        status, retry_after, abandoned = None, None, True
+        try:
+            async with session.post(
+                url, data=data, headers=headers, timeout=client_timeout, trace_request_ctx=trace
+            ) as response:
+                trace.headers_received(response.status)
+                content = await response.read()
+                trace.body_received(response.headers, content)
+            status, retry_after, abandoned = response.status, response.headers.get("Retry-After"), False
+            return status, content, response.headers
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            abandoned = False
+            raise
+        finally:
+            if lease is not None:
+                self.pool.release(lease, status, retry_after, abandoned=abandoned)
+
+    def _submit(self, payload, parse: Callable[[dict], Any], deterministic: bool = True):
+        async def send():
+            if payload is None:
+                return parse(None)
+            memo_key = self._memo_key(payload, deterministic)
+            response = self.memo.get(memo_key) if memo_key is not None else None
+            if response is None:
+                if self._hedger is not None and deterministic:
+                    response = await self._hedger.arequest(partial(self.request, payload))
+                else:
+                    response = await self.request(payload, deterministic)
+                if memo_key is not None:
+                    self.memo.put(memo_key, response)
+            return parse(response)
+
+        return send()
+
+    def imap(
+        self, iterable: Iterable, batch_size: int = 32, workers: int = 4, ordered: bool = True, **kwargs
+    ) -> AsyncMapIterator:
+        """Lazily runs the endpoint over a large iterable of inputs, to be used with `async for`.
+
+        See `BaseRequest.imap`, `workers` being the number of requests in flight at the same time.
+        """
+        batch_size = min(batch_size, self._max_map_batch_size or batch_size)
+        return AsyncMapIterator(partial(self._map_chunk, **kwargs), iterable, batch_size, workers, ordered)
+
+    async def map(
+        self, iterable: Iterable, batch_size: int = 32, workers: int = 4, **kwargs
+    ) -> Tuple[List, dict, List[str]]:
+        """Runs the endpoint over a large iterable of inputs, see `BaseRequest.map`."""
+        results = self.imap(iterable, batch_size=batch_size, workers=workers, **kwargs)
+        outputs = self._map_result([output async for output in results], **kwargs)
+        return outputs, results.cost, results.request_ids
+
+    async def _map_chunk(self, chunk: list, **kwargs) -> Tuple[List, dict, str]:
+        outputs, cost, request_id = await self._map_call(chunk, **kwargs)
+        return self._map_outputs(chunk, outputs), cost, request_id
+
+
+class AsyncCreate(AsyncRequest, Create):
+    """Asynchronous Create endpoint, see `Create`."""
+
+
+class AsyncAnalyse(AsyncRequest, Analyse):
+    """Asynchronous Analyse endpoint, see `Analyse`."""
+
+
+class AsyncEmbed(AsyncRequest, Embed):
+    """Asynchronous Embed endpoint, see `Embed`."""
+
+
+class AsyncSelect(AsyncRequest, Select):
+    """Asynchronous Select endpoint, see `Select`."""
+
+
+class AsyncCompare(AsyncRequest, Compare):
+    """Asynchronous Compare endpoint, see `Compare`.
+
+    `matrix` must be awaited, the texts being embedded with `AsyncEmbed`.
+    """
+
+    _embed_class = AsyncEmbed
+
+    async def matrix(
+        self,
+        references: List[str],
+        candidates: List[str],
+        skill: Optional[str] = None,
+        top_k: Optional[int] = None,
+        block_size: int = 16384,
+        **kwargs,
+    ):
+        """Compares many references to the same candidates, see `Compare.matrix`."""
+        texts = list(dict.fromkeys([*references, *candidates]))
+        embeddings, cost, request_ids = await self.embedder.map(texts, skill=skill, as_array=True, **kwargs)
+        return self._matrix_outputs(references, candidates, texts, embeddings, top_k, block_size), cost, request_ids
+
+
+class AsyncTokenize(AsyncRequest, Tokenize):
+    """Asynchronous Tokenize endpoint, see `Tokenize`."""
+
+
+class AsyncCalibratedSelect(AsyncRequest, CalibratedSelect):
+    """Asynchronous Calibrated Select endpoint, see `CalibratedSelect`.
+
+    Both `fit` and calling the endpoint must be awaited.
+    """
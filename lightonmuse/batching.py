@@ -0,0 +1,176 @@
+import asyncio
+from concurrent.futures import Future
+import json
+import threading
+from typing import Dict, List, Tuple, Union
+
+from .embeddings import Embeddings
+
+
+def _batch_key(params: dict) -> str:
+    # calls can only share a request if all their parameters are identical
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def _split(outputs: Union[List, Embeddings]) -> list:
+    # outputs of each text of the batch, shaped as if it had been sent alone
+    if isinstance(outputs, Embeddings):
+        return outputs.rows()
+    return [[output] for output in outputs]
+
+
+class _Batch:
+    def __init__(self, params: dict):
+        self.params = params
+        self.texts = []
+        self.futures = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-text calls into batched requests.
+
+    `Embed`, `Analyse`, `Tokenize` and `Create` accept a list of texts that the API processes as a
+    single batch. `MicroBatcher` wraps one of these endpoints: calls made from different threads
+    within `max_wait` seconds with identical parameters are sent together as one request, and each
+    caller receives its own slice of the outputs.
+
+    Parameters
+    ----------
+    endpoint: BaseRequest,
+        endpoint accepting a list of texts, e.g. `Embed("orion-fr")`. Its model is shared by all
+        batched calls.
+    max_batch_size: int, default 32,
+        a batch is sent as soon as it holds this many texts.
+    max_wait: float, default 0.01,
+        maximum time in seconds the first call of a batch waits for other calls to join it.
+    """
+
+    def __init__(self, endpoint, max_batch_size: int = 32, max_wait: float = 0.01):
+        self.endpoint = endpoint
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: Dict[str, _Batch] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str, **params) -> Tuple[List, dict, str]:
+        """Parameters
+        -------------
+        text: str,
+            single input text.
+        **params,
+            keyword arguments of the wrapped endpoint, e.g. `n_tokens` for `Create`.
+
+        Return
+        ------
+        outputs: list,
+            list holding the single output dict for `text`, as for a non-batched call.
+        cost: dict,
+            cost of the whole batched request `text` was sent with.
+        request_id: str,
+            ID string of the batched request.
+        """
+        if not isinstance(text, str):
+            raise TypeError(f"`text` of type {type(text)} is not supported, it should be `str`.")
+        future = Future()
+        key = _batch_key(params)
+        with self._lock:
+            batch = self._pending.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = self._pending[key] = _Batch(params)
+            batch.texts.append(text)
+            batch.futures.append(future)
+            is_full = len(batch.texts) >= self.max_batch_size
+            if is_full:
+                del self._pending[key]
+                batch.full.set()
+        if is_full:
+            self._flush(batch)
+        elif is_leader:
+            # the first caller of the batch waits for it to fill up, and sends it on timeout
+            if not batch.full.wait(self.max_wait):
+                with self._lock:
+                    is_pending = self._pending.get(key) is batch
+                    if is_pending:
+                        del self._pending[key]
+                if is_pending:
+                    self._flush(batch)
+        return future.result()
+
+    def _flush(self, batch: _Batch):
+        try:
+            outputs, cost, request_id = self.endpoint(batch.texts, **batch.params)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for output, future in zip(_split(outputs), batch.futures):
+            future.set_result((output, cost, request_id))
+
+
+class AsyncMicroBatcher:
+    """Coalesces concurrent single-text calls from coroutines into batched requests.
+
+    Asynchronous counterpart of `MicroBatcher`, wrapping an asynchronous endpoint such as
+    `AsyncEmbed("orion-fr")`.
+
+    Parameters
+    ----------
+    endpoint: AsyncRequest,
+        asynchronous endpoint accepting a list of texts.
+    max_batch_size: int, default 32,
+        a batch is sent as soon as it holds this many texts.
+    max_wait: float, default 0.01,
+        maximum time in seconds the first call of a batch waits for other calls to join it.
+    """
+
+    def __init__(self, endpoint, max_batch_size: int = 32, max_wait: float = 0.01):
+        self.endpoint = endpoint
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: Dict[str, _Batch] = {}
+        # keep references to the running flushes so that they aren't garbage collected
+        self._flushing = set()
+
+    async def __call__(self, text: str, **params) -> Tuple[List, dict, str]:
+        """See `MicroBatcher.__call__`."""
+        if not isinstance(text, str):
+            raise TypeError(f"`text` of type {type(text)} is not supported, it should be `str`.")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = _batch_key(params)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(params)
+            loop.call_later(self.max_wait, self._send, key, batch)
+        batch.texts.append(text)
+        batch.futures.append(future)
+        if len(batch.texts) >= self.max_batch_size:
+            self._send(key, batch)
+        return await future
+
+    def _send(self, key: str, batch: _Batch):
+        # called either when the batch is full or when its timer fires, whichever comes first
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: _Batch):
+        try:
+            outputs, cost, request_id = await self.endpoint(batch.texts, **batch.params)
+        except asyncio.CancelledError:
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for output, future in zip(_split(outputs), batch.futures):
+            if not future.done():
+                future.set_result((output, cost, request_id))
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import unicodedata
+
+import numpy as np
+
+from .embeddings import Embeddings
+
+
+def cache_key(model: str, skill: Optional[str], text: str) -> str:
+    """Key of the embedding of `text` by `model` conditioned on `skill`."""
+    text = unicodedata.normalize("NFC", text)
+    return hashlib.sha256(f"{model}\0{skill or ''}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent on-disk cache of embeddings, shared by processes and evicted by size with LRU.
+
+    Embeddings are stored as float32 blobs in a SQLite database in WAL mode, so that many worker
+    processes can read and write the same cache concurrently. Pass it to `Embed` to only send the
+    texts that aren't cached yet.
+
+    Parameters
+    ----------
+    path: str,
+        path of the SQLite database file, created if it doesn't exist.
+    max_bytes: int, default 1 GiB,
+        maximum total size of the stored embeddings. Least recently used entries are evicted
+        beyond it.
+    timeout: float, default 30.,
+        time in seconds to wait for a lock held by another process.
+    touch_interval: float, default 60.,
+        minimum time in seconds between two refreshes of the last access time of an entry. Hits on
+        entries refreshed more recently are plain reads, so that frequent lookups don't contend for
+        the write lock. Recency is tracked at this granularity for the LRU eviction.
+
+    Attributes
+    ----------
+    hits: int,
+        number of lookups served from the cache by this process.
+    misses: int,
+        number of lookups not found in the cache by this process.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30, timeout: float = 30.0, touch_interval: float = 60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        with self._lock:
+            self._connect()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of this process and size of the cache shared by all processes."""
+        with self._lock:
+            connection = self._connect()
+            entries, size = self._totals(connection)
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached embeddings among `keys`, refreshing their last access time, see `touch_interval`."""
+        found, stale = {}, []
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            unique_keys = list(dict.fromkeys(keys))
+            # stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                rows = connection.execute(
+                    f"SELECT key, vector, last_access FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, vector, last_access in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+                    if now - last_access >= self.touch_interval:
+                        stale.append((now, key, now - self.touch_interval))
+            if stale:
+                # another process may have refreshed them in the meantime
+                with connection:
+                    connection.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ? AND last_access <= ?", stale
+                    )
+            n_hits = sum(key in found for key in keys)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+        return found
+
+    def put(self, items: Dict[str, np.ndarray]):
+        """Stores embeddings by key, then evicts least recently used entries beyond `max_bytes`."""
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                # not `INSERT OR REPLACE`, whose implicit deletions don't fire the triggers
+                if sqlite3.sqlite_version_info >= (3, 24, 0):
+                    connection.executemany(
+                        "INSERT INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET "
+                        "vector = excluded.vector, size = excluded.size, last_access = excluded.last_access",
+                        rows,
+                    )
+                else:
+                    # upserts need SQLite 3.24
+                    connection.executemany("DELETE FROM embeddings WHERE key = ?", [(row[0],) for row in rows])
+                    connection.executemany(
+                        "INSERT INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)", rows
+                    )
+                self._evict(connection)
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM embeddings")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _totals(connection: sqlite3.Connection) -> Tuple[int, int]:
+        totals = dict(connection.execute("SELECT name, value FROM cache_metadata"))
+        return totals["entries"], totals["bytes"]
+
+    def _evict(self, connection: sqlite3.Connection):
+        _, size = self._totals(connection)
+        if size <= self.max_bytes:
+            return
+        # evict down to 90% of the limit so that eviction doesn't run on every insertion
+        excess = size - int(0.9 * self.max_bytes)
+        evicted, freed = [], 0
+        for key, entry_size in connection.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            evicted.append((key,))
+            freed += entry_size
+            if freed >= excess:
+                break
+        connection.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+                )
+                connection.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)")
+                # running totals kept by triggers in the transaction of every write, so that eviction
+                # doesn't scan the whole table
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_metadata (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings BEGIN "
+                    "UPDATE cache_metadata SET value = value + new.size WHERE name = 'bytes'; "
+                    "UPDATE cache_metadata SET value = value + 1 WHERE name = 'entries'; END"
+                )
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_update AFTER UPDATE OF size ON embeddings BEGIN "
+                    "UPDATE cache_metadata SET value = value + new.size - old.size WHERE name = 'bytes'; END"
+                )
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings BEGIN "
+                    "UPDATE cache_metadata SET value = value - old.size WHERE name = 'bytes'; "
+                    "UPDATE cache_metadata SET value = value - 1 WHERE name = 'entries'; END"
+                )
+                # initialised after the triggers exist, so that no concurrent write is missed, also for
+                # caches created by earlier versions
+                connection.execute(
+                    "INSERT OR IGNORE INTO cache_metadata (name, value) "
+                    "SELECT 'bytes', COALESCE(SUM(size), 0) FROM embeddings"
+                )
+                connection.execute(
+                    "INSERT OR IGNORE INTO cache_metadata (name, value) SELECT 'entries', COUNT(*) FROM embeddings"
+                )
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+
+def merge_cached(
+    texts: List[str],
+    keys: List[str],
+    cached: Dict[str, np.ndarray],
+    fetched: List[dict],
+    as_array: bool = False,
+):
+    """Assembles the `Embed` outputs of `texts` from cached embeddings and freshly `fetched` outputs.
+
+    `fetched` holds the outputs of the texts whose keys aren't in `cached`, in order of first
+    occurrence. Cached texts get `{"cached": True}` as execution metadata.
+    """
+    fetched_by_key = {}
+    for key in keys:
+        if key not in cached and key not in fetched_by_key:
+            fetched_by_key[key] = fetched[len(fetched_by_key)]
+    metadata, vectors = [], []
+    for text, key in zip(texts, keys):
+        output = fetched_by_key.get(key)
+        if output is None:
+            vector, output = cached[key], {"text": text, "execution_metadata": {"cached": True}}
+        else:
+            vector, output = output["embedding"], {k: v for k, v in output.items() if k != "embedding"}
+        if as_array:
+            vectors.append(vector)
+        else:
+            output["embedding"] = vector.tolist() if isinstance(vector, np.ndarray) else vector
+        metadata.append(output)
+    if as_array:
+        if not vectors:
+            return Embeddings(np.empty((0, 0), dtype=np.float32), [])
+        return Embeddings(np.array(vectors, dtype=np.float32), metadata)
+    return metadata
@@ -0,0 +1,218 @@
+"""Command line interface of the bindings.
+
+Runs a JSONL file of requests, one JSON object of endpoint arguments per line::
+
+    $ lightonmuse run requests.jsonl results.jsonl --endpoint embed --model lyra-en --workers 8
+
+A line may set its own `"endpoint"` and `"model"`, e.g.
+`{"endpoint": "select", "reference": "...", "candidates": ["...", "..."]}`.
+"""
+import argparse
+from collections import deque
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .api_requests import Analyse, BaseRequest, Compare, Create, Embed, Select, Tokenize
+from .parallel import MapIterator, merge_costs
+
+ENDPOINTS = {
+    "analyse": Analyse,
+    "compare": Compare,
+    "create": Create,
+    "embed": Embed,
+    "select": Select,
+    "tokenize": Tokenize,
+}
+
+
+class Progress:
+    """Throughput, latency percentiles and costs of a bulk run, reported periodically.
+
+    Parameters
+    ----------
+    report_every: float,
+        time in seconds between two reports.
+    out: TextIO,
+        stream the reports are written to.
+    window: int, default 10000,
+        number of most recent requests the latency percentiles are computed over.
+    """
+
+    def __init__(self, report_every: float, out: TextIO, window: int = 10000):
+        self.report_every = report_every
+        self.out = out
+        self.lines = 0
+        self.errors = 0
+        self.skipped = 0
+        self.cost = {}
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._start = self._last_report = time.monotonic()
+
+    def record_latency(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def record(self, record: dict):
+        self.lines += 1
+        self.errors += "error" in record
+        merge_costs(self.cost, record.get("costs") or {})
+        if time.monotonic() - self._last_report >= self.report_every:
+            self.report()
+
+    def percentiles(self) -> Dict[str, float]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return {}
+        return {f"p{q}": latencies[min(len(latencies) - 1, len(latencies) * q // 100)] for q in (50, 90, 99)}
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self._start
+        return {
+            "lines": self.lines,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "elapsed": elapsed,
+            "lines_per_second": self.lines / elapsed if elapsed else 0.0,
+            "latency": self.percentiles(),
+            "costs": self.cost,
+        }
+
+    def report(self):
+        self._last_report = time.monotonic()
+        summary = self.summary()
+        latency = " ".join(f"{q}={value * 1000:.0f}ms" for q, value in summary["latency"].items())
+        self.out.write(
+            f"[lightonmuse] {summary['lines']} lines ({summary['errors']} errors, {summary['skipped']} resumed) "
+            f"{summary['lines_per_second']:.1f} lines/s {latency} costs={json.dumps(summary['costs'])}\n"
+        )
+        self.out.flush()
+
+
+def run(
+    input_path: str,
+    output_path: str,
+    endpoint: Optional[str] = None,
+    model: str = "orion-fr-v2",
+    workers: int = 4,
+    report_every: float = 10.0,
+    out: TextIO = sys.stderr,
+) -> dict:
+    """Runs every request of `input_path` and writes the results to `output_path`, in input order.
+
+    Line `i` of the output holds the `outputs`, `costs` and `request_id` of line `i` of the input,
+    or its `error` if it failed after its retries. The output file is the checkpoint: running the
+    same command again after an interruption skips the lines already written.
+
+    Parameters
+    ----------
+    input_path: str,
+        JSONL file of requests, each line being a JSON object of arguments of the endpoint.
+    output_path: str,
+        JSONL file of results, appended to if it already exists.
+    endpoint: Optional[str], default None,
+        endpoint of the lines that don't set `"endpoint"`. One of `ENDPOINTS`.
+    model: str, default "orion-fr-v2",
+        model of the lines that don't set `"model"`.
+    workers: int, default 4,
+        number of requests in flight at the same time.
+    report_every: float, default 10.,
+        time in seconds between two progress reports.
+    out: TextIO, default sys.stderr,
+        stream progress reports are written to.
+
+    Return
+    ------
+    summary: dict,
+        number of lines run, errors and lines skipped, throughput, latency percentiles and costs.
+    """
+    progress = Progress(report_every, out)
+    endpoints = {}
+    lock = threading.Lock()
+
+    def get_endpoint(name: str, model_name: str) -> BaseRequest:
+        with lock:
+            if (name, model_name) not in endpoints:
+                if name not in ENDPOINTS:
+                    raise ValueError(f"endpoint: {name} is not valid. Use one of {', '.join(ENDPOINTS)}")
+                endpoints[name, model_name] = ENDPOINTS[name](model_name)
+            return endpoints[name, model_name]
+
+    def call(chunk: list) -> Tuple[List[Tuple[dict, str]], dict, Optional[str]]:
+        (line,) = chunk
+        start = time.monotonic()
+        try:
+            kwargs = json.loads(line)
+            request = get_endpoint(kwargs.pop("endpoint", endpoint), kwargs.pop("model", model))
+            outputs, cost, request_id = request(**kwargs)
+            record = {"outputs": outputs, "costs": cost, "request_id": request_id}
+            serialized = json.dumps(record, ensure_ascii=False)
+        except Exception as e:
+            # any failure of a line, e.g. invalid arguments, retries running out or outputs that can't be
+            # serialised, is recorded on its line without stopping the run
+            record = {"error": f"{type(e).__name__}: {e}"}
+            serialized = json.dumps(record, ensure_ascii=False)
+        progress.record_latency(time.monotonic() - start)
+        return [(record, serialized)], {}, record.get("request_id")
+
+    progress.skipped = _resume(output_path)
+    with open(input_path, encoding="utf-8") as inputs, open(output_path, "a", encoding="utf-8") as results:
+        lines = _remaining_lines(inputs, progress.skipped)
+        for record, serialized in MapIterator(call, lines, batch_size=1, workers=workers, ordered=True):
+            results.write(serialized + "\n")
+            results.flush()
+            progress.record(record)
+    progress.report()
+    return progress.summary()
+
+
+def _resume(output_path: str) -> int:
+    # the complete lines of the output are done, drop a line left incomplete by an interruption
+    if not os.path.exists(output_path):
+        return 0
+    n_lines, end = 0, 0
+    with open(output_path, "rb+") as f:
+        # read by blocks, results of large runs don't fit in memory
+        for block in iter(lambda: f.read(1 << 20), b""):
+            if b"\n" in block:
+                n_lines += block.count(b"\n")
+                end = f.tell() - len(block) + block.rfind(b"\n") + 1
+        f.truncate(end)
+    return n_lines
+
+
+def _remaining_lines(inputs: TextIO, skip: int) -> Iterator[str]:
+    for i, line in enumerate(inputs):
+        if i >= skip:
+            yield line
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="lightonmuse", description="Python client for the LightOn Muse API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run a JSONL file of requests, resuming interrupted runs")
+    run_parser.add_argument("input", help="JSONL file of requests, one JSON object of endpoint arguments per line")
+    run_parser.add_argument("output", help="JSONL file of results, in input order")
+    run_parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), help="endpoint of lines without `endpoint`")
+    run_parser.add_argument("--model", default="orion-fr-v2", help="model of lines without `model`")
+    run_parser.add_argument("--workers", type=int, default=4, help="number of requests in flight")
+    run_parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress reports")
+    args = parser.parse_args(argv)
+    summary = run(
+        args.input,
+        args.output,
+        endpoint=args.endpoint,
+        model=args.model,
+        workers=args.workers,
+        report_every=args.report_every,
+    )
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
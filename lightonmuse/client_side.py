@@ -1,3 +1,5 @@
+from functools import partial
+import json
 from typing import List, Optional, Tuple, Union
 import numpy as np
 from .api_requests import Select
@@ -10,10 +12,12 @@ class CalibratedSelect(Select):
     ----------
     model: str,
         name of the model to use as intelligence engine.
+    **kwargs,
+        transport options, see `BaseRequest`.
     """
 
-    def __init__(self, model: str = "orion-fr-v2"):
-        super().__init__(model)
+    def __init__(self, model: str = "orion-fr-v2", **kwargs):
+        super().__init__(model, **kwargs)
         self.candidates = None
         self.conjunction = None
         self.W = None
@@ -49,13 +53,76 @@ class CalibratedSelect(Select):
             content_free_inputs = [content_free_inputs]
 
         self.content_free_inputs = content_free_inputs
-        self.W, self.b = self.get_calibration_matrices()
+        return self._submit(self._calibration_payload(), self._fit_response)
 
     def get_calibration_matrices(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._submit(self._calibration_payload(), self._calibration_response)
+
+    def state(self) -> dict:
+        """Fitted calibration state, as a JSON-serialisable dict to be restored with `from_state`."""
+        if self.W is None:
+            raise RuntimeError(
+                "Calibration should be initialized with the `fit` method before use."
+            )
+        return {
+            "model": self.model,
+            "candidates": self.candidates,
+            "conjunction": self.conjunction,
+            "calibration_mode": self.calibration_mode,
+            "content_free_inputs": self.content_free_inputs,
+            "W": self.W.tolist(),
+            "b": self.b.tolist(),
+            "calib_cost": self.calib_cost,
+        }
+
+    def save(self, path: str):
+        """Saves the fitted calibration state to a JSON file, to be restored with `load`."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.state(), f, ensure_ascii=False)
+
+    @classmethod
+    def from_state(cls, state: dict, model: Optional[str] = None, **kwargs) -> "CalibratedSelect":
+        """Restores a fitted endpoint from `state`, without calling the API.
+
+        Parameters
+        ----------
+        state: dict,
+            calibration state returned by `state`.
+        model: Optional[str], default None,
+            model the endpoint is meant to use, checked against the one the calibration was fitted
+            with. Defaults to the model of the state.
+        **kwargs,
+            transport options, see `BaseRequest`.
+        """
+        if model is not None and model != state["model"]:
+            raise ValueError(f"Calibration fitted with `{state['model']}`, but endpoint uses `{model}`.")
+        selector = cls(state["model"], **kwargs)
+        selector.candidates = state["candidates"]
+        selector.conjunction = state["conjunction"]
+        selector.calibration_mode = state["calibration_mode"]
+        selector.content_free_inputs = state["content_free_inputs"]
+        selector.W = np.array(state["W"])
+        selector.b = np.array(state["b"])
+        selector.calib_cost = state["calib_cost"]
+        return selector
+
+    @classmethod
+    def load(cls, path: str, model: Optional[str] = None, **kwargs) -> "CalibratedSelect":
+        """Loads a calibration saved with `save`, see `from_state`."""
+        with open(path, encoding="utf-8") as f:
+            return cls.from_state(json.load(f), model=model, **kwargs)
+
+    def _calibration_payload(self) -> bytes:
         # Calculate the content-free probabilities for different content-free templates
-        out_cf, _, _ = super().__call__(
+        return self._build_payload(
             self.content_free_inputs, self.candidates, conjunction=self.conjunction
         )
+
+    def _fit_response(self, response: dict):
+        self.W, self.b = self._calibration_response(response)
+
+    def _calibration_response(self, response: dict) -> Tuple[np.ndarray, np.ndarray]:
+        out_cf, _, _ = self._parse(response)
         if isinstance(out_cf[0], dict):
             out_cf[0] = [out_cf[0]]
         all_p_cf = [
@@ -82,18 +149,23 @@ class CalibratedSelect(Select):
 
     def __call__(
         self,
-        reference: str,
-        candidates: List[str],
+        reference: Union[str, List[str]],
+        candidates: Union[List[str], List[List[str]]],
         conjunction: str = None,
         concat_best: bool = False,
     ) -> Tuple[List, int, str]:
         """Parameters
         -------------
-        reference: str,
-            reference input to compute likelihood against.
-        candidates: List[str],
+        reference: Union[str, List[str]],
+            reference input or list of reference inputs to compute likelihood against. A list is
+            sent in a single request and calibrated at once, use `map` to send large datasets in
+            concurrent chunks.
+        candidates: Union[List[str], List[List[str]]],
             input(s) that are compared to the reference and ranked based on likelihood.
-            Must match the candidates used in the `fit` method.
+            Must match the candidates used in the `fit` method. If `candidates` is a list of lists,
+            `reference` should be a list of the same length, and each entry is a subset of the
+            fitted candidates ranked for the corresponding reference, e.g. a shortlist. The scores
+            are then calibrated with the content-free probabilities renormalized over the subset.
         conjunction: str, default to None,
             expression used to link `reference` and `candidates` to create the prompt used to
             compute the likelihood. The prompt will have the structure
@@ -108,63 +180,125 @@ class CalibratedSelect(Select):
         outputs: list,
             list of dicts containing the reference text, the rankings of the candidates together
             with their scores and other metadata. The results after calibration are stored in the
-            "calibrated" key.
+            "calibrated" key. When `reference` is a list, one such list per reference.
         cost: int,
             cost for the analysis completed.
         request_id: str,
             ID string for the request.
         """
+        per_reference = self._check_candidates(candidates, conjunction)
+        if per_reference:
+            reference, candidates, inverse = self._deduplicate_references(reference, candidates)
+        else:
+            reference, inverse = self._deduplicate(reference)
+            candidates = None
+        payload = None
+        # only an empty list of references is answered without a request, empty texts fail as for `Select`
+        if not (isinstance(reference, list) and not reference):
+            payload = self._build_payload(
+                reference,
+                self.candidates if candidates is None else candidates,
+                conjunction=self.conjunction,
+                concat_best=concat_best,
+            )
+        parse = partial(self._calibrate, reference, candidates, concat_best)
+        return self._submit(payload, self._fanned_out(parse, reference, inverse))
+
+    def _check_candidates(self, candidates: Union[List[str], List[List[str]]], conjunction: Optional[str]) -> bool:
+        """Checks that the call matches the calibration, returns whether candidates are given per reference."""
         if self.candidates is None:
             raise RuntimeError(
                 f"Calibration should be initialized with the `fit` method before use."
             )
-        else:
-            if sorted(self.candidates) != sorted(candidates):
+        per_reference = bool(candidates) and all(isinstance(x, list) for x in candidates)
+        if per_reference:
+            unknown = {candidate for subset in candidates for candidate in subset} - set(self.candidates)
+            if unknown:
                 raise ValueError(
-                    f"Calibration initialized with candidates {self.candidates}. Please change your candidates or `fit` to your new candidates."
-                )
-            if conjunction != self.conjunction:
-                raise ValueError(
-                    f"Calibration initialized with conjunction {self.conjunction}. Please change your conjunction or `fit` to your new conjunction."
+                    f"Calibration initialized with candidates {self.candidates}, got other candidates "
+                    f"{sorted(unknown)}. Please change your candidates or `fit` to your new candidates."
                 )
+        elif sorted(self.candidates) != sorted(candidates):
+            raise ValueError(
+                f"Calibration initialized with candidates {self.candidates}. Please change your candidates or `fit` to your new candidates."
+            )
+        if conjunction != self.conjunction:
+            raise ValueError(
+                f"Calibration initialized with conjunction {self.conjunction}. Please change your conjunction or `fit` to your new conjunction."
+            )
+        return per_reference
+
+    def _calibrate(
+        self,
+        reference: Union[str, List[str]],
+        candidates: Optional[List[List[str]]],
+        concat_best: bool,
+        response: Optional[dict],
+    ) -> Tuple[List, int, str]:
+        if response is None:
+            # an empty list of references, nothing was sent
+            return [], {}, None
+        out_uncal, cost, request_id = self._parse(response)
+        references = [reference] if isinstance(reference, str) else reference
+        # `_parse` unwraps the outputs of a single reference
+        outputs = [out_uncal[0]] if len(references) == 1 else [out[0] for out in out_uncal]
+
+        if candidates is None:
+            # Extract and normalize the uncalibrated scores, one column per reference
+            probs_uncal = self._probabilities(outputs).T
+            # Calculate the calibrated scores of every reference at once
+            scores_cal = np.matmul(self.W, probs_uncal) + self.b
+            columns = [(self.candidates, scores_cal[:, j]) for j in range(len(outputs))]
+        else:
+            rows = {candidate: i for i, candidate in enumerate(self.candidates)}
+            columns = [
+                (subset, self._calibrate_subset([rows[x] for x in subset], self._probabilities([out])[0]))
+                for subset, out in zip(candidates, outputs)
+            ]
 
-        out_uncal, cost, request_id = super().__call__(
-            reference,
-            self.candidates,
-            conjunction=self.conjunction,
-            concat_best=concat_best,
+        for ref, out, (subset, scores) in zip(references, outputs, columns):
+            # get the "correct" label
+            correct = subset[int(np.argmax(scores))]
+            if concat_best:
+                best = f"{ref} {self.conjunction} {correct}" if self.conjunction is not None else f"{ref} {correct}"
+            else:
+                best = correct
+            out["best"] = best
+            out["rankings"] = [{"text": subset[i], "score": scores[i]} for i in range(len(subset))]
+            out["calibrated"] = {
+                "best": best,
+                "rankings": [{"text": subset[i], "score": scores[i]} for i in range(len(subset))],
+                "content_free_inputs": self.content_free_inputs,
+                "calibration_mode": self.calibration_mode,
+                "calibration_cost": self.calib_cost,
+            }
+        if isinstance(reference, str):
+            return out_uncal, cost, request_id
+        return [[out] for out in outputs], cost, request_id
+
+    @staticmethod
+    def _probabilities(outputs: List[dict]) -> np.ndarray:
+        """Uncalibrated probabilities of the candidates, one row per output, normalized over its candidates."""
+        probs = np.exp(
+            np.array([[element["score"]["normalized_logprob"] for element in out["rankings"]] for out in outputs])
         )
-        # Extract and normalize the uncalibrated scores
-        probs_uncal = [
-            np.exp(element["score"]["normalized_logprob"]) for element in out_uncal[0]["rankings"]
-        ]
-        probs_uncal = probs_uncal / sum(probs_uncal)
+        return probs / probs.sum(axis=1, keepdims=True)
 
-        # Calculate the calibrated scores and get the "correct" label
-        scores_cal = np.matmul(self.W, np.expand_dims(probs_uncal, axis=-1)) + self.b
-        correct_label_idx = np.argmax(scores_cal)
+    def _calibrate_subset(self, indices: List[int], probs: np.ndarray) -> np.ndarray:
+        """Calibrated scores of the subset of the fitted candidates at `indices`.
 
-        if concat_best:
-            best = (
-                f"{reference} {self.conjunction} {self.candidates[correct_label_idx]}"
-                if self.conjunction is not None
-                else f"{reference} {self.candidates[correct_label_idx]}"
-            )
+        The content-free probabilities are renormalized over the subset, as the uncalibrated ones are.
+        """
+        W, b = self.W[np.ix_(indices, indices)], self.b[indices, 0]
+        if self.calibration_mode == "diagonal_W":
+            # W is the inverse of the content-free probabilities
+            W = W * np.sum(1 / np.diag(W))
         else:
-            best = self.candidates[correct_label_idx]
-        out_uncal[0]["best"] = best
-        out_uncal[0]["rankings"] = [
-            {"text": self.candidates[i], "score": scores_cal[i][0]}
-            for i in range(len(self.candidates))
-        ]
-        out_uncal[0]["calibrated"] = {
-            "best": best,
-            "rankings": [
-                {"text": self.candidates[i], "score": scores_cal[i][0]}
-                for i in range(len(self.candidates))
-            ],
-            "content_free_inputs": self.content_free_inputs,
-            "calibration_mode": self.calibration_mode,
-            "calibration_cost": self.calib_cost,
-        }
-        return out_uncal, cost, request_id
+            # b is minus the content-free probabilities
+            b = b / -np.sum(b)
+        return np.matmul(W, probs) + b
+
+    @staticmethod
+    def _map_outputs(chunk: list, outputs: list) -> list:
+        # calibrated outputs are never unwrapped
+        return outputs
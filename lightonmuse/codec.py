@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+from typing import Any, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONCodec:
+    """Serialises request payloads and parses responses.
+
+    Uses `orjson` when it is installed (`pip install lightonmuse[fast]`), and the standard library
+    `json` module otherwise. Compressed responses are accepted, and request bodies larger than
+    `compress_threshold` bytes can be gzipped for servers accepting compressed requests.
+
+    Parameters
+    ----------
+    compress: Optional[bool], default None,
+        whether to gzip request bodies, for servers accepting `Content-Encoding: gzip` requests.
+        Defaults to False, unless the `MUSE_COMPRESSION` environment variable is set to `1`.
+    accept_compressed: bool, default True,
+        whether to accept compressed responses. Set to False for servers mishandling the
+        `Accept-Encoding` negotiation.
+    compress_threshold: int, default 16384,
+        minimum size in bytes of the request bodies to compress. Smaller bodies aren't worth the CPU.
+    compress_level: int, default 5,
+        gzip compression level, from 1 (fastest) to 9 (smallest).
+    """
+
+    def __init__(
+        self,
+        compress: bool = None,
+        accept_compressed: bool = True,
+        compress_threshold: int = 16384,
+        compress_level: int = 5,
+    ):
+        if compress is None:
+            compress = os.environ.get("MUSE_COMPRESSION", "0") == "1"
+        self.compress = compress
+        self.accept_compressed = accept_compressed
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    @property
+    def headers(self) -> dict:
+        """Headers negotiating the encoding of the responses."""
+        return {"Accept-Encoding": "gzip, deflate" if self.accept_compressed else "identity"}
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(obj).encode("utf-8")
+
+    @staticmethod
+    def loads(data: Union[bytes, str]) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def encode(self, payload: Union[bytes, str]) -> Tuple[bytes, dict]:
+        """Returns the body to send for `payload` and the headers describing its encoding."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if self.compress and len(payload) >= self.compress_threshold:
+            return gzip.compress(payload, compresslevel=self.compress_level), {"Content-Encoding": "gzip"}
+        return payload, {}
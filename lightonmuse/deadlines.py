@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, replace
+import threading
+import time
+from typing import Callable, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+# `(connect, read)` timeouts in seconds, as taken by `requests`
+Timeout = Union[float, Tuple[float, float]]
+DEFAULT_TIMEOUT = (10.0, 300.0)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call doesn't complete before its deadline, retries included."""
+
+
+@dataclass(frozen=True)
+class CallOptions:
+    """Options of the calls made in a `call_options` block.
+
+    Attributes
+    ----------
+    timeout: Optional[Tuple[float, float]],
+        connect and read timeouts of each attempt, in seconds.
+    deadline: Optional[float],
+        `time.monotonic()` after which calls are abandoned.
+    cancelled: Tuple[threading.Event, ...],
+        events set when the calls are abandoned, e.g. when a `MapIterator` is closed, the
+        innermost last.
+    """
+
+    timeout: Optional[Tuple[float, float]] = None
+    deadline: Optional[float] = None
+    cancelled: Tuple[threading.Event, ...] = ()
+
+    def remaining(self) -> Optional[float]:
+        """Time in seconds left before the deadline, None if there is none."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def is_cancelled(self) -> bool:
+        return any(event.is_set() for event in self.cancelled)
+
+    def sleep(self, seconds: float) -> bool:
+        """Waits for `seconds`, returning early with False if the calls are abandoned meanwhile."""
+        if not self.cancelled:
+            time.sleep(seconds)
+            return True
+        return not self.cancelled[-1].wait(seconds) and not self.is_cancelled()
+
+
+_options = ContextVar("lightonmuse_call_options", default=CallOptions())
+
+
+def current_options() -> CallOptions:
+    return _options.get()
+
+
+def as_timeout(timeout: Optional[Timeout]) -> Optional[Tuple[float, float]]:
+    if timeout is None or isinstance(timeout, tuple):
+        return timeout
+    return (timeout, timeout)
+
+
+@contextmanager
+def call_options(timeout: Optional[Timeout] = None, deadline: Optional[float] = None):
+    """Sets the timeouts and deadline of the calls made in the block, by every endpoint object.
+
+    The options follow the calls into the threads of `map` and the tasks of the asynchronous
+    bindings. Nested blocks keep the earliest deadline::
+
+        with call_options(timeout=(1, 10), deadline=30):
+            # both calls, and the retries of their requests, must complete within 30 seconds
+            embeddings, _, _ = embedder.map(texts)
+            outputs, _, _ = selector(references, candidates)
+
+    Parameters
+    ----------
+    timeout: Optional[Union[float, Tuple[float, float]]], default None,
+        connect and read timeouts in seconds of each attempt, overriding the ones of the endpoint
+        objects. A single number is used for both.
+    deadline: Optional[float], default None,
+        time in seconds from now after which the calls of the block are abandoned, raising
+        `DeadlineExceeded`. Retries that can't complete before it aren't attempted.
+    """
+    options = _options.get()
+    if timeout is not None:
+        options = replace(options, timeout=as_timeout(timeout))
+    if deadline is not None:
+        deadline = time.monotonic() + deadline
+        options = replace(options, deadline=deadline if options.deadline is None else min(options.deadline, deadline))
+    token = _options.set(options)
+    try:
+        yield options
+    finally:
+        _options.reset(token)
+
+
+def run_in_context(call: Callable[..., T], cancelled: Optional[threading.Event] = None) -> Callable[..., T]:
+    """Wraps `call`, to be run in another thread, so that it keeps the options of the current thread.
+
+    Calls made by the wrapped function are abandoned once `cancelled` is set.
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs) -> T:
+        # a context can only be entered by one thread at a time
+        return context.copy().run(_run_cancellable, cancelled, call, *args, **kwargs)
+
+    return run
+
+
+def _run_cancellable(cancelled: Optional[threading.Event], call: Callable[..., T], *args, **kwargs) -> T:
+    if cancelled is not None:
+        options = _options.get()
+        _options.set(replace(options, cancelled=options.cancelled + (cancelled,)))
+    return call(*args, **kwargs)
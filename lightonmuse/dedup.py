@@ -0,0 +1,62 @@
+import copy
+from dataclasses import dataclass, field
+import threading
+from typing import Callable, Hashable, List, Optional, Tuple
+
+
+def deduplicate(items: list, key: Optional[Callable[[object], Hashable]] = None) -> Tuple[list, List[int]]:
+    """Unique `items` in order of first occurrence, and the position of each item among them."""
+    positions, unique, inverse = {}, [], []
+    for item in items:
+        item_key = item if key is None else key(item)
+        position = positions.get(item_key)
+        if position is None:
+            position = positions[item_key] = len(unique)
+            unique.append(item)
+        inverse.append(position)
+    return unique, inverse
+
+
+def fan_out(outputs, inverse: List[int]):
+    """Outputs of every item from the `outputs` of the unique items, see `deduplicate`.
+
+    Repeated items get their own copy of the output, so that modifying one leaves the others as is.
+    """
+    if not isinstance(outputs, list):
+        # outputs of `Embed(..., as_array=True)`, imported lazily as NumPy is slow to import
+        from .embeddings import Embeddings
+
+        if isinstance(outputs, Embeddings):
+            return Embeddings(outputs.vectors[inverse], fan_out(outputs.metadata, inverse))
+    seen, result = set(), []
+    for position in inverse:
+        result.append(copy.deepcopy(outputs[position]) if position in seen else outputs[position])
+        seen.add(position)
+    return result
+
+
+@dataclass
+class DedupStats:
+    """Thread-safe counters of the inputs deduplicated by an endpoint object.
+
+    Attributes
+    ----------
+    items: int,
+        number of inputs received.
+    sent: int,
+        number of unique inputs sent to the API.
+    """
+
+    items: int = 0
+    sent: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def saved(self) -> int:
+        """Number of repeated inputs that were not sent."""
+        return self.items - self.sent
+
+    def record(self, items: int, sent: int):
+        with self._lock:
+            self.items += items
+            self.sent += sent
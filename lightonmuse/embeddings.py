@@ -0,0 +1,44 @@
+from typing import List, NamedTuple
+
+import numpy as np
+
+
+class Embeddings(NamedTuple):
+    """Embeddings of a batch of texts, returned by `Embed` with `as_array=True`.
+
+    Attributes
+    ----------
+    vectors: np.ndarray,
+        contiguous `(n_texts, dim)` float32 matrix, aligned with the input texts.
+    metadata: List[dict],
+        outputs of the endpoint for each text, without their `"embedding"` field.
+    """
+
+    vectors: np.ndarray
+    metadata: List[dict]
+
+    def rows(self) -> List["Embeddings"]:
+        """Splits the batch into one `Embeddings` per text, sharing the memory of `vectors`."""
+        return [Embeddings(self.vectors[i:i + 1], [meta]) for i, meta in enumerate(self.metadata)]
+
+
+def to_embeddings(outputs: List[dict]) -> Embeddings:
+    """Moves the `"embedding"` lists of the `outputs` of `Embed` into a float32 matrix.
+
+    Each list of Python floats is released as soon as it is copied, so that peak memory stays close
+    to the size of the parsed response instead of doubling.
+    """
+    if not outputs:
+        return Embeddings(np.empty((0, 0), dtype=np.float32), [])
+    vectors = np.empty((len(outputs), len(outputs[0]["embedding"])), dtype=np.float32)
+    for i, output in enumerate(outputs):
+        vectors[i] = output.pop("embedding")
+    return Embeddings(vectors, outputs)
+
+
+def stack_embeddings(rows: List[tuple]) -> Embeddings:
+    """Gathers `(vector, metadata)` pairs into a single `Embeddings`."""
+    if not rows:
+        return Embeddings(np.empty((0, 0), dtype=np.float32), [])
+    vectors, metadata = zip(*rows)
+    return Embeddings(np.stack(vectors), list(metadata))
@@ -0,0 +1,406 @@
+"""Local stand-in for the Muse API, returning deterministic synthetic responses.
+
+It serves the `create`, `analyse`, `embed`, `select`, `compare` and `tokenize` endpoints with the
+response schema, input validation and billing of the API, so that code using the bindings can be tested and
+load tested offline. The outputs are synthetic, not the answers of a model.
+Use it in-process as a context manager, which points the bindings at it through `MUSE_BASE_URL`::
+
+    with FakeMuseServer(latency=0.05, throttle_rate=0.1) as server:
+        outputs, cost, request_id = Embed("orion-fr")(["Hello", "World"])
+    print(server.requests)
+
+or in a separate process with `python -m lightonmuse.fake_server --port 8080`.
+"""
+import argparse
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# pieces of two characters at most, as many tokens as a BPE tokenizer gives on unusual words
+_TOKEN = re.compile(r"\w{1,2}|[^\w\s]")
+# words of a single token, so that the generated text has as many tokens as words
+_VOCABULARY = ["le", "la", "un", "et", "de", "du", "en", "il", "on", "y", "a", "ou", "."]
+
+
+def _hash(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("\0".join(parts).encode("utf-8")).digest()[:8], "little")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens of `text` for the fake server: pieces of words and punctuation marks."""
+    return _TOKEN.findall(text)
+
+
+def embed(text: str, dim: int) -> List[float]:
+    """Deterministic unit-norm embedding of `text`."""
+    rng = random.Random(_hash("embed", text))
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def score(context: str, text: str, return_logprobs: bool = True) -> dict:
+    """Deterministic log-probabilities of the tokens of `text` following `context`.
+
+    `token_logprobs` is None unless `return_logprobs`, as for `Create`.
+    """
+    token_logprobs = [{token: -0.5 - _hash(context, token) % 1000 / 200} for token in tokenize(text)]
+    logprob = sum(next(iter(element.values())) for element in token_logprobs)
+    return {
+        "logprob": logprob,
+        "normalized_logprob": logprob / max(1, len(token_logprobs)),
+        "token_logprobs": token_logprobs if return_logprobs else None,
+    }
+
+
+class FakeMuseError(Exception):
+    """Error answered by the fake server, with its HTTP status code."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeMuseServer:
+    """Deterministic stand-in for the Muse API, running in a background thread.
+
+    Parameters
+    ----------
+    host: str, default "127.0.0.1",
+        address to listen on.
+    port: int, default 0,
+        port to listen on, a free port by default.
+    latency: float, default 0.,
+        time in seconds waited before answering each request.
+    dim: int, default 2048,
+        dimension of the embeddings, the one of `orion-fr`.
+    max_tokens: int, default 2048,
+        context size of the fake model. Longer inputs are rejected with a 400 error.
+    error_rate: float, default 0.,
+        probability of answering a request with a 503 error.
+    throttle_rate: float, default 0.,
+        probability of answering a request with a 429 error.
+    retry_after: Optional[float], default 0.,
+        `Retry-After` header of 429 errors, in seconds. None to leave it out.
+    seed: int, default 0,
+        seed of the random draws of errors, for them to be reproducible.
+    compress_threshold: Optional[int], default 16384,
+        size in bytes above which responses are gzipped for clients accepting it. None to never
+        compress.
+
+    Attributes
+    ----------
+    requests: List[Tuple[str, object]],
+        endpoint and payload of every request received, errors included.
+    """
+
+    endpoints = ["create", "analyse", "embed", "select", "compare", "tokenize"]
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        dim: int = 2048,
+        max_tokens: int = 2048,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: Optional[float] = 0.0,
+        seed: int = 0,
+        compress_threshold: Optional[int] = 16384,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.dim = dim
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.compress_threshold = compress_threshold
+        self.requests = []
+        self._failures = []
+        self._stalls = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+        self._environ = {}
+
+    @property
+    def url(self) -> str:
+        """Base URL of the fake API, to be used as `MUSE_BASE_URL`."""
+        return f"http://{self.host}:{self.port}/muse/v1/"
+
+    def start(self) -> "FakeMuseServer":
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_port
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "FakeMuseServer":
+        self.start()
+        # endpoints created in the block target the fake server
+        self._environ = {key: os.environ.get(key) for key in ["MUSE_BASE_URL", "MUSE_API_KEY"]}
+        os.environ["MUSE_BASE_URL"] = self.url
+        os.environ.setdefault("MUSE_API_KEY", "fake-api-key")
+        return self
+
+    def __exit__(self, *exc_info):
+        for key, value in self._environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.stop()
+
+    def fail(self, *status_codes: int):
+        """Answers the next requests with the given error status codes, in order."""
+        with self._lock:
+            self._failures.extend(status_codes)
+
+    def stall(self, *delays: float):
+        """Delays the next responses by the given extra times in seconds, in order."""
+        with self._lock:
+            self._stalls.extend(delays)
+
+    def respond(self, endpoint: str, payload, model: str = "orion-fr") -> dict:
+        """Response of the fake API to `payload` sent to `endpoint`, raising `FakeMuseError` on errors."""
+        if endpoint not in self.endpoints:
+            raise FakeMuseError(404, f"Unknown endpoint `{endpoint}`.")
+        if endpoint in ["select", "compare"]:
+            queries = payload if isinstance(payload, list) else [payload]
+            self._validate([text for query in queries for text in [query["reference"], *query["candidates"]]])
+            # outputs and billed costs of each input
+            results = [getattr(self, f"_{endpoint}")(query, model) for query in queries]
+            outputs = [[output] for output, _ in results]
+        else:
+            texts = payload["text"] if isinstance(payload["text"], list) else [payload["text"]]
+            self._validate(texts, check_length=endpoint != "tokenize")
+            params = payload.get("params") or {}
+            results = [getattr(self, f"_{endpoint}")(text, params, model) for text in texts]
+            outputs = [[output for output, _ in results]]
+        body = json.dumps(payload, sort_keys=True)
+        return {
+            "request_id": f"fake-{_hash(endpoint, model, body):016x}",
+            "outputs": outputs,
+            "costs": {f"{model}@default": self._costs([cost for _, costs in results for cost in costs])},
+        }
+
+    def _validate(self, texts: List[str], check_length: bool = True):
+        if not texts or any(not text for text in texts):
+            raise FakeMuseError(400, "Receive empty text.")
+        if check_length and any(len(tokenize(text)) > self.max_tokens for text in texts):
+            raise FakeMuseError(400, f"The input is too long, the context size is {self.max_tokens} tokens.")
+
+    @staticmethod
+    def _cost(model: str, n_input: int, n_generated: int = 0, batch_size: int = 1) -> dict:
+        return {
+            "tokens_used": n_input + n_generated,
+            "tokens_input": n_input,
+            "tokens_generated": n_generated,
+            "cost_type": f"{model}@default",
+            "batch_size": batch_size,
+        }
+
+    @staticmethod
+    def _costs(costs: List[dict]) -> dict:
+        return {
+            "total_tokens_used": sum(cost["tokens_used"] for cost in costs),
+            "total_tokens_input": sum(cost["tokens_input"] for cost in costs),
+            "total_tokens_generated": sum(cost["tokens_generated"] for cost in costs),
+            "batch_size": sum(cost["batch_size"] for cost in costs),
+        }
+
+    def _create(self, text: str, params: dict, model: str) -> Tuple[dict, List[dict]]:
+        n_tokens = params.get("n_tokens", 20)
+        stop_words = params.get("stop_words") or []
+        completions = []
+        # every completion is billed, the `n_best` most likely are returned
+        for i in range(params.get("n_completions") or 1):
+            rng = random.Random(_hash("create", text, str(params.get("seed")), str(i)))
+            tokens = []
+            while len(tokens) < n_tokens:
+                tokens.append(rng.choice(_VOCABULARY))
+                if tokens[-1] in stop_words:
+                    break
+            generated = " ".join(tokens)
+            output_text = f"{text} {generated}" if params.get("concat_prompt") else generated
+            completions.append(
+                {
+                    "output_text": output_text,
+                    "score": score(text, generated, return_logprobs=bool(params.get("return_logprobs"))),
+                    "execution_metadata": {"cost": self._cost(model, len(tokenize(text)), len(tokens))},
+                }
+            )
+        best = sorted(completions, key=lambda completion: -completion["score"]["logprob"])[:params.get("n_best") or 1]
+        return {"input_text": text, "completions": best}, [c["execution_metadata"]["cost"] for c in completions]
+
+    def _analyse(self, text: str, params: dict, model: str) -> Tuple[dict, List[dict]]:
+        cost = self._cost(model, len(tokenize(text)))
+        return {"text": text, "score": score("", text), "execution_metadata": {"cost": cost}}, [cost]
+
+    def _embed(self, text: str, params: dict, model: str) -> Tuple[dict, List[dict]]:
+        cost = self._cost(model, len(tokenize(text)))
+        return {"text": text, "embedding": embed(text, self.dim), "execution_metadata": {"cost": cost}}, [cost]
+
+    def _tokenize(self, text: str, params: dict, model: str) -> Tuple[dict, List[dict]]:
+        tokens = tokenize(text)
+        cost = self._cost(model, len(tokens))
+        return {"text": text, "tokens": tokens, "n_tokens": len(tokens), "execution_metadata": {"cost": cost}}, [cost]
+
+    def _select(self, query: dict, model: str) -> Tuple[dict, List[dict]]:
+        reference, conjunction = query["reference"], query.get("conjunction")
+        context = reference if conjunction is None else f"{reference} {conjunction}"
+        rankings = [{"text": candidate, "score": score(context, candidate)} for candidate in query["candidates"]]
+        best = max(rankings, key=lambda ranking: ranking["score"]["normalized_logprob"])["text"]
+        if query.get("concat_best"):
+            best = f"{context} {best}"
+        n_input = sum(len(tokenize(f"{context} {candidate}")) for candidate in query["candidates"])
+        cost = self._cost(model, n_input, batch_size=len(query["candidates"]))
+        output = {"reference": reference, "rankings": rankings, "best": best, "execution_metadata": {"cost": cost}}
+        return output, [cost]
+
+    def _compare(self, query: dict, model: str) -> Tuple[dict, List[dict]]:
+        reference = embed(query["reference"], self.dim)
+        similarities = [
+            {"candidate": candidate, "similarity": sum(x * y for x, y in zip(reference, embed(candidate, self.dim)))}
+            for candidate in query["candidates"]
+        ]
+        n_input = sum(len(tokenize(text)) for text in [query["reference"], *query["candidates"]])
+        cost = self._cost(model, n_input, batch_size=len(query["candidates"]) + 1)
+        output = {
+            "reference": query["reference"],
+            "similarities": similarities,
+            "best": max(similarities, key=lambda similarity: similarity["similarity"])["candidate"],
+            "execution_metadata": {"cost": cost},
+        }
+        return output, [cost]
+
+    def _injected_error(self) -> Optional[Tuple[int, str, Dict[str, str]]]:
+        with self._lock:
+            if self._failures:
+                status_code = self._failures.pop(0)
+            elif self.throttle_rate and self._random.random() < self.throttle_rate:
+                status_code = 429
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status_code = 503
+            else:
+                return None
+        headers = {}
+        if status_code == 429 and self.retry_after is not None:
+            headers["Retry-After"] = str(self.retry_after)
+        return status_code, "Injected error.", headers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive connections, as served by the API
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, don't let Nagle's algorithm delay the body
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        fake: FakeMuseServer = self.server.fake
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._send_error(400, "Invalid JSON body.")
+        with fake._lock:
+            fake.requests.append((endpoint, payload))
+            stall = fake._stalls.pop(0) if fake._stalls else 0.0
+        if fake.latency or stall:
+            time.sleep(fake.latency + stall)
+        if not self.headers.get("X-API-KEY"):
+            return self._send_error(401, "Missing API key.")
+        error = fake._injected_error()
+        if error is not None:
+            return self._send_error(*error)
+        self._answer(fake, endpoint, payload)
+
+    def _answer(self, fake: FakeMuseServer, endpoint: str, payload):
+        try:
+            response = fake.respond(endpoint, payload, self.headers.get("X-Model", "orion-fr"))
+        except FakeMuseError as e:
+            return self._send_error(e.status_code, str(e))
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+            # a payload missing fields or with fields of the wrong type is a client error, not a dropped connection
+            return self._send_error(400, f"Invalid payload for `{endpoint}`: {type(e).__name__}: {e}")
+        headers = {"Content-Type": "application/json"}
+        content = json.dumps(response).encode("utf-8")
+        accepts_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if accepts_gzip and fake.compress_threshold is not None and len(content) >= fake.compress_threshold:
+            content = gzip.compress(content, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, content, headers)
+
+    def _send_error(self, status_code: int, message: str, headers: Optional[Dict[str, str]] = None):
+        content = json.dumps({"error": message}).encode("utf-8")
+        self._send(status_code, content, {"Content-Type": "application/json", **(headers or {})})
+
+    def _send(self, status_code: int, content: bytes, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status_code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        try:
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up on the request, e.g. after a timeout
+            pass
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the Muse API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds waited before each response")
+    parser.add_argument("--dim", type=int, default=2048, help="dimension of the embeddings")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of 503 errors")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probability of 429 errors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    server = FakeMuseServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        dim=args.dim,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    ).start()
+    # the first line of output is the base URL, for processes starting the server
+    print(server.url, flush=True)
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
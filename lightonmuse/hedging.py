@@ -0,0 +1,209 @@
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+from .deadlines import run_in_context
+
+
+@dataclass
+class HedgePolicy:
+    """When deterministic calls are hedged.
+
+    A hedged call sends a duplicate of its request if no response arrived after `delay` seconds,
+    and returns whichever response comes first. This cuts the tail latency due to occasional slow
+    backends, for a small share of extra requests. Only deterministic calls are hedged, both
+    requests returning the same outputs.
+
+    Parameters
+    ----------
+    delay: Optional[float], default None,
+        time in seconds after which the duplicate is sent. Defaults to the `percentile` of the
+        latencies observed by the endpoint object, once it has seen `min_samples` calls.
+    percentile: float, default 95.,
+        percentile of the observed latencies used as delay when `delay` is None.
+    min_samples: int, default 20,
+        number of calls to observe before hedging with an observed delay.
+    window: int, default 1000,
+        number of most recent calls the observed latencies are computed over.
+    max_extra_load: float, default 0.05,
+        maximum share of the calls that are hedged, i.e. of extra requests.
+    max_extra_cost: Optional[int], default None,
+        maximum number of tokens spent on hedged calls, beyond which calls aren't hedged anymore.
+        A hedged call may be billed twice, as the API may process the request it abandoned.
+        None for no limit.
+    max_workers: int, default 64,
+        number of threads sending the duplicate requests of the hedged blocking calls.
+    """
+
+    delay: Optional[float] = None
+    percentile: float = 95.0
+    min_samples: int = 20
+    window: int = 1000
+    max_extra_load: float = 0.05
+    max_extra_cost: Optional[int] = None
+    max_workers: int = 64
+
+
+@dataclass
+class HedgeStats:
+    """Thread-safe counters of the calls of an endpoint object with a `HedgePolicy`.
+
+    Attributes
+    ----------
+    calls: int,
+        number of calls that reached the network.
+    hedged: int,
+        number of calls for which a duplicate request was sent.
+    won: int,
+        number of hedged calls answered by the duplicate request first.
+    extra_cost: int,
+        number of tokens used by the hedged calls, that may be billed twice.
+    """
+
+    calls: int = 0
+    hedged: int = 0
+    won: int = 0
+    extra_cost: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+class Hedger:
+    """Sends the requests of an endpoint object according to a `HedgePolicy`, see `BaseRequest`."""
+
+    def __init__(self, policy: HedgePolicy, stats: HedgeStats):
+        self.policy = policy
+        self.stats = stats
+        self._latencies = deque(maxlen=policy.window)
+        self._delay = None
+        self._new_samples = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def delay(self) -> Optional[float]:
+        """Time to wait before hedging the next call, None if it shouldn't be hedged."""
+        if self.policy.delay is not None:
+            return self.policy.delay
+        with self._lock:
+            if len(self._latencies) < self.policy.min_samples:
+                return None
+            # sorting the window on every call is wasteful, the percentile changes slowly
+            if self._delay is None or self._new_samples >= max(1, len(self._latencies) // 20):
+                latencies = sorted(self._latencies)
+                self._delay = latencies[min(len(latencies) - 1, int(len(latencies) * self.policy.percentile / 100))]
+                self._new_samples = 0
+            return self._delay
+
+    def request(self, send: Callable[[], dict]) -> dict:
+        """Response of the blocking `send`, hedged if it is slower than `delay`."""
+        start, delay = self._start()
+        # without budget left to hedge it, the call is sent as is, a stale read of the stats being harmless
+        if delay is None or not self._hedge_budget_left():
+            return self._observe(start, send())
+        # requests keep the `call_options` of the caller, the one that loses is abandoned
+        cancelled = {}
+        primary, sent = self._send_primary(send, cancelled)
+        # the delay runs from the moment the primary is sent
+        sent.wait()
+        if wait([primary], timeout=delay).done or not self._allow_hedge():
+            return self._observe(start, primary.result())
+        hedge = self._submit(send, cancelled)
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # prefer a response to an error when both requests completed
+            for future in sorted(done, key=lambda future: future.exception() is not None):
+                if future.exception() is None or not pending:
+                    # a blocking request can't be interrupted while waiting for its response, but it isn't retried
+                    for other in pending:
+                        other.cancel()
+                        cancelled[other].set()
+                    return self._hedged(start, future.result(), won=future is hedge)
+
+    async def arequest(self, send: Callable[[], Awaitable[dict]]) -> dict:
+        """Response of the coroutine function `send`, hedged if it is slower than `delay`."""
+        start, delay = self._start()
+        if delay is None:
+            return self._observe(start, await send())
+        primary = asyncio.ensure_future(send())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._allow_hedge():
+                return self._observe(start, await primary)
+            hedge = asyncio.ensure_future(send())
+            pending.add(hedge)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda task: task.exception() is not None):
+                    if task.exception() is None or not pending:
+                        return self._hedged(start, task.result(), won=task is hedge)
+        finally:
+            # the request that lost, or both if the call itself was cancelled
+            for task in pending:
+                task.cancel()
+
+    def _start(self) -> Tuple[float, Optional[float]]:
+        with self.stats._lock:
+            self.stats.calls += 1
+        return time.perf_counter(), self.delay()
+
+    def _hedge_budget_left(self) -> bool:
+        if self.stats.hedged >= self.policy.max_extra_load * self.stats.calls:
+            return False
+        return self.policy.max_extra_cost is None or self.stats.extra_cost < self.policy.max_extra_cost
+
+    def _allow_hedge(self) -> bool:
+        with self.stats._lock:
+            if not self._hedge_budget_left():
+                return False
+            self.stats.hedged += 1
+            return True
+
+    def _observe(self, start: float, response: dict) -> dict:
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+            self._new_samples += 1
+        return response
+
+    def _hedged(self, start: float, response: dict, won: bool) -> dict:
+        costs = (response.get("costs") or {}) if isinstance(response, dict) else {}
+        tokens = sum(cost.get("total_tokens_used", 0) for cost in costs.values() if isinstance(cost, dict))
+        with self.stats._lock:
+            self.stats.won += won
+            self.stats.extra_cost += tokens
+        return self._observe(start, response)
+
+    def _send_primary(self, send: Callable[[], dict], cancelled: dict) -> Tuple[Future, threading.Event]:
+        # a blocking request can't be interrupted, so the primary runs in a thread of its own for the call to
+        # return the response of the duplicate first. It starts right away, unlike in the bounded executor.
+        future, event, sent = Future(), threading.Event(), threading.Event()
+        run = run_in_context(send, event)
+
+        def target():
+            future.set_running_or_notify_cancel()
+            sent.set()
+            try:
+                future.set_result(run())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name="lightonmuse-hedge-primary", daemon=True).start()
+        cancelled[future] = event
+        return future, sent
+
+    def _submit(self, send: Callable[[], dict], cancelled: dict) -> Future:
+        event = threading.Event()
+        future = self._get_executor().submit(run_in_context(send, event))
+        cancelled[future] = event
+        return future
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.policy.max_workers, thread_name_prefix="lightonmuse-hedge")
+        return self._executor
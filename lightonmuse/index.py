@@ -0,0 +1,211 @@
+import json
+from typing import Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .embeddings import Embeddings, to_embeddings
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Returns a float32 copy of `vectors` with rows of unit L2 norm, zero rows being left as is."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors /= norms
+    return vectors
+
+
+def cosine_topk(
+    queries: np.ndarray, matrix: np.ndarray, k: int, block_size: int = 16384, query_block_size: int = 256
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k rows of `matrix` by dot product with each query, computed block by block.
+
+    Both `queries` and `matrix` are expected to be normalized, making the dot product the cosine
+    similarity. At most `query_block_size * block_size` scores are held in memory at once.
+
+    Return
+    ------
+    scores: np.ndarray,
+        `(n_queries, k)` similarities, in decreasing order.
+    indices: np.ndarray,
+        `(n_queries, k)` row indices in `matrix` of the similarities.
+    """
+    k = min(k, len(matrix))
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    indices = np.empty((len(queries), k), dtype=np.int64)
+    for q_start in range(0, len(queries), query_block_size):
+        query_block = queries[q_start:q_start + query_block_size]
+        best_scores = np.full((len(query_block), 0), -np.inf, dtype=np.float32)
+        best_indices = np.empty((len(query_block), 0), dtype=np.int64)
+        for start in range(0, len(matrix), block_size):
+            block_scores = query_block @ matrix[start:start + block_size].T
+            # keep the running best k together with the best k of the block
+            candidate_scores = np.concatenate([best_scores, block_scores], axis=1)
+            candidate_indices = np.concatenate(
+                [best_indices, np.broadcast_to(np.arange(start, start + block_scores.shape[1]), block_scores.shape)],
+                axis=1,
+            )
+            if candidate_scores.shape[1] > k:
+                top = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+                candidate_scores = np.take_along_axis(candidate_scores, top, axis=1)
+                candidate_indices = np.take_along_axis(candidate_indices, top, axis=1)
+            best_scores, best_indices = candidate_scores, candidate_indices
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        scores[q_start:q_start + len(query_block)] = np.take_along_axis(best_scores, order, axis=1)
+        indices[q_start:q_start + len(query_block)] = np.take_along_axis(best_indices, order, axis=1)
+    return scores, indices
+
+
+class EmbeddingIndex:
+    """Exact cosine similarity search over embeddings computed with `Embed`.
+
+    Embeddings are stored as a normalized float32 matrix and searched with blocked matrix products,
+    so a query against a fixed catalogue costs a single `Embed` call of the query text instead of a
+    `Compare` call re-embedding the whole catalogue.
+
+    Parameters
+    ----------
+    embedder: Optional[Embed], default None,
+        endpoint used to embed texts added or searched. Only vectors can be used without it.
+    block_size: int, default 16384,
+        number of indexed embeddings scored at once, bounding the memory used by searches.
+    """
+
+    def __init__(self, embedder=None, block_size: int = 16384):
+        self.embedder = embedder
+        self.block_size = block_size
+        self.ids: List[Hashable] = []
+        self._rows = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id_: Hashable) -> bool:
+        return id_ in self._rows
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.embedder.model if self.embedder is not None else None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """`(n, dim)` matrix of the normalized embeddings, in the order of `ids`."""
+        return self._vectors[:len(self.ids)]
+
+    def add(self, ids: Sequence[Hashable], vectors: Union[np.ndarray, Embeddings, List[dict]]):
+        """Adds embeddings to the index, replacing the ones already indexed under the same ids.
+
+        Parameters
+        ----------
+        ids: Sequence[Hashable],
+            identifier of each embedding, e.g. the text or a database key. Should be strings or
+            integers for the index to be saved.
+        vectors: Union[np.ndarray, Embeddings, List[dict]],
+            `(n, dim)` matrix, or outputs of `Embed` with or without `as_array=True`.
+        """
+        vectors = normalize(self._as_matrix(vectors))
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} embeddings.")
+        if len(set(ids)) != len(ids):
+            raise ValueError("`ids` should be unique.")
+        if len(self.ids) and vectors.shape[1] != self._vectors.shape[1]:
+            raise ValueError(
+                f"Embeddings of dimension {vectors.shape[1]} added to an index of dimension {self._vectors.shape[1]}."
+            )
+        replaced = [id_ for id_ in ids if id_ in self._rows]
+        if replaced:
+            self.remove(replaced)
+        n = len(self.ids)
+        self._reserve(n + len(vectors), vectors.shape[1])
+        self._vectors[n:n + len(vectors)] = vectors
+        for i, id_ in enumerate(ids, start=n):
+            self._rows[id_] = i
+        self.ids.extend(ids)
+
+    def add_texts(self, texts: List[str], ids: Optional[Sequence[Hashable]] = None, **kwargs) -> dict:
+        """Embeds `texts` with `embedder` and adds them to the index, by default under their text.
+
+        Large catalogues are embedded in parallel chunks, `kwargs` being passed to `Embed.map`.
+        Returns the cost of the embedding.
+        """
+        embeddings, cost, _ = self._embedder().map(texts, as_array=True, **kwargs)
+        self.add(texts if ids is None else ids, embeddings)
+        return cost
+
+    def remove(self, ids: Sequence[Hashable]):
+        """Removes the embeddings indexed under `ids`."""
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[[self._rows.pop(id_) for id_ in ids]] = False
+        self._vectors = np.ascontiguousarray(self.vectors[keep])
+        self.ids = [id_ for id_, kept in zip(self.ids, keep) if kept]
+        self._rows = {id_: i for i, id_ in enumerate(self.ids)}
+
+    def search(
+        self, queries: Union[str, List[str], np.ndarray], k: int = 10, skill: Optional[str] = None
+    ) -> List[List[Tuple[Hashable, float]]]:
+        """Finds the `k` indexed embeddings most similar to each query.
+
+        Parameters
+        ----------
+        queries: Union[str, List[str], np.ndarray],
+            query text(s), embedded with a single call to `embedder`, or query embedding(s).
+        k: int, default 10,
+            number of results per query.
+        skill: Optional[str], default None,
+            skill used to embed query texts.
+
+        Return
+        ------
+        results: List[List[Tuple[Hashable, float]]],
+            for each query, `(id, cosine similarity)` pairs sorted by decreasing similarity.
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        if isinstance(queries, list) and queries and isinstance(queries[0], str):
+            queries, _, _ = self._embedder()(queries, skill=skill, as_array=True)
+        scores, indices = cosine_topk(normalize(self._as_matrix(queries)), self.vectors, k, self.block_size)
+        return [
+            [(self.ids[i], float(score)) for i, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def save(self, path: str):
+        """Saves the index to a `.npz` file."""
+        with open(path, "wb") as f:
+            np.savez(f, vectors=self.vectors, ids=json.dumps(self.ids), model=json.dumps(self.model))
+
+    @classmethod
+    def load(cls, path: str, embedder=None, block_size: int = 16384) -> "EmbeddingIndex":
+        """Loads an index saved with `save`, checking that `embedder` uses the same model."""
+        with np.load(path) as data:
+            vectors, ids, model = data["vectors"], json.loads(str(data["ids"])), json.loads(str(data["model"]))
+        if embedder is not None and model is not None and embedder.model != model:
+            raise ValueError(f"Index built with embeddings of `{model}`, got an embedder using `{embedder.model}`.")
+        index = cls(embedder, block_size=block_size)
+        index.ids = ids
+        index._vectors = vectors
+        index._rows = {id_: i for i, id_ in enumerate(ids)}
+        return index
+
+    def _embedder(self):
+        if self.embedder is None:
+            raise RuntimeError("An `embedder` is needed to add or search texts.")
+        return self.embedder
+
+    @staticmethod
+    def _as_matrix(vectors: Union[np.ndarray, Embeddings, List[dict]]) -> np.ndarray:
+        if isinstance(vectors, Embeddings):
+            return vectors.vectors
+        if isinstance(vectors, list) and vectors and isinstance(vectors[0], dict):
+            return to_embeddings([dict(output) for output in vectors]).vectors
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _reserve(self, n: int, dim: int):
+        # grow the storage geometrically so that incremental additions are amortized
+        if n <= len(self._vectors) and self._vectors.shape[1] == dim:
+            return
+        vectors = np.empty((max(n, 2 * len(self._vectors)), dim), dtype=np.float32)
+        if len(self.ids):
+            vectors[:len(self.ids)] = self.vectors
+        self._vectors = vectors
@@ -0,0 +1,225 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+
+from .parallel import merge_costs
+
+# timings of an event, in seconds
+PHASES = ("connect", "ttfb", "download", "decode")
+
+
+@dataclass
+class RequestEvent:
+    """Structured record of a request sent to the API, passed to the `hooks` of the endpoint objects.
+
+    Timings are the ones of the last attempt, except `latency` which spans every attempt and the
+    backoff between them.
+
+    Attributes
+    ----------
+    endpoint: str,
+        name of the API endpoint, e.g. `"create"`.
+    model: str,
+        name of the model.
+    request_bytes: int,
+        size of the request body sent, after compression.
+    response_bytes: int,
+        size of the response body received, before decompression.
+    batch_size: Optional[int],
+        number of inputs processed, as billed by the API.
+    connect: float,
+        time spent opening the connection (DNS, TCP and TLS handshakes), 0 when a pooled
+        connection is reused.
+    ttfb: float,
+        time from sending the request to receiving the response headers, connection excluded.
+    download: float,
+        time spent reading the response body.
+    decode: float,
+        time spent parsing the response body.
+    latency: float,
+        total time of the request, retries included.
+    attempts: int,
+        number of HTTP requests sent, retries included.
+    status_code: Optional[int],
+        HTTP status code of the last attempt, None if the connection failed.
+    request_id: Optional[str],
+        ID string of the request, as returned by the API.
+    costs: dict,
+        cost of the request, per model, as returned by the API.
+    error: Optional[str],
+        error the request failed with, None if it succeeded.
+    base_url: Optional[str],
+        base URL the last attempt was sent to, which varies with an `EndpointPool`.
+    """
+
+    endpoint: str
+    model: str
+    request_bytes: int = 0
+    response_bytes: int = 0
+    batch_size: Optional[int] = None
+    connect: float = 0.0
+    ttfb: float = 0.0
+    download: float = 0.0
+    decode: float = 0.0
+    latency: float = 0.0
+    attempts: int = 0
+    status_code: Optional[int] = None
+    request_id: Optional[str] = None
+    costs: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    base_url: Optional[str] = None
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RequestTrace:
+    """Times the phases of a request as the transport goes through them, to build its `RequestEvent`."""
+
+    def __init__(self, endpoint: str, model: str, request_bytes: int):
+        self.event = RequestEvent(endpoint, model, request_bytes)
+        # connection time of the current attempt, filled in by the transport
+        self.connect = 0.0
+        self._start = self._mark = time.perf_counter()
+
+    def attempt(self, base_url: Optional[str] = None):
+        self.event.attempts += 1
+        self.event.base_url = base_url
+        self.connect = 0.0
+        self._mark = time.perf_counter()
+
+    def headers_received(self, status_code: int):
+        now = time.perf_counter()
+        self.event.status_code = status_code
+        self.event.connect = self.connect
+        self.event.ttfb = max(0.0, now - self._mark - self.connect)
+        self._mark = now
+
+    def body_received(self, headers: Mapping[str, str], content: bytes):
+        now = time.perf_counter()
+        self.event.download = now - self._mark
+        self.event.response_bytes = int(headers.get("Content-Length", len(content)))
+        self._mark = now
+
+    def decoded(self, response: dict) -> RequestEvent:
+        now = time.perf_counter()
+        self.event.decode = now - self._mark
+        self.event.latency = now - self._start
+        if isinstance(response, dict):
+            self.event.request_id = response.get("request_id")
+            self.event.costs = response.get("costs") or {}
+            batch_sizes = [cost["batch_size"] for cost in self.event.costs.values() if "batch_size" in cost]
+            self.event.batch_size = sum(batch_sizes) if batch_sizes else None
+        return self.event
+
+    def failed(self, error: Exception) -> RequestEvent:
+        self.event.latency = time.perf_counter() - self._start
+        self.event.error = f"{type(error).__name__}: {error}"
+        return self.event
+
+
+class LatencyAggregator:
+    """In-process aggregate of the `RequestEvent` of the endpoints it is hooked to, per endpoint.
+
+    Latencies are kept in histograms of logarithmic buckets, so memory does not grow with the
+    number of requests, and percentiles are accurate to about 10%.
+
+    Example::
+
+        stats = LatencyAggregator()
+        create = Create("orion-fr", hooks=[stats])
+        ...
+        stats.percentiles("create")  # {"p50": 0.41, "p90": 0.72, "p99": 1.3}
+
+    Parameters
+    ----------
+    min_latency: float, default 1e-4,
+        upper bound in seconds of the lowest bucket of the histograms.
+    max_latency: float, default 600.,
+        lower bound in seconds of the highest bucket of the histograms.
+    growth: float, default 1.2,
+        ratio between the bounds of two consecutive buckets.
+    """
+
+    def __init__(self, min_latency: float = 1e-4, max_latency: float = 600.0, growth: float = 1.2):
+        self.bounds = [min_latency]
+        while self.bounds[-1] < max_latency:
+            self.bounds.append(self.bounds[-1] * growth)
+        self._endpoints: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent):
+        with self._lock:
+            stats = self._endpoints.get(event.endpoint)
+            if stats is None:
+                stats = self._endpoints[event.endpoint] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "request_bytes": 0,
+                    "response_bytes": 0,
+                    "inputs": 0,
+                    "phases": dict.fromkeys(PHASES, 0.0),
+                    "costs": {},
+                    "histogram": [0] * (len(self.bounds) + 1),
+                }
+            stats["requests"] += 1
+            stats["errors"] += not event.ok
+            stats["retries"] += event.retries
+            stats["request_bytes"] += event.request_bytes
+            stats["response_bytes"] += event.response_bytes
+            stats["inputs"] += event.batch_size or 0
+            for phase in PHASES:
+                stats["phases"][phase] += getattr(event, phase)
+            merge_costs(stats["costs"], event.costs)
+            stats["histogram"][bisect_left(self.bounds, event.latency)] += 1
+
+    @property
+    def endpoints(self) -> List[str]:
+        return sorted(self._endpoints)
+
+    def percentile(self, endpoint: str, q: float) -> Optional[float]:
+        """Latency in seconds under which `q` percent of the requests to `endpoint` completed."""
+        with self._lock:
+            histogram = list(self._endpoints[endpoint]["histogram"]) if endpoint in self._endpoints else []
+        total = sum(histogram)
+        if not total:
+            return None
+        rank, seen = q / 100 * total, 0
+        for i, count in enumerate(histogram):
+            seen += count
+            if count and seen >= rank:
+                # geometric middle of the bucket
+                low = self.bounds[i - 1] if i else self.bounds[0] / (self.bounds[1] / self.bounds[0])
+                high = self.bounds[min(i, len(self.bounds) - 1)]
+                return (low * high) ** 0.5
+        return None
+
+    def percentiles(self, endpoint: str, qs=(50, 90, 99)) -> Dict[str, float]:
+        return {f"p{q}": self.percentile(endpoint, q) for q in qs}
+
+    def summary(self) -> Dict[str, dict]:
+        """Counters, latency percentiles, mean time per phase and costs of each endpoint."""
+        summary = {}
+        for endpoint in self.endpoints:
+            with self._lock:
+                stats = self._endpoints[endpoint]
+                counters = ["requests", "errors", "retries", "inputs", "request_bytes", "response_bytes"]
+                summary[endpoint] = {key: stats[key] for key in counters}
+                summary[endpoint]["mean"] = {
+                    phase: seconds / stats["requests"] for phase, seconds in stats["phases"].items()
+                }
+                summary[endpoint]["costs"] = {model: dict(cost) for model, cost in stats["costs"].items()}
+            summary[endpoint]["latency"] = self.percentiles(endpoint)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
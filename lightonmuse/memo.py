@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import copy
+import hashlib
+import threading
+import time
+from typing import Dict, Hashable, Optional
+
+
+class Memo:
+    """In-memory memoization of the responses to deterministic calls, with LRU and TTL eviction.
+
+    Pass it to an endpoint (`memo=Memo()`) to serve repeated deterministic calls from memory:
+    `Tokenize`, `Analyse`, `Embed`, `Select`, `Compare`, and `Create` with `mode="greedy"` or a
+    fixed `seed`. A single `Memo` can be shared by several endpoint objects, calls being keyed on
+    the endpoint, the model and the payload.
+
+    Parameters
+    ----------
+    maxsize: int, default 1024,
+        maximum number of responses kept. The least recently used response is evicted beyond it.
+    ttl: Optional[float], default None,
+        time in seconds after which a response expires. Responses never expire by default.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, model: str, payload: bytes) -> Hashable:
+        """Key of a call, the payload being hashed to keep memory use low."""
+        return url, model, hashlib.sha256(payload).digest()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._responses),
+            "maxsize": self.maxsize,
+        }
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """Returns a copy of the response stored for `key`, or None."""
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._responses[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._responses.move_to_end(key)
+            self.hits += 1
+        # endpoints post-process responses in place, never hand out the stored one
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: Hashable, response: dict):
+        entry = (time.monotonic(), copy.deepcopy(response))
+        with self._lock:
+            self._responses[key] = entry
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.maxsize:
+                self._responses.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
@@ -0,0 +1,207 @@
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+import threading
+from typing import Awaitable, Callable, Iterable, Iterator, List, Tuple
+
+from .deadlines import run_in_context
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Lazily splits `iterable` into lists of at most `size` items."""
+    if size < 1:
+        raise ValueError(f"Chunk size should be at least 1, got {size}.")
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def merge_costs(total: dict, cost: dict) -> dict:
+    """Adds the per-model `cost` dict of a request to the running `total`, in place.
+
+    Numeric fields (tokens, batch size...) are summed, other fields (e.g. `cost_type`) are kept.
+    """
+    for model, model_cost in cost.items():
+        if not isinstance(model_cost, dict):
+            continue
+        total_cost = total.setdefault(model, {})
+        for field, value in model_cost.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total_cost[field] = total_cost.get(field, 0) + value
+            else:
+                total_cost[field] = value
+    return total
+
+
+class MapIterator:
+    """Lazily runs an endpoint over an iterable, a chunk of inputs per request.
+
+    At most `2 * workers` chunks are read from the input and held in memory at any time: the input
+    is only consumed as results are yielded. Costs and request IDs of the chunks completed so far
+    are available in `cost` and `request_ids`.
+
+    Parameters
+    ----------
+    call: Callable[[list], Tuple[List, dict, str]],
+        sends a chunk of inputs and returns one output per input, the cost and the request ID.
+    iterable: Iterable,
+        inputs to process.
+    batch_size: int,
+        number of inputs sent per request.
+    workers: int,
+        number of requests in flight at the same time.
+    ordered: bool,
+        if True, outputs are yielded in input order. Otherwise `(index, output)` pairs are
+        yielded as soon as their chunk completes.
+    """
+
+    def __init__(
+        self,
+        call: Callable[[list], Tuple[List, dict, str]],
+        iterable: Iterable,
+        batch_size: int,
+        workers: int,
+        ordered: bool = True,
+    ):
+        self.call = call
+        self.batch_size = batch_size
+        self.workers = workers
+        self.ordered = ordered
+        self.cost = {}
+        self.request_ids = []
+        self._chunks = enumerate(chunked(iterable, batch_size))
+        # index of the first input of each chunk in flight
+        self._starts = {}
+        # chunks are sent with the `call_options` of the caller, and abandoned when the iterator is closed
+        self._cancelled = threading.Event()
+        self._call = run_in_context(call, self._cancelled)
+        self._results = self._run()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._results)
+
+    def close(self):
+        """Stops processing, cancelling the chunks that haven't been sent yet.
+
+        Requests in flight are abandoned: they aren't retried anymore, and raise `CancelledError`.
+        """
+        self._results.close()
+
+    def _submit(self, pool: ThreadPoolExecutor, pending):
+        for i, chunk in islice(self._chunks, 2 * self.workers - len(pending)):
+            future = pool.submit(self._call, chunk)
+            self._starts[future] = i * self.batch_size
+            pending.append(future)
+
+    def _collect(self, future) -> list:
+        del self._starts[future]
+        outputs, cost, request_id = future.result()
+        merge_costs(self.cost, cost)
+        self.request_ids.append(request_id)
+        return outputs
+
+    def _run(self):
+        pool = ThreadPoolExecutor(self.workers)
+        pending = deque()
+        try:
+            self._submit(pool, pending)
+            while pending:
+                if self.ordered:
+                    future = pending.popleft()
+                    outputs = self._collect(future)
+                    self._submit(pool, pending)
+                    yield from outputs
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                    self._submit(pool, pending)
+                    for future in done:
+                        start = self._starts[future]
+                        yield from enumerate(self._collect(future), start=start)
+        finally:
+            self._cancelled.set()
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+
+class AsyncMapIterator:
+    """Asynchronous counterpart of `MapIterator`, `call` being a coroutine function.
+
+    Iterate over it with `async for`.
+    """
+
+    def __init__(
+        self,
+        call: Callable[[list], Awaitable[Tuple[List, dict, str]]],
+        iterable: Iterable,
+        batch_size: int,
+        workers: int,
+        ordered: bool = True,
+    ):
+        self.call = call
+        self.batch_size = batch_size
+        self.workers = workers
+        self.ordered = ordered
+        self.cost = {}
+        self.request_ids = []
+        self._chunks = enumerate(chunked(iterable, batch_size))
+        # index of the first input of each chunk in flight
+        self._starts = {}
+        self._results = self._run()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._results.__anext__()
+
+    async def aclose(self):
+        """Stops processing, cancelling the chunks in flight."""
+        await self._results.aclose()
+
+    def _submit(self, pending):
+        for i, chunk in islice(self._chunks, 2 * self.workers - len(pending)):
+            task = asyncio.ensure_future(self.call(chunk))
+            self._starts[task] = i * self.batch_size
+            pending.append(task)
+
+    def _collect(self, task) -> list:
+        del self._starts[task]
+        outputs, cost, request_id = task.result()
+        merge_costs(self.cost, cost)
+        self.request_ids.append(request_id)
+        return outputs
+
+    async def _run(self):
+        pending = deque()
+        try:
+            self._submit(pending)
+            while pending:
+                if self.ordered:
+                    task = pending[0]
+                    await task
+                    pending.popleft()
+                    outputs = self._collect(task)
+                    self._submit(pending)
+                    for output in outputs:
+                        yield output
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.remove(task)
+                    self._submit(pending)
+                    for task in done:
+                        start = self._starts[task]
+                        for item in enumerate(self._collect(task), start=start):
+                            yield item
+        finally:
+            for task in pending:
+                task.cancel()
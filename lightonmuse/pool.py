@@ -0,0 +1,187 @@
+from dataclasses import dataclass
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .retry import RetryPolicy
+
+
+@dataclass
+class Lease:
+    """Base URL and API key a request is sent with, to be given back to `EndpointPool.release`."""
+
+    base_url: str
+    api_key: Optional[str]
+
+
+class _Replica:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        # consecutive failures, the circuit opens when they reach the threshold
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.probing = False
+
+    def state(self, now: float) -> str:
+        if self.open_until is None:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+
+class _Key:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.outstanding = 0
+        self.requests = 0
+        self.throttled_until = 0.0
+
+
+class EndpointPool:
+    """Client-side load balancing of the requests over several replicas of the API and API keys.
+
+    Each request goes to the healthy replica with the fewest requests in flight, with the API key
+    with the fewest requests in flight among the ones that weren't just throttled. Endpoint objects
+    sharing a pool share its view of the load and health of the replicas.
+
+    A replica failing `failure_threshold` times in a row (connection errors and 5xx responses) is
+    taken out of rotation for `recovery_time` seconds, after which a single probe request is let
+    through: the replica is back in rotation if it succeeds, out for another `recovery_time`
+    otherwise. When every replica is out of rotation, requests go to the one that comes back first.
+    Retries are sent through the pool too, so they fail over to another replica.
+
+    Parameters
+    ----------
+    base_urls: List[str],
+        base URLs of the replicas, e.g. `"https://muse-1.example.com/muse/v1/"`.
+    api_keys: Optional[List[str]], default None,
+        API keys to spread the requests over. Defaults to the `MUSE_API_KEY` of the endpoint objects.
+    failure_threshold: int, default 3,
+        number of consecutive failures after which a replica is taken out of rotation.
+    recovery_time: float, default 10.,
+        time in seconds a failing replica stays out of rotation before being probed.
+    throttle_time: float, default 1.,
+        time in seconds an API key is avoided after a 429 Too Many Requests response without
+        `Retry-After` header.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        api_keys: Optional[List[str]] = None,
+        failure_threshold: int = 3,
+        recovery_time: float = 10.0,
+        throttle_time: float = 1.0,
+    ):
+        if not base_urls:
+            raise ValueError("The pool needs at least one base URL.")
+        if api_keys is not None and not api_keys:
+            raise ValueError("`api_keys` is empty, use None to use `MUSE_API_KEY`.")
+        self.base_urls = [url if url.endswith("/") else url + "/" for url in base_urls]
+        self.api_keys = list(api_keys) if api_keys is not None else None
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.throttle_time = throttle_time
+        self._replicas = {url: _Replica(url) for url in self.base_urls}
+        self._keys = {key: _Key(key) for key in self.api_keys or []}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "EndpointPool":
+        """Pool of the comma-separated base URLs and API keys of `MUSE_BASE_URLS` and `MUSE_API_KEYS`."""
+        base_urls = [url.strip() for url in os.environ.get("MUSE_BASE_URLS", "").split(",") if url.strip()]
+        api_keys = [key.strip() for key in os.environ.get("MUSE_API_KEYS", "").split(",") if key.strip()]
+        return cls(base_urls or ["https://api.lighton.ai/muse/v1/"], api_keys or None, **kwargs)
+
+    def acquire(self) -> Lease:
+        """Picks the base URL and API key of the next request, counted in flight until `release`."""
+        now = time.monotonic()
+        with self._lock:
+            replica = self._pick_replica(now)
+            replica.outstanding += 1
+            replica.requests += 1
+            key = None
+            if self._keys:
+                key = min(self._keys.values(), key=lambda k: (k.throttled_until > now, k.outstanding, k.requests))
+                key.outstanding += 1
+                key.requests += 1
+        return Lease(replica.base_url, key.api_key if key is not None else None)
+
+    def release(
+        self, lease: Lease, status_code: Optional[int], retry_after: Optional[str] = None, abandoned: bool = False
+    ):
+        """Records the outcome of the request sent with `lease`.
+
+        Parameters
+        ----------
+        lease: Lease,
+            lease of the request, as returned by `acquire`.
+        status_code: Optional[int],
+            status code of the response, None if the connection failed.
+        retry_after: Optional[str], default None,
+            `Retry-After` header of the response, the time to wait before using the API key again
+            after a 429 response.
+        abandoned: bool, default False,
+            whether the request was abandoned by the client (e.g. cancelled), saying nothing of
+            the health of the replica.
+        """
+        now = time.monotonic()
+        with self._lock:
+            replica = self._replicas[lease.base_url]
+            replica.outstanding -= 1
+            if abandoned:
+                # a probe that didn't complete, let another request probe the replica
+                replica.probing = False
+            elif status_code is None or status_code >= 500:
+                self._failed(replica, now)
+            else:
+                # the replica answered, client errors and throttling included
+                replica.consecutive_failures = 0
+                replica.open_until = None
+                replica.probing = False
+            key = self._keys.get(lease.api_key)
+            if key is not None:
+                key.outstanding -= 1
+                if status_code == 429:
+                    delay = RetryPolicy._parse_retry_after(retry_after) if retry_after is not None else None
+                    key.throttled_until = now + (delay if delay is not None else self.throttle_time)
+
+    def status(self) -> List[Dict]:
+        """State (`"closed"`, `"open"` or `"half-open"`), load and failures of each replica."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "base_url": replica.base_url,
+                    "state": replica.state(now),
+                    "outstanding": replica.outstanding,
+                    "requests": replica.requests,
+                    "failures": replica.failures,
+                }
+                for replica in self._replicas.values()
+            ]
+
+    def _pick_replica(self, now: float) -> _Replica:
+        available = []
+        for replica in self._replicas.values():
+            state = replica.state(now)
+            if state == "closed":
+                available.append(replica)
+            elif state == "half-open" and not replica.probing:
+                # the first request after `recovery_time` probes the replica
+                replica.probing = True
+                return replica
+        if not available:
+            return min(self._replicas.values(), key=lambda replica: replica.open_until)
+        # ties go to the least used replica, so that an idle pool is used in turn
+        return min(available, key=lambda replica: (replica.outstanding, replica.requests))
+
+    def _failed(self, replica: _Replica, now: float):
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if replica.probing or replica.consecutive_failures >= self.failure_threshold:
+            replica.open_until = now + self.recovery_time
+        replica.probing = False
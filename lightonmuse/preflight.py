@@ -0,0 +1,260 @@
+from collections import OrderedDict
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .api_requests import BaseRequest, Create, Tokenize
+
+
+class PreparedBatch(NamedTuple):
+    """Inputs ready to be sent, as prepared by `TokenBudget.prepare`.
+
+    Attributes
+    ----------
+    texts: List[str],
+        texts fitting the token budget, to be sent to the endpoint.
+    origins: List[int],
+        index of the original input of each text. An input split in several pieces appears
+        several times.
+    rejected: Dict[int, str],
+        index and reason of rejection of the inputs that won't be sent.
+    """
+
+    texts: List[str]
+    origins: List[int]
+    rejected: Dict[int, str]
+
+
+class TokenBudget:
+    """Client-side pre-flight validation of inputs against the context size of a model.
+
+    Empty and over-long inputs only fail after a round trip to the API, and make the whole batch
+    fail with them. `TokenBudget` counts the tokens of each input with `Tokenize`, caching the
+    counts locally, and rejects or fixes offending inputs before they are sent.
+
+    Parameters
+    ----------
+    model: str,
+        name of the model the inputs are meant for.
+    max_tokens: int, default 2048,
+        context size of the model, in tokens.
+    policy: str, default "error",
+        what to do with inputs exceeding the budget. Choose between:
+        - `"error"`: raise a `ValueError` listing them, without sending anything.
+        - `"skip"`: don't send them, their outputs are None.
+        - `"truncate"`: shorten them at a word boundary until they fit.
+        - `"split"`: split them at word boundaries in pieces that fit, their output is the list of
+        the outputs of the pieces.
+        Empty inputs are always rejected: they raise with `"error"`, and are skipped otherwise.
+        Inputs that can't be made to fit, e.g. with a single word longer than the budget, are
+        skipped by `"truncate"` and `"split"`.
+    truncate_side: str, default "right",
+        which end of the text is dropped by the `"truncate"` policy. Use `"left"` to keep the end of
+        `Create` prompts.
+    batch_size: int, default 32,
+        number of texts tokenized per request.
+    max_cached: int, default 100000,
+        maximum number of token counts kept in the local cache.
+    **kwargs,
+        transport options of the `Tokenize` endpoint, see `BaseRequest`.
+    """
+
+    policies = ["error", "skip", "truncate", "split"]
+
+    def __init__(
+        self,
+        model: str = "orion-fr-v2",
+        max_tokens: int = 2048,
+        policy: str = "error",
+        truncate_side: str = "right",
+        batch_size: int = 32,
+        max_cached: int = 100000,
+        **kwargs,
+    ):
+        if policy not in self.policies:
+            raise ValueError(f"policy: {policy} is not valid. Use one of {', '.join(self.policies)}")
+        if truncate_side not in ["left", "right"]:
+            raise ValueError(f"truncate_side: {truncate_side} is not valid. Use one of `left` or `right`")
+        self.tokenizer = Tokenize(model, **kwargs)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.truncate_side = truncate_side
+        self.batch_size = batch_size
+        self.max_cached = max_cached
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, texts: List[str]) -> List[int]:
+        """Number of tokens of each text, only tokenizing the texts missing from the local cache."""
+        unique_texts = list(dict.fromkeys(texts))
+        with self._lock:
+            counts = {text: self._counts[text] for text in unique_texts if text in self._counts}
+        missing = [text for text in unique_texts if text not in counts]
+        if missing:
+            outputs, _, _ = self.tokenizer.map(missing, batch_size=self.batch_size)
+            counts.update((text, self._n_tokens(output)) for text, output in zip(missing, outputs))
+        with self._lock:
+            for text in unique_texts:
+                self._counts[text] = counts[text]
+                self._counts.move_to_end(text)
+            while len(self._counts) > self.max_cached:
+                self._counts.popitem(last=False)
+        return [counts[text] for text in texts]
+
+    def prepare(self, texts: List[str], reserve: int = 0) -> PreparedBatch:
+        """Validates `texts` and applies the policy to the ones exceeding the budget.
+
+        Parameters
+        ----------
+        texts: List[str],
+            input texts.
+        reserve: int, default 0,
+            tokens to keep free in the context, e.g. the number of tokens generated by `Create`.
+
+        Return
+        ------
+        prepared: PreparedBatch,
+            texts to send, index of their original input, and rejected inputs.
+        """
+        budget = self.max_tokens - reserve
+        if budget <= 0:
+            raise ValueError(
+                f"A reserve of {reserve} tokens leaves no budget in the {self.max_tokens} tokens of `{self.model}`."
+            )
+        rejected = {i: "empty text" for i, text in enumerate(texts) if not text}
+        if self.policy == "error" and rejected:
+            # no need to tokenize the other inputs to reject the batch
+            raise ValueError(f"Inputs {sorted(rejected)} are empty.")
+        candidates = [i for i in range(len(texts)) if i not in rejected]
+        counts = dict(zip(candidates, self.count([texts[i] for i in candidates])))
+        too_long = [i for i in candidates if counts[i] > budget]
+        if self.policy == "error" and too_long:
+            raise ValueError(f"Inputs {too_long} exceed the budget of {budget} tokens of `{self.model}`.")
+        if self.policy == "skip":
+            rejected.update({i: f"{counts[i]} tokens exceed the budget of {budget}" for i in too_long})
+            too_long = []
+        pieces = {i: [texts[i]] for i in candidates if i not in rejected and i not in too_long}
+        if too_long:
+            fit = self._truncate if self.policy == "truncate" else self._split
+            fitted = fit({i: texts[i] for i in too_long}, {i: counts[i] for i in too_long}, budget)
+            rejected.update({i: f"can't fit the budget of {budget} tokens" for i in fitted if fitted[i] is None})
+            pieces.update({i: fitted[i] for i in fitted if fitted[i] is not None})
+        prepared = PreparedBatch([], [], rejected)
+        for i in sorted(pieces):
+            prepared.texts.extend(pieces[i])
+            prepared.origins.extend([i] * len(pieces[i]))
+        return prepared
+
+    def __call__(
+        self, endpoint: BaseRequest, texts: List[str], reserve: Optional[int] = None, **kwargs
+    ) -> Tuple[List, dict, Optional[str]]:
+        """Prepares `texts` and sends the ones fitting the budget to `endpoint` in a single call.
+
+        Parameters
+        ----------
+        endpoint: BaseRequest,
+            endpoint taking a list of texts, using the same model as the budget.
+        texts: List[str],
+            input texts.
+        reserve: Optional[int], default None,
+            tokens to keep free in the context. Defaults to `n_tokens` for `Create`, 0 otherwise.
+        **kwargs,
+            other arguments of the endpoint.
+
+        Return
+        ------
+        outputs: list,
+            one element per input text: None if it was rejected, the list of the outputs of its
+            pieces if it was split, and its output otherwise.
+        cost: dict,
+            cost of the request, empty if nothing was sent.
+        request_id: Optional[str],
+            ID string for the request, None if nothing was sent.
+        """
+        if endpoint.model != self.model:
+            raise ValueError(f"Token budget computed for `{self.model}`, but endpoint uses `{endpoint.model}`.")
+        if reserve is None:
+            reserve = kwargs.get("n_tokens", 20) if isinstance(endpoint, Create) else 0
+        prepared = self.prepare(texts, reserve=reserve)
+        outputs, cost, request_id = [None] * len(texts), {}, None
+        if prepared.texts:
+            sent, cost, request_id = endpoint(prepared.texts, **kwargs)
+            for origin, output in zip(prepared.origins, sent):
+                if self.policy == "split":
+                    outputs[origin] = (outputs[origin] or []) + [output]
+                else:
+                    outputs[origin] = output
+        if self.policy == "split":
+            # only inputs that had to be split return a list of outputs
+            outputs = [output[0] if output is not None and len(output) == 1 else output for output in outputs]
+        return outputs, cost, request_id
+
+    @staticmethod
+    def _n_tokens(output: dict) -> int:
+        if "n_tokens" in output:
+            return output["n_tokens"]
+        return output["execution_metadata"]["cost"]["tokens_input"]
+
+    def _truncate(
+        self, texts: Dict[int, str], counts: Dict[int, int], budget: int
+    ) -> Dict[int, Optional[List[str]]]:
+        fitted = {}
+        # shrink proportionally to the excess of tokens, checking the exact count after each round
+        while texts:
+            for i, text in texts.items():
+                texts[i] = self._cut(text, int(len(text) * budget / counts[i] * 0.95))
+            counts.update(zip(texts, self.count(list(texts.values()))))
+            for i in [i for i in texts if counts[i] <= budget]:
+                fitted[i] = [texts.pop(i)]
+            for i in [i for i in texts if len(texts[i]) <= 1]:
+                # nothing left to cut
+                texts.pop(i)
+                fitted[i] = None
+        return fitted
+
+    def _split(
+        self, texts: Dict[int, str], counts: Dict[int, int], budget: int
+    ) -> Dict[int, Optional[List[str]]]:
+        pieces = {}
+        for i, text in texts.items():
+            n_pieces = -(-counts[i] // budget)
+            pieces[i] = self._chunk_words(text, int(len(text) / n_pieces * 0.95))
+        # pieces may still be too long if tokens are unevenly spread, split those again
+        flat = [(i, piece) for i in pieces for piece in pieces[i]]
+        piece_counts = self.count([piece for _, piece in flat])
+        result = {i: [] for i in texts}
+        for (i, piece), n_tokens in zip(flat, piece_counts):
+            if result[i] is None:
+                continue
+            if n_tokens <= budget:
+                result[i].append(piece)
+            elif len(piece.split()) <= 1:
+                # a single word can't be split at word boundaries, the input can't fit
+                result[i] = None
+            else:
+                split = self._split({i: piece}, {i: n_tokens}, budget)[i]
+                result[i] = None if split is None else result[i] + split
+        return result
+
+    def _cut(self, text: str, n_chars: int) -> str:
+        n_chars = max(1, min(n_chars, len(text) - 1))
+        if self.truncate_side == "right":
+            cut = text[:n_chars]
+            boundary = cut.rfind(" ")
+            return cut[:boundary] if boundary > 0 else cut
+        cut = text[len(text) - n_chars:]
+        boundary = cut.find(" ")
+        return cut[boundary + 1:] if 0 <= boundary < len(cut) - 1 else cut
+
+    @staticmethod
+    def _chunk_words(text: str, n_chars: int) -> List[str]:
+        pieces, current = [], ""
+        for word in re.findall(r"\S+\s*", text):
+            if current and len(current) + len(word) > n_chars:
+                pieces.append(current)
+                current = ""
+            current += word
+        if current:
+            pieces.append(current)
+        return pieces
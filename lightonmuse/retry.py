@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import random
+import threading
+from typing import FrozenSet, Optional
+
+
+class MuseAPIError(RuntimeError):
+    """Raised when the Muse API answers with an error status code.
+
+    Parameters
+    ----------
+    status_code: int,
+        HTTP status code of the last attempt.
+    message: str,
+        body of the error response.
+    attempts: int,
+        number of attempts made before giving up.
+    """
+
+    def __init__(self, status_code: int, message: str, attempts: int = 1):
+        self.status_code = status_code
+        self.message = message
+        self.attempts = attempts
+        super().__init__(f"The request failed with status code {status_code}: {message}")
+
+
+@dataclass
+class RetryPolicy:
+    """How failed requests are retried.
+
+    Retries wait with exponential backoff and full jitter: the n-th retry waits a random time
+    between 0 and `min(max_backoff, backoff_factor * 2 ** (n - 1))` seconds. When the server
+    answers with a `Retry-After` header (e.g. on 429 Too Many Requests), its value is used instead,
+    up to `max_backoff`.
+
+    Calls that aren't deterministic, e.g. a sampling `Create`, may already have been processed and
+    billed when their request fails with a server error or a read timeout. They are only retried on
+    connection errors and 429 Too Many Requests.
+
+    Parameters
+    ----------
+    max_retries: int, default 3,
+        maximum number of retries after the first attempt. 0 disables retries.
+    backoff_factor: float, default 0.5,
+        base of the exponential backoff, in seconds.
+    max_backoff: float, default 30.,
+        maximum backoff between two attempts, in seconds, `Retry-After` included.
+    retry_statuses: FrozenSet[int], default {429, 502, 503, 504},
+        status codes worth retrying.
+    retry_connection_errors: bool, default True,
+        whether to retry when the connection fails or times out.
+    respect_retry_after: bool, default True,
+        whether to wait for the time given by the `Retry-After` header of the response.
+    """
+
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    max_backoff: float = 30.0
+    retry_statuses: FrozenSet[int] = frozenset({429, 502, 503, 504})
+    retry_connection_errors: bool = True
+    respect_retry_after: bool = True
+
+    def should_retry(self, attempt: int, status_code: Optional[int] = None, deterministic: bool = True) -> bool:
+        """Whether to retry after `attempt` attempts, the last one failing with `status_code`.
+
+        A `status_code` of None denotes a connection error.
+        """
+        if attempt > self.max_retries:
+            return False
+        if status_code is None:
+            return self.retry_connection_errors
+        return status_code in self.retry_statuses and (deterministic or status_code == 429)
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Time to wait in seconds before the attempt following `attempt`."""
+        if retry_after is not None and self.respect_retry_after:
+            delay = self._parse_retry_after(retry_after)
+            if delay is not None:
+                return min(delay, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def _parse_retry_after(retry_after: str) -> Optional[float]:
+        # `Retry-After` is either a number of seconds or an HTTP date
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryStats:
+    """Thread-safe counters of the attempts made by an endpoint object.
+
+    Attributes
+    ----------
+    requests: int,
+        number of calls that reached the network.
+    attempts: int,
+        number of HTTP requests sent, retries included.
+    retries: int,
+        number of attempts that were retries.
+    throttled: int,
+        number of attempts rejected with 429 Too Many Requests.
+    failures: int,
+        number of calls that failed after exhausting their retries.
+    """
+
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, attempts: int, throttled: int, failed: bool):
+        with self._lock:
+            self.requests += 1
+            self.attempts += attempts
+            self.retries += attempts - 1
+            self.throttled += throttled
+            self.failures += failed
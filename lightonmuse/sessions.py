@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from typing import Dict
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# time spent opening connections by the requests of the current thread, see `TimedAdapter`
+_connect_time = threading.local()
+
+
+def reset_connect_time():
+    _connect_time.seconds = 0.0
+
+
+def connect_time() -> float:
+    """Time in seconds spent opening connections (DNS, TCP, TLS) in this thread since `reset_connect_time`."""
+    return getattr(_connect_time, "seconds", 0.0)
+
+
+class _TimedConnectionMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.seconds = connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """`HTTPAdapter` whose connections record the time spent opening them, read with `connect_time`.
+
+    Connections are opened in the thread sending the request, so the time is kept per thread.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class SessionRegistry:
+    """Process-wide registry of keep-alive HTTP sessions, one per base URL.
+
+    Every endpoint object targeting the same base URL shares the same `requests.Session`,
+    so the TCP+TLS handshake is only paid once per pooled connection instead of once per call.
+
+    Parameters
+    ----------
+    pool_maxsize: int, default 10,
+        maximum number of connections kept alive per host. Should be at least the number of
+        threads issuing requests concurrently.
+    pool_block: bool, default False,
+        whether threads should wait for a free connection when the pool is exhausted instead of
+        opening a new, non-pooled one.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, pool_block: bool = False):
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str) -> requests.Session:
+        """Returns the shared session for `base_url`, creating it on first use."""
+        session = self._sessions.get(base_url)
+        if session is None:
+            with self._lock:
+                # another thread may have created it while we were waiting for the lock
+                session = self._sessions.get(base_url)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[base_url] = session
+        return session
+
+    def configure(self, pool_maxsize: int = None, pool_block: bool = None):
+        """Changes the pool settings. Existing sessions are closed and lazily recreated."""
+        with self._lock:
+            if pool_maxsize is not None:
+                self.pool_maxsize = pool_maxsize
+            if pool_block is not None:
+                self.pool_block = pool_block
+            self._close_all()
+
+    def close(self):
+        """Closes every pooled connection."""
+        with self._lock:
+            self._close_all()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = TimedAdapter(
+            pool_connections=1, pool_maxsize=self.pool_maxsize, pool_block=self.pool_block
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _close_all(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions = {}
+
+
+registry = SessionRegistry()
+
+
+def configure_sessions(pool_maxsize: int = None, pool_block: bool = None):
+    """Configures the connection pools shared by all endpoint objects.
+
+    Parameters
+    ----------
+    pool_maxsize: int, default None,
+        maximum number of connections kept alive per base URL.
+    pool_block: bool, default None,
+        whether to block when all pooled connections are in use.
+    """
+    registry.configure(pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+
+class AsyncSessionRegistry:
+    """Registry of pooled `aiohttp.ClientSession` objects, one per event loop and base URL.
+
+    `aiohttp` sessions are bound to the event loop they were created in, so sessions are kept per
+    loop and dropped together with it. The connection limit follows `registry.pool_maxsize`.
+    """
+
+    def __init__(self):
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get(self, base_url: str):
+        """Returns the shared session for `base_url` in the running event loop."""
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError(
+                "The asynchronous bindings require `aiohttp`. Install it with `pip install lightonmuse[async]`."
+            ) from e
+        loop = asyncio.get_running_loop()
+        sessions = self._sessions.setdefault(loop, {})
+        session = sessions.get(base_url)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=registry.pool_maxsize)
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[_connect_trace_config(aiohttp)])
+            sessions[base_url] = session
+        return session
+
+    async def close(self):
+        """Closes the sessions of the running event loop."""
+        sessions = self._sessions.pop(asyncio.get_running_loop(), {})
+        for session in sessions.values():
+            await session.close()
+
+
+def _connect_trace_config(aiohttp):
+    # adds the time spent opening connections to the `connect` of the `trace_request_ctx` of requests
+    async def on_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_end(session, context, params):
+        trace = context.trace_request_ctx
+        if trace is not None and hasattr(trace, "connect"):
+            trace.connect += time.perf_counter() - context.start
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_start)
+    trace_config.on_connection_create_end.append(on_end)
+    return trace_config
+
+
+async_registry = AsyncSessionRegistry()
+
+
+async def close_async_sessions():
+    """Closes the connection pools used by the asynchronous bindings in the running event loop."""
+    await async_registry.close()
@@ -0,0 +1,241 @@
+from typing import List, Optional, Tuple, Union
+
+from .api_requests import Embed, Select
+from .client_side import CalibratedSelect
+from .index import EmbeddingIndex
+from .parallel import merge_costs
+
+
+class ShortlistSelect:
+    """Two-stage `Select` over large candidate sets.
+
+    `Select` scores every candidate with the language model, so its cost and latency grow with the
+    number of candidates. The candidates are instead embedded once and kept in an `EmbeddingIndex`,
+    the `k` candidates the most similar to each reference are shortlisted by a local cosine search,
+    and only the shortlist is scored by `selector`. Outputs keep the `rankings`/`best` format of
+    `selector`, the rankings holding the shortlisted candidates only::
+
+        selector = ShortlistSelect(Select("orion-fr"), k=20)
+        selector.fit(categories)  # embeds the 3,000 categories once
+        outputs, cost, request_id = selector(documents, conjunction="Catégorie :")
+
+    Parameters
+    ----------
+    selector: Select,
+        endpoint scoring the shortlisted candidates. A `CalibratedSelect` is to be fitted on the full
+        candidate set, its scores being calibrated over each shortlist.
+    k: int, default 10,
+        number of candidates shortlisted for each reference.
+    embedder: Optional[Embed], default None,
+        endpoint embedding the candidates and references. Defaults to an `Embed` endpoint of the
+        model and transport options of `selector`.
+    block_size: int, default 16384,
+        number of candidate embeddings scored at once by the cosine search.
+
+    Asynchronous endpoints are used with `AsyncShortlistSelect`.
+    """
+
+    _asynchronous = False
+
+    def __init__(self, selector: Select, k: int = 10, embedder: Optional[Embed] = None, block_size: int = 16384):
+        self._check_endpoint(selector)
+        if embedder is not None:
+            self._check_endpoint(embedder)
+        self.selector = selector
+        self.k = self._check_k(k)
+        self.embedder = embedder if embedder is not None else self._default_embedder(selector)
+        self.index = EmbeddingIndex(self.embedder, block_size=block_size)
+        self.candidates = None
+        self.fit_cost = None
+
+    def _check_endpoint(self, endpoint):
+        from .async_requests import AsyncRequest
+
+        if isinstance(endpoint, AsyncRequest) != self._asynchronous:
+            expected = "AsyncShortlistSelect" if isinstance(endpoint, AsyncRequest) else "ShortlistSelect"
+            raise TypeError(f"`{type(endpoint).__name__}` endpoints should be used with `{expected}`.")
+
+    @staticmethod
+    def _check_k(k: int) -> int:
+        if k < 1:
+            raise ValueError(f"`k` should be at least 1, got {k}.")
+        return k
+
+    def _default_embedder(self, selector: Select) -> Embed:
+        embed_class = Embed
+        if self._asynchronous:
+            from .async_requests import AsyncEmbed as embed_class
+        return embed_class(
+            selector.model,
+            retry=selector.retry,
+            codec=selector.codec,
+            memo=selector.memo,
+            hooks=selector.hooks,
+            hedge=selector.hedge,
+            pool=selector.pool,
+            timeout=selector.timeout,
+            deadline=selector.deadline,
+        )
+
+    def fit(self, candidates: Optional[List[str]] = None, **kwargs) -> dict:
+        """Embeds the candidates to shortlist from, once for every later call.
+
+        Parameters
+        ----------
+        candidates: Optional[List[str]], default None,
+            unique candidates. Defaults to the candidates `selector` is calibrated on, if it is a
+            `CalibratedSelect`.
+        **kwargs,
+            passed to `Embed.map`, e.g. `batch_size` and `workers` for large candidate sets.
+
+        Return
+        ------
+        cost: dict,
+            cost of embedding the candidates.
+        """
+        candidates = self._fit_candidates(candidates)
+        embeddings, cost, _ = self.embedder.map(candidates, as_array=True, **kwargs)
+        return self._fitted(candidates, embeddings, cost)
+
+    def _fit_candidates(self, candidates: Optional[List[str]]) -> List[str]:
+        if candidates is None:
+            candidates = getattr(self.selector, "candidates", None)
+            if candidates is None:
+                raise ValueError("`candidates` are needed unless `selector` is a fitted `CalibratedSelect`.")
+        return list(candidates)
+
+    def _fitted(self, candidates: List[str], embeddings, cost: dict) -> dict:
+        index = EmbeddingIndex(self.embedder, block_size=self.index.block_size)
+        index.add(candidates, embeddings)
+        self.index, self.candidates, self.fit_cost = index, candidates, cost
+        return cost
+
+    def shortlist(
+        self, reference: Union[str, List[str]], k: Optional[int] = None
+    ) -> Tuple[List[List[Tuple[str, float]]], dict]:
+        """Shortlists the candidates the most similar to each reference.
+
+        Return
+        ------
+        shortlists: List[List[Tuple[str, float]]],
+            for each reference, `(candidate, cosine similarity)` pairs sorted by decreasing similarity.
+        cost: dict,
+            cost of embedding the references.
+        """
+        k = self.k if k is None else self._check_k(k)
+        references = self._shortlist_references(reference)
+        if not references:
+            return [], {}
+        embeddings, cost, _ = self.embedder(references, as_array=True)
+        return self.index.search(embeddings, k=k), cost
+
+    def _shortlist_references(self, reference: Union[str, List[str]]) -> List[str]:
+        if self.candidates is None:
+            raise RuntimeError("Candidates should be embedded with the `fit` method before use.")
+        return [reference] if isinstance(reference, str) else reference
+
+    def __call__(
+        self,
+        reference: Union[str, List[str]],
+        candidates: Optional[List[str]] = None,
+        k: Optional[int] = None,
+        **kwargs,
+    ) -> Tuple[List, dict, str]:
+        """Parameters
+        -------------
+        reference: Union[str, List[str]],
+            reference input or list of reference inputs. A list is embedded in a single request and
+            its shortlists scored in a single request of `selector`.
+        candidates: Optional[List[str]], default None,
+            candidates to shortlist from. Defaults to the ones of `fit`, other candidates being
+            embedded first.
+        k: Optional[int], default None,
+            number of candidates shortlisted for each reference, overriding the one of the object.
+        **kwargs,
+            passed to `selector`, e.g. `conjunction` and `concat_best`.
+
+        Return
+        ------
+        outputs: list,
+            outputs of `selector` for the shortlisted candidates, in the same format.
+        cost: dict,
+            cost of embedding the references and scoring the shortlists, summed per model. It includes
+            the embedding of the candidates when they differ from the fitted ones.
+        request_id: str,
+            ID string of the `selector` request.
+        """
+        if k is not None:
+            self._check_k(k)
+        if isinstance(self.selector, CalibratedSelect):
+            # the calibration is checked against the conjunction of the call
+            kwargs.setdefault("conjunction", self.selector.conjunction)
+        cost = {}
+        if candidates is not None and list(candidates) != self.candidates:
+            merge_costs(cost, self.fit(candidates))
+        references = [reference] if isinstance(reference, str) else list(reference)
+        shortlists, embed_cost = self.shortlist(references, k=k)
+        merge_costs(cost, embed_cost)
+        if not references:
+            return [], cost, None
+        outputs, select_cost, request_id = self.selector(references, self._subsets(shortlists), **kwargs)
+        return self._outputs(reference, references, outputs), merge_costs(cost, select_cost), request_id
+
+    @staticmethod
+    def _subsets(shortlists: List[List[Tuple[str, float]]]) -> List[List[str]]:
+        return [[candidate for candidate, _ in shortlist] for shortlist in shortlists]
+
+    def _outputs(self, reference: Union[str, List[str]], references: List[str], outputs: list) -> list:
+        # `_parse` unwraps the outputs of a single reference
+        outputs = self.selector._map_outputs(references, outputs)
+        return outputs[0] if isinstance(reference, str) else outputs
+
+
+class AsyncShortlistSelect(ShortlistSelect):
+    """Asynchronous two-stage `Select`, see `ShortlistSelect`.
+
+    `selector` and `embedder` are asynchronous endpoints, e.g. `AsyncSelect` and `AsyncEmbed`. Both
+    `fit` and calling the object must be awaited, the cosine search running in the event loop.
+    """
+
+    _asynchronous = True
+
+    async def fit(self, candidates: Optional[List[str]] = None, **kwargs) -> dict:
+        """Embeds the candidates to shortlist from, see `ShortlistSelect.fit`."""
+        candidates = self._fit_candidates(candidates)
+        embeddings, cost, _ = await self.embedder.map(candidates, as_array=True, **kwargs)
+        return self._fitted(candidates, embeddings, cost)
+
+    async def shortlist(
+        self, reference: Union[str, List[str]], k: Optional[int] = None
+    ) -> Tuple[List[List[Tuple[str, float]]], dict]:
+        """Shortlists the candidates the most similar to each reference, see `ShortlistSelect.shortlist`."""
+        k = self.k if k is None else self._check_k(k)
+        references = self._shortlist_references(reference)
+        if not references:
+            return [], {}
+        embeddings, cost, _ = await self.embedder(references, as_array=True)
+        return self.index.search(embeddings, k=k), cost
+
+    async def __call__(
+        self,
+        reference: Union[str, List[str]],
+        candidates: Optional[List[str]] = None,
+        k: Optional[int] = None,
+        **kwargs,
+    ) -> Tuple[List, dict, str]:
+        """Runs the selector on the shortlist of each reference, see `ShortlistSelect.__call__`."""
+        if k is not None:
+            self._check_k(k)
+        if isinstance(self.selector, CalibratedSelect):
+            # the calibration is checked against the conjunction of the call
+            kwargs.setdefault("conjunction", self.selector.conjunction)
+        cost = {}
+        if candidates is not None and list(candidates) != self.candidates:
+            merge_costs(cost, await self.fit(candidates))
+        references = [reference] if isinstance(reference, str) else list(reference)
+        shortlists, embed_cost = await self.shortlist(references, k=k)
+        merge_costs(cost, embed_cost)
+        if not references:
+            return [], cost, None
+        outputs, select_cost, request_id = await self.selector(references, self._subsets(shortlists), **kwargs)
+        return self._outputs(reference, references, outputs), merge_costs(cost, select_cost), request_id
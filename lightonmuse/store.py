@@ -0,0 +1,238 @@
+from itertools import zip_longest
+import json
+import os
+from typing import Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .parallel import MapIterator, chunked
+
+
+def merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """Sorted union of `[start, stop)` row ranges, adjacent ranges being merged."""
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+def _zip_ids(texts: Iterable[str], ids: Iterable[Hashable]) -> Iterator[Tuple[str, Hashable]]:
+    # `zip(..., strict=True)` is only available from Python 3.10
+    missing = object()
+    for text, id_ in zip_longest(texts, ids, fillvalue=missing):
+        if text is missing or id_ is missing:
+            raise ValueError("`ids` and `texts` have different lengths.")
+        yield text, id_
+
+
+class EmbeddingStore:
+    """Memory-mapped on-disk matrix of the embeddings of a corpus, written by a resumable job.
+
+    The store is a directory holding the `(n_rows, dim)` float32 embeddings in `vectors.npy`, in
+    input order, the ids of the rows in `ids.jsonl`, and the row ranges already embedded in
+    `progress.json`. `embed` streams the outputs of `Embed` to disk as they arrive, so the corpus
+    never has to fit in memory, and skips the rows already done when run again after a crash.
+
+    Readers only need `EmbeddingStore(path).vectors`, a read-only memory map: opening the store is
+    zero-copy, and works while the job is still running, rows outside of `done` being zeros.
+
+    Parameters
+    ----------
+    path: str,
+        directory of the store, created by `embed` if it doesn't exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._vectors = None
+
+    @property
+    def meta(self) -> dict:
+        """Number of rows, dimension and model of the store, empty before the first rows are written."""
+        return self._read_json("meta.json", {})
+
+    @property
+    def n_rows(self) -> Optional[int]:
+        return self.meta.get("n_rows")
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.meta.get("model")
+
+    @property
+    def done(self) -> List[List[int]]:
+        """`[start, stop)` row ranges embedded as of the last checkpoint."""
+        return self._read_json("progress.json", {"done": []})["done"]
+
+    @property
+    def complete(self) -> bool:
+        return self.n_rows is not None and self.done == ([[0, self.n_rows]] if self.n_rows else [])
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only `(n_rows, dim)` memory map of the embeddings."""
+        if self._vectors is None:
+            self._vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        return self._vectors
+
+    @property
+    def ids(self) -> List[Hashable]:
+        """Ids of the rows, if `embed` was given some."""
+        if not os.path.exists(self._file("ids.jsonl")):
+            return []
+        with open(self._file("ids.jsonl"), encoding="utf-8") as f:
+            # a line may still be being written
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def embed(
+        self,
+        embedder,
+        texts: Iterable[str],
+        ids: Optional[Iterable[Hashable]] = None,
+        n_rows: Optional[int] = None,
+        skill: Optional[str] = None,
+        batch_size: int = 32,
+        workers: int = 4,
+        checkpoint_every: int = 100,
+    ) -> dict:
+        """Embeds `texts` into the store, resuming from the last checkpoint if there is one.
+
+        Parameters
+        ----------
+        embedder: Embed,
+            endpoint used to embed the texts.
+        texts: Iterable[str],
+            texts of the corpus, read lazily. Must be the same, in the same order, when resuming.
+        ids: Optional[Iterable[Hashable]], default None,
+            JSON-serialisable id of each text, written to the id sidecar file. There must be as many
+            ids as texts.
+        n_rows: Optional[int], default None,
+            number of texts, needed to allocate the matrix when `texts` has no length.
+        skill: Optional[str], default None,
+            skill used to embed the texts.
+        batch_size: int, default 32,
+            number of texts sent per request.
+        workers: int, default 4,
+            number of requests in flight at the same time.
+        checkpoint_every: int, default 100,
+            number of completed requests between two checkpoints. At most as many requests are
+            sent again after a crash.
+
+        Return
+        ------
+        cost: dict,
+            cost of the requests sent by this run, summed per model.
+        """
+        if n_rows is None:
+            n_rows = len(texts)
+        meta = self._check_inputs(embedder, ids, n_rows)
+        os.makedirs(self.path, exist_ok=True)
+        done = self.done
+        writer = np.load(self._file("vectors.npy"), mmap_mode="r+") if meta else None
+        # ids are written in input order as texts are read, only the ones not written yet are appended
+        ids_file, n_ids = None, 0
+        if ids is not None:
+            n_ids = self._truncate_ids()
+            ids_file = open(self._file("ids.jsonl"), "a", encoding="utf-8")
+
+        def call(chunk: list) -> Tuple[list, dict, str]:
+            start, chunk_texts = chunk[0]
+            embeddings, cost, request_id = embedder(chunk_texts, skill=skill, as_array=True)
+            return [(start, embeddings.vectors)], cost, request_id
+
+        chunks = self._pending_chunks(texts, ids, ids_file, n_ids, n_rows, batch_size, done)
+        results = MapIterator(call, chunks, batch_size=1, workers=workers, ordered=False)
+        completed = []
+        try:
+            for _, (start, vectors) in results:
+                if writer is None:
+                    writer = self._allocate(n_rows, vectors.shape[1], embedder.model)
+                writer[start:start + len(vectors)] = vectors
+                completed.append([start, start + len(vectors)])
+                if len(completed) >= checkpoint_every:
+                    done = self._checkpoint(writer, ids_file, done + completed)
+                    completed = []
+        finally:
+            results.close()
+            if completed:
+                self._checkpoint(writer, ids_file, done + completed)
+            if ids_file is not None:
+                ids_file.close()
+        if n_rows == 0 and not meta:
+            self._allocate(0, 0, embedder.model)
+        return results.cost
+
+    def _check_inputs(self, embedder, ids: Optional[Iterable[Hashable]], n_rows: int) -> dict:
+        if ids is not None and hasattr(ids, "__len__") and len(ids) != n_rows:
+            raise ValueError(f"Got {len(ids)} ids for {n_rows} texts.")
+        meta = self.meta
+        if meta and (meta["n_rows"], meta["model"]) != (n_rows, embedder.model):
+            raise ValueError(
+                f"Store of {meta['n_rows']} rows embedded with `{meta['model']}`, "
+                f"got {n_rows} rows to embed with `{embedder.model}`."
+            )
+        return meta
+
+    @staticmethod
+    def _pending_chunks(
+        texts: Iterable[str],
+        ids: Optional[Iterable[Hashable]],
+        ids_file,
+        n_ids: int,
+        n_rows: int,
+        batch_size: int,
+        done: List[List[int]],
+    ) -> Iterator[Tuple[int, List[str]]]:
+        items = _zip_ids(texts, ids) if ids is not None else ((text, None) for text in texts)
+        for i, chunk in enumerate(chunked(items, batch_size)):
+            start, stop = i * batch_size, i * batch_size + len(chunk)
+            if stop > n_rows:
+                raise ValueError(f"Got more than `n_rows={n_rows}` texts.")
+            if ids_file is not None and stop > n_ids:
+                ids_file.writelines(json.dumps(id_) + "\n" for _, id_ in chunk[max(0, n_ids - start):])
+            if not any(done_start <= start and stop <= done_stop for done_start, done_stop in done):
+                yield start, [text for text, _ in chunk]
+
+    def _truncate_ids(self) -> int:
+        # drop a line left incomplete by a crash, and count the complete ones
+        path = self._file("ids.jsonl")
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb+") as f:
+            content = f.read()
+            f.truncate(content.rfind(b"\n") + 1)
+        return content.count(b"\n")
+
+    def _allocate(self, n_rows: int, dim: int, model: str) -> np.ndarray:
+        writer = np.lib.format.open_memmap(self._file("vectors.npy"), mode="w+", dtype=np.float32, shape=(n_rows, dim))
+        self._write_json("meta.json", {"n_rows": n_rows, "dim": dim, "model": model})
+        return writer
+
+    def _checkpoint(self, writer: np.ndarray, ids_file, done: List[List[int]]) -> List[List[int]]:
+        # rows must be on disk before they are recorded as done
+        writer.flush()
+        if ids_file is not None:
+            ids_file.flush()
+        done = merge_ranges(done)
+        self._write_json("progress.json", {"done": done})
+        return done
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_json(self, name: str, default: dict) -> dict:
+        try:
+            with open(self._file(name), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def _write_json(self, name: str, content: dict):
+        # atomic replacement, a crash never leaves a partially written file
+        tmp = self._file(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        os.replace(tmp, self._file(name))
@@ -37,7 +37,9 @@ try:
         use_scm_version=True,
         setup_requires=["setuptools_scm"],
         install_requires=["requests>=2.26.0", "numpy>=1.21.6"],
+        extras_require={"async": ["aiohttp>=3.8.0"], "fast": ["orjson>=3.6.0"]},
         packages=find_packages(exclude=["examples", "tests"]),
+        entry_points={"console_scripts": ["lightonmuse=lightonmuse.cli:main"]},
         keywords=["NLP", "API", "AI"],
         classifiers=classifiers
     )
@@ -50,5 +52,6 @@ except LookupError:
         author_email=author_email,
         version="test",
         packages=find_packages("lightonmuse", exclude=["examples", "tests"]),
+        entry_points={"console_scripts": ["lightonmuse=lightonmuse.cli:main"]},
         classifiers=classifiers
     )
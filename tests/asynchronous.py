@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestAsyncEndpoints(unittest.TestCase):
+    def test_concurrent_calls(self):
+        sentences = [
+            "Je voudrais un café et deux croissants, s'il vous plait.",
+            "Bonjour Madame, vous allez bien ?",
+            "quelque chose dans cette liste",
+        ]
+
+        async def embed_all():
+            representer = lightonmuse.AsyncEmbed("orion-fr", max_in_flight=2)
+            results = await asyncio.gather(*[representer(sentence) for sentence in sentences])
+            await lightonmuse.close_async_sessions()
+            return results
+
+        results = asyncio.run(embed_all())
+        assert len(results) == len(sentences), f"Got {len(results)} results for {len(sentences)} calls."
+        for sentence, (outputs, cost, rid) in zip(sentences, results):
+            assert isinstance(outputs, list), "`outputs` is not list as expected"
+            assert outputs[0]["text"] == sentence, "Results are not returned in the order of the calls."
+            assert cost["orion-fr@default"]["batch_size"] == 1
+            assert isinstance(rid, str), f"Detected type {type(rid)} for `rid`, expected `str` instead."
+
+    def test_calibrated_select(self):
+        reference = 'Voici une critique : "Un film fait par des parisiens pour des parisiens."\n'
+        candidates = ["négative", "positive"]
+        conjunction = "Cette critique est"
+
+        async def classify():
+            selector = lightonmuse.AsyncCalibratedSelect("orion-fr")
+            await selector.fit(
+                content_free_inputs='Voici une critique : "" \n',
+                candidates=candidates,
+                conjunction=conjunction,
+            )
+            outputs = await selector(reference, candidates, conjunction=conjunction)
+            await lightonmuse.close_async_sessions()
+            return outputs
+
+        outputs, cost, rid = asyncio.run(classify())
+        assert "calibrated" in outputs[0], "Calibrated results are missing from the outputs."
+        assert outputs[0]["best"] in candidates
+
+    def test_compare_matrix(self):
+        references = ["Bonjour", "Bonsoir"]
+        candidates = ["Salut", "Bonne nuit", "Bonjour"]
+
+        async def compare():
+            comparer = lightonmuse.AsyncCompare("orion-fr")
+            results = await asyncio.gather(
+                comparer.matrix(references, candidates), comparer.matrix(references, candidates, top_k=2)
+            )
+            await lightonmuse.close_async_sessions()
+            return results
+
+        with FakeMuseServer(dim=16):
+            (similarities, cost, _), (top, _, _) = asyncio.run(compare())
+            expected, expected_cost, _ = lightonmuse.Compare("orion-fr").matrix(references, candidates)
+            expected_top, _, _ = lightonmuse.Compare("orion-fr").matrix(references, candidates, top_k=2)
+        assert np.allclose(similarities, expected) and cost == expected_cost
+        assert top == expected_top
+
+    def test_cancelled(self):
+        events = []
+
+        async def cancel():
+            tokenizer = lightonmuse.AsyncTokenize("orion-fr", hooks=[events.append])
+            task = asyncio.ensure_future(tokenizer("Bonjour"))
+            while not server.requests:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await lightonmuse.close_async_sessions()
+            return tokenizer.retry_stats
+
+        with FakeMuseServer(dim=16) as server:
+            server.stall(5.0)
+            stats = asyncio.run(cancel())
+        assert (stats.requests, stats.failures) == (1, 1), stats
+        (event,) = events
+        assert event.error.startswith("CancelledError"), event.error
+
+
+if __name__ == "__main__":
+    unittest.main()
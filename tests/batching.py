@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=8).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def batch_sizes(self, endpoint: str = "embed") -> list:
+        return sorted(len(payload["text"]) for name, payload in self.server.requests if name == endpoint)
+
+    def test_concurrent_calls(self):
+        sentences = [
+            "Je voudrais un café et deux croissants, s'il vous plait.",
+            "Bonjour Madame, vous allez bien ?",
+            "quelque chose dans cette liste",
+        ]
+        # batches are only sent once full, whatever the timing of the threads
+        batcher = lightonmuse.MicroBatcher(
+            lightonmuse.Embed("orion-fr"), max_batch_size=len(sentences), max_wait=30.0
+        )
+        with ThreadPoolExecutor(len(sentences)) as pool:
+            results = list(pool.map(batcher, sentences))
+        for sentence, (outputs, cost, rid) in zip(sentences, results):
+            assert len(outputs) == 1, f"`len(outputs) = {len(outputs)}` despite single input."
+            assert outputs[0]["text"] == sentence, "Caller received the output of another call."
+            assert cost["orion-fr@default"]["batch_size"] == len(sentences), (
+                f"`batch_size={cost['orion-fr@default']['batch_size']}` while "
+                f"{len(sentences)} calls should have been batched together."
+            )
+        assert len({rid for _, _, rid in results}) == 1, "Calls were not sent as a single request."
+        assert self.batch_sizes() == [len(sentences)], self.batch_sizes()
+
+    def test_max_batch_size(self):
+        batcher = lightonmuse.MicroBatcher(lightonmuse.Embed("orion-fr"), max_batch_size=3, max_wait=30.0)
+        texts = [f"phrase {i}" for i in range(6)]
+        with ThreadPoolExecutor(len(texts)) as pool:
+            results = list(pool.map(batcher, texts))
+        assert [outputs[0]["text"] for outputs, _, _ in results] == texts
+        assert self.batch_sizes() == [3, 3], self.batch_sizes()
+
+    def test_max_wait(self):
+        batcher = lightonmuse.MicroBatcher(lightonmuse.Embed("orion-fr"), max_batch_size=32, max_wait=0.01)
+        outputs, cost, _ = batcher("Bonjour")
+        assert outputs[0]["text"] == "Bonjour" and cost["orion-fr@default"]["batch_size"] == 1
+        assert self.batch_sizes() == [1], "A lone call was not sent after `max_wait`."
+
+    def test_parameters(self):
+        batcher = lightonmuse.MicroBatcher(lightonmuse.Create("orion-fr"), max_batch_size=2, max_wait=30.0)
+        calls = [("Bonjour", 5), ("Bonsoir", 10), ("Salut", 5), ("Au revoir", 10)]
+        with ThreadPoolExecutor(len(calls)) as pool:
+            results = list(pool.map(lambda call: batcher(call[0], n_tokens=call[1], mode="greedy"), calls))
+        assert [outputs[0]["input_text"] for outputs, _, _ in results] == [text for text, _ in calls]
+        # calls are only batched with the calls of identical parameters
+        n_tokens = {frozenset(payload["text"]): payload["params"]["n_tokens"] for _, payload in self.server.requests}
+        assert n_tokens == {frozenset(["Bonjour", "Salut"]): 5, frozenset(["Bonsoir", "Au revoir"]): 10}, n_tokens
+
+
+if __name__ == "__main__":
+    unittest.main()
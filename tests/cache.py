@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from lightonmuse import EmbeddingCache
+from lightonmuse.cache import cache_key, merge_cached
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "embeddings.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keys(self):
+        assert cache_key("orion-fr", None, "café") == cache_key("orion-fr", None, "café"), (
+            "Keys should not depend on the unicode normalisation of the text."
+        )
+        assert cache_key("orion-fr", None, "café") != cache_key("lyra-fr", None, "café")
+        assert cache_key("orion-fr", None, "café") != cache_key("orion-fr", "summarisation", "café")
+
+    def test_get_put(self):
+        cache = EmbeddingCache(self.path)
+        vectors = {"a": np.arange(4, dtype=np.float32), "b": np.ones(4, dtype=np.float32)}
+        cache.put(vectors)
+        found = cache.get(["a", "c", "b"])
+        assert set(found) == {"a", "b"}, f"Found keys {set(found)} instead of the stored ones."
+        assert np.array_equal(found["a"], vectors["a"])
+        assert cache.stats["hits"] == 2 and cache.stats["misses"] == 1, f"Wrong counters {cache.stats}."
+
+        # the cache is shared with other processes through the database file
+        other = EmbeddingCache(self.path)
+        assert set(other.get(["a", "b"])) == {"a", "b"}, "Entries are not visible from another connection."
+
+    def test_lru_eviction(self):
+        vector_bytes = 4 * 4
+        cache = EmbeddingCache(self.path, max_bytes=3 * vector_bytes, touch_interval=0)
+        cache.put({"a": np.zeros(4), "b": np.zeros(4), "c": np.zeros(4)})
+        cache.get(["a"])  # "b" becomes the least recently used entry
+        cache.put({"d": np.zeros(4)})
+        assert cache.stats["bytes"] <= 3 * vector_bytes, "The cache grew beyond `max_bytes`."
+        found = cache.get(["a", "b", "d"])
+        assert "b" not in found, "The least recently used entry was not evicted."
+        assert "a" in found and "d" in found, "Recently used entries were evicted."
+
+    def test_running_totals(self):
+        cache = EmbeddingCache(self.path, max_bytes=10 * 4 * 4)
+        cache.put({key: np.zeros(4) for key in "abcdefgh"})
+        cache.put({"a": np.zeros(8), "b": np.zeros(2)})  # replaced entries change the total size
+        cache.put({key: np.zeros(4) for key in "ijk"})  # evicts
+        connection = sqlite3.connect(self.path)
+        entries, size = connection.execute("SELECT COUNT(*), SUM(size) FROM embeddings").fetchone()
+        assert (cache.stats["entries"], cache.stats["bytes"]) == (entries, size), cache.stats
+        assert size <= cache.max_bytes
+        cache.clear()
+        assert (cache.stats["entries"], cache.stats["bytes"]) == (0, 0), cache.stats
+
+        # the totals of a cache created without them are initialised from its entries
+        connection.execute("INSERT INTO embeddings VALUES ('a', zeroblob(16), 16, 0.)")
+        connection.execute("DROP TABLE cache_metadata")
+        connection.commit()
+        connection.close()
+        assert EmbeddingCache(self.path).stats["bytes"] == 16
+
+    def test_without_upserts(self):
+        with mock.patch.object(sqlite3, "sqlite_version_info", (3, 22, 0)):
+            cache = EmbeddingCache(self.path)
+            cache.put({"a": np.zeros(4), "b": np.zeros(4)})
+            cache.put({"a": np.ones(8)})
+        assert np.array_equal(cache.get(["a"])["a"], np.ones(8))
+        assert (cache.stats["entries"], cache.stats["bytes"]) == (2, 8 * 4 + 4 * 4), cache.stats
+
+    def test_recency_updates(self):
+        cache = EmbeddingCache(self.path, touch_interval=60)
+        cache.put({"a": np.zeros(4)})
+        connection = cache._connect()
+        changes = connection.total_changes
+        cache.get(["a", "a"])
+        assert connection.total_changes == changes, "Recently accessed entries were written on a hit."
+        connection.execute("UPDATE embeddings SET last_access = 0")
+        cache.get(["a"])
+        (last_access,) = connection.execute("SELECT last_access FROM embeddings").fetchone()
+        assert last_access > 0, "The last access time of a stale entry was not refreshed."
+
+    def test_merge_cached(self):
+        texts = ["a", "b", "a", "c"]
+        cached = {"b": np.ones(2, dtype=np.float32)}
+        fetched = [
+            {"text": "a", "embedding": [0.0, 1.0], "execution_metadata": {}},
+            {"text": "c", "embedding": [2.0, 3.0], "execution_metadata": {}},
+        ]
+        outputs = merge_cached(texts, texts, cached, fetched)
+        assert [output["text"] for output in outputs] == texts, "Outputs are not in input order."
+        assert outputs[1]["embedding"] == [1.0, 1.0] and outputs[1]["execution_metadata"] == {"cached": True}
+        assert outputs[2]["embedding"] == [0.0, 1.0], "Duplicated texts don't get the fetched embedding."
+
+        vectors, metadata = merge_cached(texts, texts, cached, fetched, as_array=True)
+        assert vectors.shape == (4, 2) and vectors.dtype == np.float32
+        assert np.array_equal(vectors[3], [2.0, 3.0]) and metadata[3]["text"] == "c"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
 import unittest
 import math
+import os
+import tempfile
 
 import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
 
 
 class TestCalibratedSelect(unittest.TestCase):
@@ -144,6 +147,55 @@ class TestCalibratedSelect(unittest.TestCase):
             exception
         ), f"Exception for CalibratedSelect did not raise message about wrong `calibration_mode`."
 
+    def test_calibrated_select_batch(self):
+        references = [
+            'Voici une critique : "Un film fait par des parisiens pour des parisiens. Pour un tout sans saveur."\n',
+            'Voici une critique : "Un chef-d\'oeuvre, je le reverrai avec plaisir."\n',
+            'Voici une critique : "Ni bon ni mauvais."\n',
+        ]
+        candidates = ["négative", "positive", "neutre"]
+        conjunction = "Cette critique est"
+        with FakeMuseServer() as server:
+            selector = lightonmuse.CalibratedSelect("orion-fr")
+            selector.fit('Voici une critique : "" \n', candidates=candidates, conjunction=conjunction)
+            server.requests.clear()
+            outputs, cost, rid = selector(references, candidates, conjunction=conjunction)
+            assert len(server.requests) == 1, "The references were not scored in a single request."
+            singles = [selector(reference, candidates, conjunction=conjunction)[0] for reference in references]
+        assert len(outputs) == len(references), f"Got {len(outputs)} outputs for {len(references)} references."
+        assert isinstance(rid, str), f"Detected type {type(rid)} for `rid`, expected `str` instead."
+        for reference, output, single in zip(references, outputs, singles):
+            assert output[0]["reference"] == reference, "Batched outputs are not in the order of the references."
+            assert output == single, "Batched calibrated outputs differ from the ones of single references."
+
+    def test_save_load(self):
+        reference = 'Voici une critique : "Un chef-d\'oeuvre, je le reverrai avec plaisir."\n'
+        candidates = ["négative", "positive"]
+        conjunction = "Cette critique est"
+        with FakeMuseServer(), tempfile.TemporaryDirectory() as directory:
+            selector = lightonmuse.CalibratedSelect("orion-fr")
+            selector.fit('Voici une critique : "" \n', candidates=candidates, conjunction=conjunction)
+            path = os.path.join(directory, "calibration.json")
+            selector.save(path)
+            with self.assertRaises(ValueError):
+                lightonmuse.CalibratedSelect.load(path, model="orion-fr-v2")
+            loaded = lightonmuse.CalibratedSelect.load(path, model="orion-fr")
+            outputs, _, _ = selector(reference, candidates, conjunction=conjunction)
+            outputs_loaded, _, _ = loaded(reference, candidates, conjunction=conjunction)
+        assert outputs_loaded == outputs, "Loaded calibration gives a different answer than the fitted one."
+        assert (
+            outputs_loaded[0]["calibrated"]["calibration_cost"] == selector.calib_cost
+        ), "Calibration cost was not restored."
+
+    def test_empty_references(self):
+        with FakeMuseServer():
+            selector = lightonmuse.CalibratedSelect("orion-fr")
+            selector.fit('Voici une critique : "" \n', candidates=["négative", "positive"])
+            assert selector([], ["négative", "positive"]) == ([], {}, None), "An empty list of references was sent."
+            with self.assertRaises(lightonmuse.MuseAPIError) as cm:
+                selector("", ["négative", "positive"])
+            assert "empty" in cm.exception.message, "An empty reference was not sent to the API."
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import warnings
+
+from lightonmuse import cli
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestCLI(unittest.TestCase):
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.jsonl")
+            with open(path, "w") as f:
+                f.write('{"outputs": 1}\n{"outputs": 2}\n{"outp')
+            assert cli._resume(path) == 2, "Complete lines of the output were not counted."
+            with open(path) as f:
+                assert f.read() == '{"outputs": 1}\n{"outputs": 2}\n', "The incomplete line was not dropped."
+            assert cli._resume(os.path.join(directory, "missing.jsonl")) == 0
+
+    def test_errors_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_path, output_path = os.path.join(directory, "in.jsonl"), os.path.join(directory, "out.jsonl")
+            with open(input_path, "w") as f:
+                f.write('{"endpoint": "unknown", "text": "a"}\nnot json\n')
+            summary = cli.run(input_path, output_path, out=io.StringIO())
+            with open(output_path) as f:
+                records = [json.loads(line) for line in f]
+        assert summary["lines"] == summary["errors"] == 2, summary
+        assert "endpoint: unknown is not valid" in records[0]["error"] and "JSONDecodeError" in records[1]["error"]
+
+    def test_failing_lines_dont_stop_the_run(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        lines = [
+            # `reference` and `candidates` of different lengths fail Select validation with an AssertionError
+            {"endpoint": "select", "reference": ["a", "b"], "candidates": [["x", "y"]]},
+            # an `Embeddings` tuple can't be serialised to JSON
+            {"endpoint": "embed", "text": ["Bonjour"], "as_array": True},
+            {"endpoint": "embed", "text": "Bonjour"},
+        ]
+        with tempfile.TemporaryDirectory() as directory, FakeMuseServer(dim=8):
+            input_path, output_path = os.path.join(directory, "in.jsonl"), os.path.join(directory, "out.jsonl")
+            with open(input_path, "w") as f:
+                f.write("".join(json.dumps(line) + "\n" for line in lines))
+            summary = cli.run(input_path, output_path, out=io.StringIO())
+            with open(output_path) as f:
+                records = [json.loads(line) for line in f]
+        assert (summary["lines"], summary["errors"]) == (3, 2), summary
+        assert records[0]["error"].startswith("AssertionError") and records[1]["error"].startswith("TypeError")
+        assert records[2]["outputs"][0]["text"] == "Bonjour", "The run stopped at the failing lines."
+
+
+if __name__ == "__main__":
+    unittest.main()
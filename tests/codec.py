@@ -0,0 +1,51 @@
+import gzip
+import os
+import unittest
+from unittest import mock
+
+from lightonmuse import codec
+from lightonmuse.codec import JSONCodec
+
+
+class TestJSONCodec(unittest.TestCase):
+    def test_round_trip(self):
+        payload = {"text": ["Je suis content", "Voilà un café"], "params": {"n_tokens": 20, "seed": None}}
+        json_codec = JSONCodec()
+        assert json_codec.loads(json_codec.dumps(payload)) == payload, "Payload changed after a round trip."
+
+        # the standard library fallback gives the same result
+        fast_json, codec.orjson = codec.orjson, None
+        try:
+            assert json_codec.loads(json_codec.dumps(payload)) == payload
+        finally:
+            codec.orjson = fast_json
+
+    def test_compression(self):
+        small, large = b'{"text": "court"}', b'{"text": "' + b"long " * 10000 + b'"}'
+        json_codec = JSONCodec(compress=True, compress_threshold=1024)
+        body, headers = json_codec.encode(small)
+        assert body == small and headers == {}, "Small bodies should be sent as is."
+        body, headers = json_codec.encode(large)
+        assert headers == {"Content-Encoding": "gzip"}, "Large bodies should be gzipped."
+        assert len(body) < len(large) and gzip.decompress(body) == large
+        assert json_codec.headers["Accept-Encoding"] != "identity", "Compressed responses are not negotiated."
+
+        json_codec = JSONCodec(compress=False)
+        body, headers = json_codec.encode(large)
+        assert body == large and headers == {}, "Bodies were compressed despite `compress=False`."
+        assert json_codec.headers["Accept-Encoding"] != "identity", "Compressed responses are not negotiated."
+        assert JSONCodec(accept_compressed=False).headers["Accept-Encoding"] == "identity"
+
+    def test_request_compression_opt_in(self):
+        large = b'{"text": "' + b"long " * 10000 + b'"}'
+        with mock.patch.dict(os.environ):
+            os.environ.pop("MUSE_COMPRESSION", None)
+            json_codec = JSONCodec()
+            assert json_codec.encode(large) == (large, {}), "Request bodies are compressed by default."
+            assert json_codec.headers["Accept-Encoding"] != "identity"
+            os.environ["MUSE_COMPRESSION"] = "1"
+            assert JSONCodec().encode(large)[1] == {"Content-Encoding": "gzip"}
+
+
+if __name__ == "__main__":
+    unittest.main()
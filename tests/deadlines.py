@@ -0,0 +1,94 @@
+import asyncio
+import time
+import unittest
+import warnings
+
+import requests
+
+import lightonmuse
+from lightonmuse import DeadlineExceeded, RetryPolicy, call_options
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestDeadlines(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=16).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_timeout(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr", timeout=0.2, retry=RetryPolicy(max_retries=0))
+        self.server.stall(2.0)
+        start = time.perf_counter()
+        with self.assertRaises(requests.Timeout):
+            tokenizer("Bonjour")
+        assert time.perf_counter() - start < 1.0
+        # the timeout of the block overrides the one of the endpoint object
+        self.server.stall(0.3)
+        with call_options(timeout=(1.0, 1.0)):
+            tokenizer("Bonjour")
+
+    def test_deadline_bounds_retries(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr", timeout=0.2, deadline=0.5, retry=RetryPolicy(backoff_factor=0.01))
+        self.server.stall(2.0, 2.0, 2.0, 2.0)
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            tokenizer("Bonjour")
+        assert time.perf_counter() - start < 1.0
+        assert tokenizer.retry_stats.failures == 1 and tokenizer.retry_stats.attempts >= 2
+
+    def test_call_options(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        with call_options(deadline=10.0) as outer:
+            with call_options(deadline=60.0) as inner:
+                assert inner.deadline == outer.deadline
+        self.server.stall(*[2.0] * 4)
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            # the deadline follows the calls into the threads of `map`
+            with call_options(deadline=0.5):
+                tokenizer.map(["Bonjour"] * 4, batch_size=1, workers=4)
+        assert time.perf_counter() - start < 1.0
+
+    def test_no_retry_past_deadline(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        self.server.retry_after = 5.0
+        self.server.fail(429)
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded) as cm:
+            with call_options(deadline=2.0):
+                tokenizer("Bonjour")
+        assert time.perf_counter() - start < 0.5, "The call waited for a retry it had no time for."
+        assert cm.exception.__cause__.status_code == 429
+
+    def test_map_cancellation(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        self.server.retry_after = 5.0
+        self.server.fail(429)
+        results = tokenizer.imap(["Bonjour", "Bonsoir"], batch_size=1, workers=2, ordered=False)
+        next(results)
+        start = time.perf_counter()
+        results.close()
+        while tokenizer.retry_stats.requests < 2 and time.perf_counter() - start < 1.0:
+            time.sleep(0.01)
+        # the throttled request stopped waiting to be retried
+        assert tokenizer.retry_stats.failures == 1, tokenizer.retry_stats
+        assert len(self.server.requests) == 2
+
+    def test_async_cancellation(self):
+        pool = lightonmuse.EndpointPool([self.server.url])
+        tokenizer = lightonmuse.AsyncTokenize("orion-fr", pool=pool)
+
+        async def run():
+            self.server.stall(2.0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(tokenizer("Bonjour"), 0.2)
+            await lightonmuse.close_async_sessions()
+
+        asyncio.run(run())
+        (replica,) = pool.status()
+        assert (replica["state"], replica["outstanding"], replica["failures"]) == ("closed", 0, 0), replica
+
+
+if __name__ == "__main__":
+    unittest.main()
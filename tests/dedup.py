@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from lightonmuse.dedup import DedupStats, deduplicate, fan_out
+from lightonmuse.embeddings import Embeddings
+
+
+class TestDedup(unittest.TestCase):
+    def test_round_trip(self):
+        texts = ["a", "b", "a", "c", "b", "a"]
+        unique, inverse = deduplicate(texts)
+        assert unique == ["a", "b", "c"], f"Unique items not in order of first occurrence: {unique}."
+        outputs = fan_out([{"text": text} for text in unique], inverse)
+        assert [output["text"] for output in outputs] == texts, "Outputs are not back in input order."
+        outputs[0]["text"] = "changed"
+        assert outputs[2]["text"] == "a", "Repeated inputs share the same output object."
+
+    def test_pairs(self):
+        pairs = [("q", ["y", "n"]), ("q", ["y"]), ("q", ["y", "n"])]
+        unique, inverse = deduplicate(pairs, key=lambda x: (x[0], tuple(x[1])))
+        assert len(unique) == 2 and inverse == [0, 1, 0]
+
+    def test_embeddings(self):
+        unique, inverse = deduplicate(["a", "b", "a"])
+        embeddings = Embeddings(np.eye(2, dtype=np.float32), [{"text": "a"}, {"text": "b"}])
+        outputs = fan_out(embeddings, inverse)
+        assert outputs.vectors.shape == (3, 2) and np.array_equal(outputs.vectors[2], embeddings.vectors[0])
+        assert [meta["text"] for meta in outputs.metadata] == ["a", "b", "a"]
+
+    def test_stats(self):
+        stats = DedupStats()
+        stats.record(10, 4)
+        stats.record(3, 3)
+        assert (stats.items, stats.sent, stats.saved) == (13, 7, 6), stats
+
+
+if __name__ == "__main__":
+    unittest.main()
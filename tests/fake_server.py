@@ -0,0 +1,144 @@
+import importlib.util
+import io
+import json
+import os
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+
+# test modules of the endpoints, written against the API
+ENDPOINT_SUITES = [
+    "asynchronous",
+    "batching",
+    "calibration",
+    "create",
+    "fail",
+    "parallel",
+    "preflight",
+    "tokenizer",
+    "understand",
+]
+# tests checking the answers of the model itself, that synthetic responses can't give
+MODEL_DEPENDENT = [
+    "calibration.TestCalibratedSelect.test_calibrated_select",
+    "create.TestCreateEndpoint.test_control",
+    "understand.TestUnderstandEndpoints.test_analyse",
+    "understand.TestUnderstandEndpoints.test_compare",
+    "understand.TestUnderstandEndpoints.test_select",
+]
+
+
+def load_suite(name: str) -> unittest.TestSuite:
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(__file__), f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+
+def iter_tests(suite: unittest.TestSuite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+class TestFakeMuseServer(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=32).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_base_url(self):
+        assert os.environ["MUSE_BASE_URL"] == self.server.url
+        lightonmuse.Tokenize("orion-fr")("Bonjour")
+        assert self.server.requests == [("tokenize", {"text": "Bonjour"})], self.server.requests
+
+    def test_schemas(self):
+        outputs, cost, rid = lightonmuse.Create("orion-fr")(["Il était une fois", "Bonjour"], n_tokens=5, seed=0)
+        assert [output.keys() for output in outputs] == [{"input_text", "completions"}] * 2
+        assert cost["orion-fr@default"]["total_tokens_generated"] == 10 and isinstance(rid, str)
+
+        outputs, cost, _ = lightonmuse.Analyse("orion-fr")("Je suis content")
+        assert outputs[0].keys() == {"text", "score", "execution_metadata"} and cost["orion-fr@default"]["batch_size"] == 1
+
+        outputs, _, _ = lightonmuse.Embed("orion-fr")(["a", "b"])
+        assert outputs[0].keys() == {"text", "embedding", "execution_metadata"} and len(outputs[0]["embedding"]) == 32
+
+        outputs, cost, _ = lightonmuse.Select("orion-fr")("Cette critique est", ["positive", "négative"])
+        assert outputs[0].keys() == {"reference", "rankings", "best", "execution_metadata"}
+        assert cost["orion-fr@default"]["batch_size"] == 2
+
+        outputs, cost, _ = lightonmuse.Compare("orion-fr")("a", ["b", "a"])
+        assert outputs[0]["best"] == "a" and cost["orion-fr@default"]["batch_size"] == 3
+
+        outputs, _, _ = lightonmuse.Tokenize("orion-fr")("Bonjour, le monde")
+        assert list(outputs[0]["execution_metadata"]["cost"]) == [
+            "tokens_used",
+            "tokens_input",
+            "tokens_generated",
+            "cost_type",
+            "batch_size",
+        ]
+
+    def test_create_params(self):
+        creator = lightonmuse.Create("orion-fr")
+        outputs, cost, _ = creator("Bonjour", n_tokens=8, n_completions=3, n_best=2, seed=0)
+        completions = outputs[0]["completions"]
+        assert len(completions) == 2 and cost["orion-fr@default"]["total_tokens_generated"] == 8 * 3
+        assert completions[0]["score"]["logprob"] >= completions[1]["score"]["logprob"]
+        assert completions[0]["score"]["token_logprobs"] is None
+        outputs, _, _ = creator("Bonjour", n_tokens=8, seed=0, return_logprobs=True)
+        assert len(outputs[0]["completions"][0]["score"]["token_logprobs"]) == 8
+
+    def test_cost_type(self):
+        _, cost, _ = lightonmuse.Embed("lyra-en")("Hello")
+        assert list(cost) == ["lyra-en@default"], cost
+        outputs, _, _ = lightonmuse.Tokenize("lyra-en")("Hello")
+        assert outputs[0]["execution_metadata"]["cost"]["cost_type"] == "lyra-en@default"
+
+    def test_endpoint_suites(self):
+        # the tests written against the API pass against the fake server, but for the answers of the model
+        suite = unittest.TestSuite(
+            test for name in ENDPOINT_SUITES for test in iter_tests(load_suite(name))
+            if test.id() not in MODEL_DEPENDENT
+        )
+        assert suite.countTestCases() > 20
+        with FakeMuseServer():
+            result = unittest.TextTestRunner(stream=io.StringIO()).run(suite)
+        failures = [(test.id(), trace.splitlines()[-1]) for test, trace in result.failures + result.errors]
+        assert result.wasSuccessful(), failures
+
+    def test_deterministic(self):
+        embedder = lightonmuse.Embed("orion-fr")
+        assert embedder("Bonjour") == embedder("Bonjour"), "Responses are not deterministic."
+        creator = lightonmuse.Create("orion-fr")
+        assert creator("Bonjour", seed=1)[0] == creator("Bonjour", seed=1)[0]
+
+    def test_errors(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        self.server.fail(429, 503)
+        tokenizer("Bonjour")
+        assert (tokenizer.retry_stats.retries, tokenizer.retry_stats.throttled) == (2, 1), tokenizer.retry_stats
+        self.server.fail(400)
+        with self.assertRaises(lightonmuse.MuseAPIError) as cm:
+            tokenizer("Bonjour")
+        assert cm.exception.status_code == 400
+        with self.assertRaises(lightonmuse.MuseAPIError) as cm:
+            lightonmuse.Analyse("orion-fr")("")
+        assert "empty" in cm.exception.message
+
+    def test_malformed_payload(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        with self.assertRaises(lightonmuse.MuseAPIError) as cm:
+            tokenizer.request(tokenizer.codec.dumps({"params": {}}))
+        assert cm.exception.status_code == 400 and "KeyError" in json.loads(cm.exception.message)["error"]
+        assert tokenizer.retry_stats.attempts == 1, "A client error was retried as a connection error."
+        # the connection is kept alive
+        assert tokenizer("Bonjour")[0][0]["text"] == "Bonjour"
+
+
+if __name__ == "__main__":
+    unittest.main()
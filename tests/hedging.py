@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+from lightonmuse.hedging import Hedger, HedgeStats
+
+
+class TestHedging(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=16).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_hedge_wins(self):
+        embedder = lightonmuse.Embed("orion-fr", hedge=lightonmuse.HedgePolicy(delay=0.05, max_extra_load=1.0))
+        expected = embedder(["Bonjour"])
+        self.server.stall(2.0)
+        start = time.perf_counter()
+        outputs = embedder(["Bonjour"])
+        assert time.perf_counter() - start < 1.0, "The hedged request did not answer first."
+        assert outputs == expected
+        stats = embedder.hedge_stats
+        assert (stats.calls, stats.hedged, stats.won) == (2, 1, 1), stats
+        assert stats.extra_cost == expected[1]["orion-fr@default"]["total_tokens_used"]
+
+    def test_async_hedge_wins(self):
+        async def run():
+            embedder = lightonmuse.AsyncEmbed("orion-fr", hedge=lightonmuse.HedgePolicy(delay=0.05, max_extra_load=1.0))
+            self.server.stall(2.0)
+            start = time.perf_counter()
+            await embedder(["Bonjour"])
+            await lightonmuse.close_async_sessions()
+            return time.perf_counter() - start, embedder.hedge_stats
+
+        elapsed, stats = asyncio.run(run())
+        assert elapsed < 1.0 and (stats.hedged, stats.won) == (1, 1), (elapsed, stats)
+
+    def test_non_deterministic_calls_are_not_hedged(self):
+        creator = lightonmuse.Create("orion-fr", hedge=lightonmuse.HedgePolicy(delay=0.0, max_extra_load=1.0))
+        creator("Bonjour", n_tokens=5, mode="nucleus")
+        assert creator.hedge_stats.calls == 0 and len(self.server.requests) == 1
+
+    def test_caps(self):
+        hedger = Hedger(lightonmuse.HedgePolicy(delay=0.0, max_extra_load=0.5), HedgeStats())
+        for _ in range(10):
+            hedger.request(lambda: (time.sleep(0.01), {"costs": {}})[1])
+        assert hedger.stats.calls == 10 and hedger.stats.hedged <= 5, hedger.stats
+
+        hedger = Hedger(lightonmuse.HedgePolicy(delay=0.0, max_extra_load=1.0, max_extra_cost=15), HedgeStats())
+        for _ in range(10):
+            hedger.request(lambda: (time.sleep(0.01), {"costs": {"model": {"total_tokens_used": 10}}})[1])
+        assert hedger.stats.hedged == 2 and hedger.stats.extra_cost == 20, hedger.stats
+
+    def test_busy_executor(self):
+        # the primary requests don't wait for the threads sending the duplicates
+        hedger = Hedger(lightonmuse.HedgePolicy(delay=0.05, max_extra_load=1.0, max_workers=1), HedgeStats())
+        busy = threading.Event()
+        hedger._get_executor().submit(busy.wait)
+        self.addCleanup(busy.set)
+        start = time.perf_counter()
+        for _ in range(5):
+            assert hedger.request(lambda: {"costs": {}}) == {"costs": {}}
+        assert time.perf_counter() - start < 0.05 * 5, "Primary requests were queued."
+        assert hedger.stats.hedged == 0, hedger.stats
+
+    def test_observed_delay(self):
+        hedger = Hedger(lightonmuse.HedgePolicy(min_samples=10, percentile=50), HedgeStats())
+        assert hedger.delay() is None
+        for _ in range(10):
+            hedger.request(lambda: {})
+        assert hedger.stats.hedged == 0 and 0 <= hedger.delay() < 0.01
+
+    def test_errors(self):
+        hedger = Hedger(lightonmuse.HedgePolicy(delay=0.0, max_extra_load=1.0), HedgeStats())
+        calls = []
+
+        def send():
+            calls.append(None)
+            if len(calls) == 1:
+                time.sleep(0.05)
+                raise lightonmuse.MuseAPIError(503, "Unavailable")
+            return {"costs": {}}
+
+        assert hedger.request(send) == {"costs": {}}
+        with self.assertRaises(ValueError):
+            hedger.request(lambda: (time.sleep(0.01), int("not a number")))
+
+
+if __name__ == "__main__":
+    unittest.main()
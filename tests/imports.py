@@ -0,0 +1,34 @@
+import subprocess
+import sys
+import unittest
+
+import lightonmuse
+
+
+def loaded_modules(code: str) -> set:
+    """Modules loaded by running `code` in a fresh interpreter."""
+    script = f"import sys\n{code}\nprint(' '.join(sys.modules))"
+    return set(subprocess.check_output([sys.executable, "-c", script], text=True).split())
+
+
+class TestImports(unittest.TestCase):
+    def test_import_is_lazy(self):
+        modules = loaded_modules("import lightonmuse")
+        heavy = {"numpy", "requests", "urllib3", "aiohttp", "lightonmuse.api_requests"}
+        assert not heavy & modules, f"`import lightonmuse` imports {heavy & modules}"
+
+    def test_endpoints_without_numpy(self):
+        modules = loaded_modules("from lightonmuse import Create, Embed, MuseAPIError, Select, Tokenize")
+        assert "requests" in modules and "numpy" not in modules and "aiohttp" not in modules
+
+    def test_public_names(self):
+        for name in lightonmuse.__all__:
+            assert getattr(lightonmuse, name, None) is not None or name == "api_key", name
+        assert set(lightonmuse.__all__) <= set(dir(lightonmuse))
+        assert lightonmuse.Embed is lightonmuse.api_requests.Embed
+        with self.assertRaises(AttributeError):
+            lightonmuse.NotAnEndpoint
+
+
+if __name__ == "__main__":
+    unittest.main()
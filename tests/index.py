@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lightonmuse.index import EmbeddingIndex, cosine_topk, normalize
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(1000, 32)).astype(np.float32)
+        self.queries = rng.normal(size=(7, 32)).astype(np.float32)
+
+    def test_cosine_topk(self):
+        k = 5
+        similarities = normalize(self.queries) @ normalize(self.vectors).T
+        expected = np.argsort(-similarities, axis=1)[:, :k]
+        # blocks smaller than the matrix, and than k, must give the exact result
+        for block_size in [3, 64, 5000]:
+            scores, indices = cosine_topk(
+                normalize(self.queries), normalize(self.vectors), k, block_size=block_size, query_block_size=2
+            )
+            assert np.array_equal(indices, expected), f"Wrong top-k with `block_size={block_size}`."
+            assert np.allclose(scores, np.take_along_axis(similarities, expected, axis=1), atol=1e-6)
+
+    def test_add_remove(self):
+        index = EmbeddingIndex(block_size=100)
+        index.add(list(range(500)), self.vectors[:500])
+        index.add(list(range(500, 1000)), self.vectors[500:])
+        assert len(index) == 1000
+        (best_id, best_score), = index.search(self.vectors[42], k=1)[0]
+        assert best_id == 42 and np.isclose(best_score, 1.0), "A vector is not its own nearest neighbour."
+
+        index.remove([42])
+        assert 42 not in index and len(index) == 999
+        assert index.search(self.vectors[42], k=1)[0][0][0] != 42, "Removed vector is still returned."
+        assert index.search(self.vectors[43], k=1)[0][0][0] == 43, "Removal broke the other ids."
+
+        # adding an existing id replaces its embedding
+        index.add([43], self.vectors[:1])
+        assert len(index) == 999
+        assert index.search(self.vectors[0], k=2)[0][1][0] == 43
+
+    def test_embed_outputs(self):
+        outputs = [{"text": str(i), "embedding": vector.tolist()} for i, vector in enumerate(self.vectors[:10])]
+        index = EmbeddingIndex()
+        index.add([output["text"] for output in outputs], outputs)
+        assert index.search(self.vectors[3], k=1)[0][0][0] == "3"
+        assert "embedding" in outputs[0], "Adding `Embed` outputs modified them."
+
+    def test_save_load(self):
+        index = EmbeddingIndex()
+        index.add([f"id-{i}" for i in range(100)], self.vectors[:100])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            index.save(path)
+            loaded = EmbeddingIndex.load(path)
+        assert loaded.ids == index.ids, "Ids changed after a save/load round trip."
+        assert np.array_equal(loaded.vectors, index.vectors)
+        assert loaded.search(self.queries, k=3) == index.search(self.queries, k=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+from lightonmuse.instrumentation import RequestEvent
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=16).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_events(self):
+        events = []
+        embedder = lightonmuse.Embed("orion-fr", hooks=[events.append])
+        _, cost, request_id = embedder(["a", "b", "c"])
+        (event,) = events
+        assert (event.endpoint, event.model, event.status_code, event.attempts) == ("embed", "orion-fr", 200, 1)
+        assert event.request_id == request_id and event.costs == cost and event.batch_size == 3
+        assert event.request_bytes > 0 and event.response_bytes > 0 and event.ok
+        phases = event.connect + event.ttfb + event.download + event.decode
+        assert 0 < phases <= event.latency + 1e-3, event
+
+        self.server.fail(503, 400)
+        with self.assertRaises(lightonmuse.MuseAPIError):
+            embedder(["a"])
+        assert (events[-1].status_code, events[-1].attempts, events[-1].ok) == (400, 2, False), events[-1]
+
+    def test_async_events(self):
+        events = []
+
+        async def run():
+            await lightonmuse.AsyncTokenize("orion-fr", hooks=[events.append])("Bonjour")
+            await lightonmuse.close_async_sessions()
+
+        asyncio.run(run())
+        assert [(event.endpoint, event.status_code) for event in events] == [("tokenize", 200)]
+
+    def test_failing_hook(self):
+        def hook(event: RequestEvent):
+            raise ValueError("broken hook")
+
+        with self.assertWarns(UserWarning):
+            outputs, _, _ = lightonmuse.Tokenize("orion-fr", hooks=[hook])("Bonjour")
+        assert outputs
+
+    def test_aggregator(self):
+        stats = lightonmuse.LatencyAggregator()
+        for latency in [0.01] * 90 + [1.0] * 10:
+            stats(RequestEvent("create", "orion-fr", latency=latency, costs={"orion-fr@default": {"batch_size": 1}}))
+        stats(RequestEvent("embed", "orion-fr", latency=0.1, attempts=3, error="MuseAPIError"))
+        percentiles = stats.percentiles("create")
+        assert 0.009 < percentiles["p50"] < 0.011 and 0.009 < percentiles["p90"] < 0.011, percentiles
+        assert 0.9 < percentiles["p99"] < 1.1, percentiles
+        summary = stats.summary()
+        assert summary["create"]["requests"] == 100 and summary["create"]["costs"]["orion-fr@default"]["batch_size"] == 100
+        assert (summary["embed"]["errors"], summary["embed"]["retries"]) == (1, 2)
+        stats.reset()
+        assert stats.summary() == {} and stats.percentile("create", 50) is None
+
+
+if __name__ == "__main__":
+    unittest.main()
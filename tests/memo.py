@@ -0,0 +1,37 @@
+import time
+import unittest
+
+from lightonmuse import Memo
+
+
+class TestMemo(unittest.TestCase):
+    def test_lru(self):
+        memo = Memo(maxsize=2)
+        keys = [memo.key("https://muse/embed", "orion-fr", text) for text in [b"a", b"b", b"c"]]
+        memo.put(keys[0], {"outputs": [[{"text": "a"}]]})
+        memo.put(keys[1], {"outputs": [[{"text": "b"}]]})
+        assert memo.get(keys[0]) is not None  # "b" becomes the least recently used response
+        memo.put(keys[2], {"outputs": [[{"text": "c"}]]})
+        assert memo.get(keys[1]) is None, "The least recently used response was not evicted."
+        assert memo.get(keys[0]) is not None and memo.get(keys[2]) is not None
+        assert memo.stats == {"hits": 3, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2}, memo.stats
+
+    def test_copies(self):
+        memo = Memo()
+        key = memo.key("https://muse/select", "orion-fr", b"payload")
+        memo.put(key, {"outputs": [[{"best": "a"}]]})
+        response = memo.get(key)
+        response["outputs"][0][0]["best"] = "b"
+        assert memo.get(key)["outputs"][0][0]["best"] == "a", "Stored responses can be mutated by callers."
+
+    def test_ttl(self):
+        memo = Memo(ttl=0.05)
+        key = memo.key("https://muse/tokenize", "orion-fr", b"payload")
+        memo.put(key, {"outputs": []})
+        assert memo.get(key) is not None
+        time.sleep(0.1)
+        assert memo.get(key) is None, "Expired responses are still served."
+
+
+if __name__ == "__main__":
+    unittest.main()
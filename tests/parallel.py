@@ -0,0 +1,58 @@
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestParallelMap(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=8).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_embed_map(self):
+        sentences = [f"Phrase numéro {i} de notre corpus." for i in range(10)]
+        representer = lightonmuse.Embed("orion-fr")
+        # the first request answers last, the outputs must be put back in input order
+        self.server.stall(0.2)
+        outputs, cost, rids = representer.map(iter(sentences), batch_size=3, workers=2)
+        assert len(outputs) == len(sentences), f"Got {len(outputs)} outputs for {len(sentences)} inputs."
+        assert [output["text"] for output in outputs] == sentences, "Outputs are not in input order."
+        assert len(rids) == 4, f"Got {len(rids)} request IDs for 4 chunks."
+        assert cost["orion-fr@default"]["batch_size"] == len(sentences), (
+            f"`batch_size={cost['orion-fr@default']['batch_size']}` is not aggregated over the chunks."
+        )
+        chunks = sorted(payload["text"] for _, payload in self.server.requests)
+        assert chunks == [sentences[:3], sentences[3:6], sentences[6:9], sentences[9:]], chunks
+
+        unordered = dict(representer.imap(sentences, batch_size=3, workers=2, ordered=False))
+        assert sorted(unordered) == list(range(len(sentences)))
+        assert all(unordered[i]["text"] == sentence for i, sentence in enumerate(sentences)), (
+            "Indices yielded in unordered mode don't match the inputs."
+        )
+
+    def test_select_map(self):
+        references = ["Aujourd'hui il fait beau", "Il pleut des cordes", "Il neige"]
+        candidates = ["Il y a du soleil", "Il fait moche"]
+        selecter = lightonmuse.Select("orion-fr")
+        for batch_size, expected_chunks in [(1, [[r] for r in references]), (2, [references[:2], references[2:]])]:
+            self.server.requests.clear()
+            outputs, _, rids = selecter.map(references, batch_size=batch_size, candidates=candidates)
+            assert [output[0]["reference"] for output in outputs] == references, (
+                f"Outputs are not in input order with `batch_size={batch_size}`."
+            )
+            chunks = sorted(
+                [query["reference"] for query in (payload if isinstance(payload, list) else [payload])]
+                for _, payload in self.server.requests
+            )
+            assert chunks == sorted(expected_chunks) and len(rids) == len(expected_chunks), chunks
+            assert all(
+                query["candidates"] == candidates
+                for _, payload in self.server.requests
+                for query in (payload if isinstance(payload, list) else [payload])
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
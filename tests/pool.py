@@ -0,0 +1,79 @@
+import time
+import unittest
+from unittest import mock
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+from lightonmuse.pool import EndpointPool
+
+
+class TestEndpointPool(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.servers = [FakeMuseServer(dim=16).start() for _ in range(2)]
+        for server in self.servers:
+            self.addCleanup(server.stop)
+
+    def test_least_outstanding(self):
+        pool = EndpointPool([server.url for server in self.servers], api_keys=["key-1", "key-2"])
+        leases = [pool.acquire() for _ in range(4)]
+        assert sorted((lease.base_url, lease.api_key) for lease in leases[:2]) == sorted(
+            [(self.servers[0].url, "key-1"), (self.servers[1].url, "key-2")]
+        )
+        pool.release(leases[0], 200)
+        assert pool.acquire().base_url == leases[0].base_url
+        assert [replica["outstanding"] for replica in pool.status()] == [2, 2]
+
+    def test_spreads_requests(self):
+        pool = EndpointPool([server.url for server in self.servers], api_keys=["key-1", "key-2"])
+        tokenizer = lightonmuse.Tokenize("orion-fr", pool=pool)
+        # sequential requests alternate between the idle replicas
+        for i in range(10):
+            tokenizer(f"texte {i}")
+        assert [len(server.requests) for server in self.servers] == [5, 5]
+        # a request in flight on the first replica sends the next ones to the second one
+        held = pool.acquire()
+        assert held.base_url == self.servers[0].url
+        for i in range(4):
+            tokenizer(f"texte {i}")
+        assert [len(server.requests) for server in self.servers] == [5, 9]
+        # once released, the least used replica catches up
+        pool.release(held, 200)
+        for i in range(4):
+            tokenizer(f"texte {i}")
+        assert [len(server.requests) for server in self.servers] == [9, 9]
+        assert [replica["requests"] for replica in pool.status()] == [10, 9]
+
+    def test_failover(self):
+        self.servers[1].stop()
+        pool = EndpointPool([server.url for server in self.servers], api_keys=["key"], recovery_time=0.2)
+        embedder = lightonmuse.Embed("orion-fr", pool=pool, retry=lightonmuse.RetryPolicy(backoff_factor=0.01))
+        for _ in range(10):
+            embedder("Bonjour")
+        assert len(self.servers[0].requests) == 10, "Failed requests were not retried on the healthy replica."
+        assert [replica["state"] for replica in pool.status()] == ["closed", "open"]
+        assert pool.status()[1]["failures"] == pool.failure_threshold
+
+        # probed back in once it recovers
+        self.servers[1] = FakeMuseServer(port=self.servers[1].port).start()
+        self.addCleanup(self.servers[1].stop)
+        time.sleep(0.2)
+        embedder("Bonjour")
+        assert [replica["state"] for replica in pool.status()] == ["closed", "closed"]
+        assert len(self.servers[1].requests) == 1
+
+    def test_throttled_key(self):
+        pool = EndpointPool([self.servers[0].url], api_keys=["key-1", "key-2"])
+        lease = pool.acquire()
+        pool.release(lease, 429, retry_after="60")
+        assert all(pool.acquire().api_key != lease.api_key for _ in range(3))
+
+    def test_from_env(self):
+        with mock.patch.dict("os.environ", {"MUSE_BASE_URLS": "http://a/muse/v1, http://b/muse/v1/"}):
+            pool = EndpointPool.from_env()
+        assert pool.base_urls == ["http://a/muse/v1/", "http://b/muse/v1/"] and pool.api_keys is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import random
+import string
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+from lightonmuse.preflight import TokenBudget
+
+
+class TestTokenBudget(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def test_empty_string(self):
+        budget = TokenBudget("orion-fr")
+        with self.assertRaises(ValueError) as cm:
+            budget(lightonmuse.Embed("orion-fr"), ["Je suis content", ""])
+        assert "[1]" in str(cm.exception), "Empty input was not reported before sending the batch."
+        assert self.server.requests == [], "Requests were sent for a batch with an empty input."
+
+        budget = TokenBudget("orion-fr", policy="skip")
+        outputs, cost, rid = budget(lightonmuse.Embed("orion-fr"), ["Je suis content", ""])
+        assert outputs[1] is None, "Empty input was not skipped."
+        assert outputs[0]["text"] == "Je suis content"
+        assert cost["orion-fr@default"]["batch_size"] == 1, "Empty input was sent to the API."
+        assert [payload["text"] for endpoint, payload in self.server.requests if endpoint == "embed"] == [
+            ["Je suis content"]
+        ]
+
+    def test_prompt_too_long(self):
+        input_too_long = " ".join(
+            "".join(random.choice(string.ascii_uppercase) for _ in range(5)) for _ in range(200)
+        )
+        sentence = "Je voudrais un café et deux croissants, s'il vous plait."
+        budget = TokenBudget("orion-fr", max_tokens=64)
+        with self.assertRaises(ValueError) as cm:
+            budget(lightonmuse.Analyse("orion-fr"), [sentence, input_too_long])
+        assert "[1]" in str(cm.exception)
+        # only the token counts were requested
+        assert {endpoint for endpoint, _ in self.server.requests} == {"tokenize"}, self.server.requests
+
+        for policy in ["truncate", "split"]:
+            budget = TokenBudget("orion-fr", max_tokens=64, policy=policy)
+            outputs, cost, rid = budget(lightonmuse.Analyse("orion-fr"), [sentence, input_too_long])
+            assert outputs[0]["text"] == sentence, f"Valid input was modified by policy `{policy}`."
+            if policy == "truncate":
+                assert input_too_long.startswith(outputs[1]["text"]), "Truncated input is not a prefix."
+            else:
+                assert isinstance(outputs[1], list) and len(outputs[1]) > 1, "Input too long was not split."
+            payload = [payload for endpoint, payload in self.server.requests if endpoint == "analyse"][-1]
+            assert all(n <= 64 for n in budget.count(payload["text"])), "A text over the budget was sent."
+
+        counts = budget.count([sentence, input_too_long])
+        assert counts[1] > budget.max_tokens, f"Counted {counts[1]} tokens for an input too long."
+
+    def test_reserve_exceeds_context(self):
+        budget = TokenBudget("orion-fr", max_tokens=16, policy="truncate")
+        for reserve in [16, 20]:
+            with self.assertRaises(ValueError):
+                budget.prepare(["Je suis content"], reserve=reserve)
+
+    def test_unsplittable_word(self):
+        # the fake tokenizer counts each punctuation mark as a token, making a single long word
+        word = "!" * 30
+        budget = TokenBudget("orion-fr", max_tokens=10, policy="split")
+        prepared = budget.prepare(["Je suis content", f"un mot {word}"])
+        assert set(prepared.rejected) == {1} and prepared.texts == ["Je suis content"], prepared
+        outputs, _, _ = budget(lightonmuse.Embed("orion-fr"), ["Je suis content", word])
+        assert outputs[1] is None and outputs[0]["text"] == "Je suis content"
+
+        # truncation cuts inside a word when it has to
+        budget = TokenBudget("orion-fr", max_tokens=10, policy="truncate")
+        prepared = budget.prepare([word, f"un mot {word}"])
+        assert not prepared.rejected and prepared.texts[1] == "un mot", prepared
+        assert all(n <= 10 for n in budget.count(prepared.texts)), "A text over the budget is sent."
+
+
+if __name__ == "__main__":
+    unittest.main()
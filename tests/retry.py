@@ -0,0 +1,56 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import unittest
+import warnings
+
+import lightonmuse
+from lightonmuse import RetryPolicy
+from lightonmuse.fake_server import FakeMuseServer
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_should_retry(self):
+        policy = RetryPolicy(max_retries=2)
+        assert policy.should_retry(1, 429), "Rate-limited requests should be retried."
+        assert policy.should_retry(2, 503), "Requests should be retried until `max_retries` is reached."
+        assert not policy.should_retry(3, 503), "Requests were retried more than `max_retries` times."
+        assert not policy.should_retry(1, 400), "Client errors should not be retried."
+        assert policy.should_retry(1), "Connection errors should be retried by default."
+        assert not RetryPolicy(retry_connection_errors=False).should_retry(1)
+        assert not RetryPolicy(max_retries=0).should_retry(1, 429), "`max_retries=0` should disable retries."
+        assert not policy.should_retry(1, 503, deterministic=False), "Billed sampling calls should not be retried."
+        assert policy.should_retry(1, 429, deterministic=False) and policy.should_retry(1, deterministic=False)
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1.0, max_backoff=5.0)
+        for attempt in range(1, 10):
+            delay = policy.backoff(attempt)
+            assert 0 <= delay <= min(5.0, 2 ** (attempt - 1)), f"Backoff {delay} out of bounds for attempt={attempt}."
+
+    def test_retry_after(self):
+        policy = RetryPolicy()
+        assert policy.backoff(1, "7") == 7.0, "`Retry-After` in seconds was not honoured."
+        date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        assert 25 < policy.backoff(1, date) <= 30, "`Retry-After` as an HTTP date was not honoured."
+        assert policy.backoff(1, "not a date") <= policy.backoff_factor, "Invalid `Retry-After` should be ignored."
+        assert RetryPolicy(respect_retry_after=False).backoff(1, "7") <= 0.5
+        assert policy.backoff(1, "3600") == policy.max_backoff, "`Retry-After` should be capped by `max_backoff`."
+
+    def test_sampling_retries(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        retry = RetryPolicy(backoff_factor=0.01)
+        with FakeMuseServer(dim=8) as server:
+            creator = lightonmuse.Create("orion-fr", retry=retry)
+            server.fail(503)
+            with self.assertRaises(lightonmuse.MuseAPIError):
+                creator("Bonjour", n_tokens=5, mode="nucleus")
+            assert len(server.requests) == 1, "A sampling call was retried after a server error."
+            server.fail(429)
+            creator("Bonjour", n_tokens=5, mode="nucleus")
+            server.fail(503)
+            creator("Bonjour", n_tokens=5, mode="greedy")
+            assert len(server.requests) == 5
+
+
+if __name__ == "__main__":
+    unittest.main()
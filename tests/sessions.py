@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import unittest
+from unittest import mock
+import warnings
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer
+from lightonmuse.sessions import _TimedConnectionMixin, registry
+
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=8).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        # sessions of other tests or other servers shouldn't leak into these ones
+        pool_maxsize, pool_block = registry.pool_maxsize, registry.pool_block
+        lightonmuse.configure_sessions()
+        self.addCleanup(lightonmuse.configure_sessions, pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+    def test_shared_per_base_url(self):
+        tokenizer, embedder = lightonmuse.Tokenize("orion-fr"), lightonmuse.Embed("orion-fr")
+        assert tokenizer.session is embedder.session is lightonmuse.Embed("lyra-en").session
+        other = FakeMuseServer(dim=8).start()
+        self.addCleanup(other.stop)
+        with mock.patch.dict("os.environ", {"MUSE_BASE_URL": other.url}):
+            assert lightonmuse.Tokenize("orion-fr").session is not tokenizer.session
+
+    def test_configure(self):
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        session = tokenizer.session
+        lightonmuse.configure_sessions(pool_maxsize=3, pool_block=True)
+        # the previous session is closed and replaced by one following the new settings
+        assert tokenizer.session is not session
+        adapter = tokenizer.session.get_adapter(tokenizer.url)
+        assert adapter.poolmanager.connection_pool_kw["maxsize"] == 3
+        assert adapter.poolmanager.connection_pool_kw["block"] is True
+        tokenizer("Bonjour")
+        assert adapter.poolmanager.connection_from_url(tokenizer.url).pool.maxsize == 3
+
+    def test_threads(self):
+        lightonmuse.configure_sessions(pool_maxsize=2, pool_block=True)
+        tokenizer = lightonmuse.Tokenize("orion-fr")
+        texts = [f"Bonjour numéro {i}" for i in range(64)]
+        connections = []
+        lock = threading.Lock()
+        connect = _TimedConnectionMixin.connect
+
+        def counted_connect(connection):
+            with lock:
+                connections.append(connection)
+            connect(connection)
+
+        with mock.patch.object(_TimedConnectionMixin, "connect", counted_connect):
+            with ThreadPoolExecutor(8) as executor:
+                outputs = list(executor.map(lambda text: tokenizer(text)[0][0]["text"], texts))
+        assert outputs == texts, "Responses were mixed up between threads."
+        # the 8 threads share the 2 connections kept alive by the session
+        assert 1 <= len(connections) <= 2, len(connections)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+import warnings
+
+import numpy as np
+
+import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer, embed
+
+
+class TestShortlistSelect(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+        self.server = FakeMuseServer(dim=16).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.candidates = [f"catégorie {i}" for i in range(200)]
+        self.references = ["Un article sur la mer", "Un article sur la ville", "Un article sur le soleil"]
+
+    def expected_shortlist(self, reference: str, k: int, candidates: list = None) -> list:
+        candidates = self.candidates if candidates is None else candidates
+        similarities = np.array([embed(candidate, 16) for candidate in candidates]) @ np.array(embed(reference, 16))
+        return [candidates[i] for i in np.argsort(-similarities, kind="stable")[:k]]
+
+    def test_select_on_shortlist(self):
+        selector = lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=5)
+        fit_cost = selector.fit(self.candidates, batch_size=64)
+        assert fit_cost["orion-fr@default"]["batch_size"] == len(self.candidates)
+
+        outputs, cost, request_id = selector(self.references, conjunction="Catégorie :")
+        assert len(outputs) == len(self.references) and isinstance(request_id, str)
+        for reference, (output,) in zip(self.references, outputs):
+            shortlist = self.expected_shortlist(reference, 5)
+            assert [ranking["text"] for ranking in output["rankings"]] == shortlist
+            assert output["best"] in shortlist
+        # the references are embedded, and only their shortlists scored
+        assert cost["orion-fr@default"]["batch_size"] == len(self.references) * (1 + 5)
+        select_payload = [payload for endpoint, payload in self.server.requests if endpoint == "select"][-1]
+        assert [len(query["candidates"]) for query in select_payload] == [5] * len(self.references)
+
+    def test_candidates_embedded_once(self):
+        selector = lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=3)
+        selector(self.references[0], self.candidates)
+        selector(self.references[1], self.candidates)
+        embedded = [
+            text for endpoint, payload in self.server.requests if endpoint == "embed" for text in payload["text"]
+        ]
+        assert sorted(embedded) == sorted(self.candidates + self.references[:2]), "Candidates embedded again."
+
+        # other candidates are embedded before shortlisting
+        outputs, cost, _ = selector(self.references[2], self.candidates[:10])
+        assert {ranking["text"] for ranking in outputs[0]["rankings"]} <= set(self.candidates[:10])
+        assert cost["orion-fr@default"]["batch_size"] == 10 + 1 + 3
+
+    def test_output_format(self):
+        selector = lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=3)
+        selector.fit(self.candidates)
+        shortlist = self.expected_shortlist(self.references[0], 3)
+        expected, _, _ = lightonmuse.Select("orion-fr")(self.references[0], shortlist)
+        outputs, _, _ = selector(self.references[0])
+        assert outputs == expected, "A single reference is not returned as by `Select`."
+        outputs, _, _ = selector(self.references[:1])
+        assert outputs == [expected]
+        assert selector([])[0] == []
+
+    def test_calibrated(self):
+        calibrated = lightonmuse.CalibratedSelect("orion-fr")
+        candidates = self.candidates[:20]
+        calibrated.fit(["Un article sur ", "Un article sur rien"], candidates, conjunction="Catégorie :")
+        selector = lightonmuse.ShortlistSelect(calibrated, k=len(candidates))
+        selector.fit()
+
+        # shortlisting every candidate gives back the scores of the calibration over the full set
+        (output,), _, _ = selector(self.references[0])
+        (expected,), _, _ = calibrated(self.references[0], candidates, conjunction="Catégorie :")
+        scores = {ranking["text"]: ranking["score"] for ranking in output["calibrated"]["rankings"]}
+        assert output["best"] == expected["best"]
+        for ranking in expected["calibrated"]["rankings"]:
+            assert np.isclose(scores[ranking["text"]], ranking["score"])
+
+        # with a shortlist, the content-free probabilities are renormalized over it
+        outputs, _, _ = selector(self.references, k=4)
+        for reference, (output,) in zip(self.references, outputs):
+            shortlist = [ranking["text"] for ranking in output["calibrated"]["rankings"]]
+            assert shortlist == self.expected_shortlist(reference, 4, candidates)
+            (uncalibrated,), _, _ = lightonmuse.Select("orion-fr")(reference, shortlist, conjunction="Catégorie :")
+            probs = np.exp([ranking["score"]["normalized_logprob"] for ranking in uncalibrated["rankings"]])
+            probs_cf = -calibrated.b[[candidates.index(candidate) for candidate in shortlist], 0]
+            expected_scores = probs / probs.sum() - probs_cf / probs_cf.sum()
+            assert np.allclose([ranking["score"] for ranking in output["rankings"]], expected_scores)
+            assert output["best"] == shortlist[int(np.argmax(expected_scores))]
+        with self.assertRaises(ValueError):
+            calibrated(self.references[:1], [["autre catégorie"]], conjunction="Catégorie :")
+
+    def test_async(self):
+        async def run():
+            selector = lightonmuse.AsyncShortlistSelect(lightonmuse.AsyncSelect("orion-fr"), k=3)
+            await selector.fit(self.candidates)
+            outputs = await selector(self.references, conjunction="Catégorie :")
+            await lightonmuse.close_async_sessions()
+            return outputs
+
+        outputs, cost, _ = asyncio.run(run())
+        expected, expected_cost, _ = lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=3)(
+            self.references, self.candidates, conjunction="Catégorie :"
+        )
+        assert outputs == expected
+        assert cost["orion-fr@default"]["batch_size"] == len(self.references) * (1 + 3)
+
+    def test_k(self):
+        with self.assertRaises(ValueError):
+            lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=0)
+        selector = lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), k=3)
+        selector.fit(self.candidates)
+        n_requests = len(self.server.requests)
+        for k in [0, -1]:
+            with self.assertRaises(ValueError):
+                selector(self.references[0], k=k)
+            with self.assertRaises(ValueError):
+                selector.shortlist(self.references[0], k=k)
+        assert len(self.server.requests) == n_requests, "Requests were sent with an invalid `k`."
+        shortlists, _ = selector.shortlist(self.references[0], k=1)
+        assert len(shortlists[0]) == 1
+
+    def test_endpoint_types(self):
+        with self.assertRaises(TypeError):
+            lightonmuse.ShortlistSelect(lightonmuse.AsyncSelect("orion-fr"))
+        with self.assertRaises(TypeError):
+            lightonmuse.ShortlistSelect(lightonmuse.Select("orion-fr"), embedder=lightonmuse.AsyncEmbed("orion-fr"))
+        with self.assertRaises(TypeError):
+            lightonmuse.AsyncShortlistSelect(lightonmuse.Select("orion-fr"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lightonmuse.embeddings import Embeddings
+from lightonmuse.store import EmbeddingStore, merge_ranges
+
+
+class FakeEmbed:
+    """Embeds a text as a one-hot vector of its number, failing after `fail_after` calls."""
+
+    model = "orion-fr"
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.texts = []
+
+    def __call__(self, texts, skill=None, as_array=False):
+        if self.fail_after is not None and len(self.texts) >= self.fail_after:
+            raise RuntimeError("Connection lost")
+        self.texts.extend(texts)
+        vectors = np.zeros((len(texts), 100), dtype=np.float32)
+        vectors[np.arange(len(texts)), [int(text.split()[1]) for text in texts]] = 1
+        return Embeddings(vectors, [{"text": text} for text in texts]), {"orion-fr@default": {"batch_size": 1}}, "id"
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    def test_merge_ranges(self):
+        assert merge_ranges([[10, 20], [0, 5], [5, 10], [30, 40]]) == [[0, 20], [30, 40]]
+
+    def test_resume(self):
+        texts = [f"doc {i}" for i in range(100)]
+        ids = [f"id-{i}" for i in range(100)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "store")
+            store = EmbeddingStore(path)
+            with self.assertRaises(RuntimeError):
+                store.embed(FakeEmbed(fail_after=40), texts, ids=ids, batch_size=8, workers=1, checkpoint_every=1)
+            done = store.done
+            assert done and not store.complete, f"Progress was not checkpointed before the crash: {done}."
+
+            embedder = FakeEmbed()
+            store.embed(embedder, texts, ids=ids, batch_size=8, workers=2)
+            assert store.complete, store.done
+            n_done = sum(stop - start for start, stop in done)
+            assert len(embedder.texts) == len(texts) - n_done, "Rows done before the crash were sent again."
+
+            vectors = EmbeddingStore(path).vectors
+            assert isinstance(vectors, np.memmap) and not vectors.flags.writeable
+            assert np.array_equal(vectors.argmax(axis=1), np.arange(100)), "Rows are not in input order."
+            assert EmbeddingStore(path).ids == ids
+
+    def test_model_check(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = EmbeddingStore(directory)
+            store.embed(FakeEmbed(), ["doc 1"])
+            embedder = FakeEmbed()
+            embedder.model = "lyra-en"
+            with self.assertRaises(ValueError):
+                store.embed(embedder, ["doc 1"])
+
+    def test_ids_length(self):
+        texts = [f"doc {i}" for i in range(10)]
+        with tempfile.TemporaryDirectory() as directory:
+            store = EmbeddingStore(os.path.join(directory, "store"))
+            with self.assertRaises(ValueError):
+                store.embed(FakeEmbed(), texts, ids=list(range(9)))
+            assert not os.path.exists(store.path), "The store was written despite missing ids."
+            # lengths of lazy iterables are only known once read
+            for ids in [range(9), range(11)]:
+                with self.assertRaises(ValueError):
+                    store.embed(FakeEmbed(), iter(texts), ids=iter(ids), n_rows=10, batch_size=4, workers=1)
+                assert not store.complete
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,17 @@
 import math
 import unittest
+import warnings
+
+import numpy as np
 
 import lightonmuse
+from lightonmuse.fake_server import FakeMuseServer, embed
 
 
 class TestUnderstandEndpoints(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings("ignore", message="Bindings targeting")
+
     def test_analyse(self):
         # check types and single input
         output_keys = {"execution_metadata", "text", "score"}
@@ -126,6 +133,23 @@ class TestUnderstandEndpoints(unittest.TestCase):
             f"{len(second_embedding)}."
         )
 
+    def test_as_array(self):
+        sentences = ["Je voudrais un café et deux croissants, s'il vous plait.", "quelque chose dans cette liste"]
+        expected = np.array([embed(sentence, 16) for sentence in sentences], dtype=np.float32)
+        with FakeMuseServer(dim=16):
+            representer = lightonmuse.Embed("orion-fr")
+            outputs, _, _ = representer(sentences)
+            (vectors, metadata), cost, rid = representer(sentences, as_array=True)
+            mapped, _, _ = representer.map(sentences * 3, batch_size=2, as_array=True)
+        assert vectors.shape == (len(sentences), 16) and vectors.dtype == np.float32, (vectors.shape, vectors.dtype)
+        assert np.array_equal(vectors, expected), "Embeddings matrix does not match the embeddings of the API."
+        assert np.allclose(vectors, [output["embedding"] for output in outputs]), (
+            "Embeddings matrix does not match the embeddings returned as lists."
+        )
+        assert [meta["text"] for meta in metadata] == sentences, "Metadata is not aligned with the input sentences."
+        assert all("embedding" not in meta for meta in metadata)
+        assert np.array_equal(mapped.vectors, np.concatenate([expected] * 3)), "Chunks of `map` are misaligned."
+
     def test_select(self):
         # TODO: fix output_keys when concat_best is implemented in Select upstream
         output_keys = {"reference", "rankings", "best", "execution_metadata"}
@@ -256,6 +280,31 @@ class TestUnderstandEndpoints(unittest.TestCase):
             "Detected cosine similarity " "value outside of [-1, 1]."
         )
 
+    def test_compare_matrix(self):
+        references = ["Je suis content", "Il fait froid", "Je suis content", "Il gèle dehors"]
+        candidates = ["Je suis triste", "Je suis heureux", "Il gèle dehors", "Il neige", "Bonjour", "Au revoir"]
+        expected = np.array([embed(text, 16) for text in references]) @ np.array([embed(t, 16) for t in candidates]).T
+        with FakeMuseServer(dim=16) as server:
+            comparer = lightonmuse.Compare("orion-fr")
+            # blocks of candidates smaller than the candidates, and several embedding requests
+            similarities, cost, rids = comparer.matrix(references, candidates, block_size=4, batch_size=3)
+            embedded = [payload["text"] for endpoint, payload in server.requests if endpoint == "embed"]
+            outputs, _, _ = comparer.matrix(references, candidates, top_k=2, block_size=4, batch_size=3)
+        assert similarities.shape == (4, 6), f"Expected a (4, 6) matrix, got {similarities.shape} instead."
+        assert np.allclose(similarities, expected, atol=1e-6), "The similarity matrix is wrong."
+        unique_texts = set(references + candidates)
+        assert sorted(text for chunk in embedded for text in chunk) == sorted(unique_texts), (
+            "Unique references and candidates should be embedded exactly once."
+        )
+        assert all(len(chunk) <= 3 for chunk in embedded) and len(rids) == len(embedded) == 3
+        assert cost["orion-fr@default"]["batch_size"] == len(unique_texts)
+        for reference, output, row in zip(references, outputs, expected):
+            top = np.argsort(-row, kind="stable")[:2]
+            assert output["reference"] == reference
+            assert [similarity["candidate"] for similarity in output["similarities"]] == [candidates[i] for i in top]
+            assert np.allclose([similarity["similarity"] for similarity in output["similarities"]], row[top])
+            assert output["best"] == candidates[top[0]], "Rankings don't match the similarity matrix."
+
 
 if __name__ == "__main__":
     unittest.main()